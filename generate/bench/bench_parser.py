@@ -0,0 +1,166 @@
+"""JSON 解析器的自检和基准测试。
+
+    python bench/bench_parser.py              自检 + 基准
+    python bench/bench_parser.py --check      只跑自检（退出码非 0 表示有样本不符合预期）
+
+自检读取 bench/json_corpus.jsonl：每行一个模型输出样本，expect 为期望解析出的对象
+（null 表示应当报 JSONParseError），truncated 为 true 的样本只有 allow_truncated 时才接受。
+基准对比旧的正则实现、标准库后端和 orjson 后端在几类典型输出上的耗时和成功率。
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from engine import parser as engine_parser  # noqa: E402
+from engine.parser import JSONParseError, robust_json_parser  # noqa: E402
+
+CORPUS = os.path.join(BENCH_DIR, "json_corpus.jsonl")
+
+
+def load_corpus(path=CORPUS):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# ================= 自检 =================
+def check(samples):
+    failures = 0
+    for s in samples:
+        problems = []
+        for allow in (False, True):
+            accept = s["expect"] is not None and (allow or not s["truncated"])
+            try:
+                data, text = robust_json_parser(s["input"], allow_truncated=allow)
+            except JSONParseError as e:
+                if accept:
+                    problems.append(f"allow_truncated={allow}: 意外失败 {e}")
+                continue
+            if not accept:
+                problems.append(f"allow_truncated={allow}: 应当失败，却得到 {text[:60]}")
+            elif data != s["expect"]:
+                problems.append(f"allow_truncated={allow}: 结果不符 {text[:80]}")
+            elif text != json.dumps(s["expect"], ensure_ascii=False, separators=(",", ":")):
+                problems.append(f"allow_truncated={allow}: 输出不是规范 JSON {text[:80]}")
+        status = "❌" if problems else "✅"
+        print(f"{status} {s['name']}")
+        for p in problems:
+            print(f"     {p}")
+        failures += bool(problems)
+    print(f"\n自检: {len(samples) - failures}/{len(samples)} 通过")
+    return failures
+
+
+# ================= 基准 =================
+def legacy_parser(raw_content):
+    """被替换掉的旧实现（去掉了打印），只用于对比。"""
+    try:
+        return json.loads(raw_content), raw_content
+    except json.JSONDecodeError:
+        match = re.search(r'\{.*\}', raw_content.strip(), re.DOTALL)
+        if not match:
+            raise JSONParseError("JSON_BLOCK_NOT_FOUND")
+        content = re.sub(r',\s*([\]\}])', r'\1', match.group(0))
+        try:
+            return json.loads(content), content
+        except json.JSONDecodeError as e:
+            raise JSONParseError(e.msg)
+
+
+def sample_entry(i):
+    """与真实词条体积相近（约 3 KB）的日语词条。"""
+    return {
+        "word": f"食べる{i}",
+        "readings": {"kana": "たべる", "romaji": "taberu", "pitch_accent": 2},
+        "pos": "v. (Ichidan)",
+        "forms": [{"name": n, "value": f"食べ{n}"} for n in ("Te-form", "Nai-form", "Ta-form", "Masu-form")],
+        "search_keywords": ["taberu", "たべる", "食べる", "eat"],
+        "definitions": [{"meaning": "吃；食用。把食物放进嘴里咀嚼并咽下。" * 3, "examples": [
+            {"ja": "朝ご飯を食べる。", "zh": "吃早饭。", "note": "日常用法 " * 10} for _ in range(4)]} for _ in range(3)],
+    }
+
+
+def workloads(n):
+    entries = [json.dumps(sample_entry(i), ensure_ascii=False, indent=2) for i in range(n)]
+    commented = [e.replace('"pos"', '// 🔥 SMART PARADIGM\n  "pos"', 1).replace("]\n}", "],\n}") for e in entries]
+    return {
+        "干净": entries,
+        "代码块+说明": [f"Sure! Here is the entry:\n```json\n{e}\n```\nHope this helps." for e in entries],
+        "注释+尾随逗号": commented,
+        "截断": [e[:int(len(e) * 0.7)] for e in entries],
+    }
+
+
+def use_stdlib_backend():
+    """把 engine.parser 切到标准库后端，返回恢复原后端的函数。"""
+    saved = (engine_parser.loads, engine_parser.dump_json, engine_parser._DECODE_ERRORS)
+    engine_parser.loads = json.loads
+    engine_parser.dump_json = lambda data: json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    engine_parser._DECODE_ERRORS = (ValueError,)
+
+    def restore():
+        engine_parser.loads, engine_parser.dump_json, engine_parser._DECODE_ERRORS = saved
+    return restore
+
+
+def time_parser(fn, texts, repeat):
+    ok = 0
+    best = float("inf")
+    for _ in range(repeat):
+        ok = 0
+        start = time.perf_counter()
+        for text in texts:
+            try:
+                fn(text)
+                ok += 1
+            except JSONParseError:
+                pass
+        best = min(best, time.perf_counter() - start)
+    return best / len(texts) * 1e6, ok
+
+
+def bench(n, repeat):
+    loads = workloads(n)
+    parsers = [("旧实现 (正则)", legacy_parser)]
+    if engine_parser.orjson is not None:
+        parsers.append(("新实现 orjson", lambda t: robust_json_parser(t, allow_truncated=True)))
+    parsers.append(("新实现 标准库", None))
+
+    size = sum(len(t) for t in loads["干净"]) / n
+    print(f"\n基准: 每类 {n} 个样本，平均 {size / 1024:.1f} KB，取 {repeat} 轮最快 (µs/条, 成功数)")
+    print(f"{'输出类型':<12}" + "".join(f"{name:>18}" for name, _ in parsers))
+    for kind, texts in loads.items():
+        cells = []
+        for name, fn in parsers:
+            if fn is None:
+                restore = use_stdlib_backend()
+                try:
+                    us, ok = time_parser(lambda t: robust_json_parser(t, allow_truncated=True), texts, repeat)
+                finally:
+                    restore()
+            else:
+                us, ok = time_parser(fn, texts, repeat)
+            cells.append(f"{us:>10.1f} ({ok:>4})")
+        print(f"{kind:<12}" + "".join(f"{c:>20}" for c in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON 解析器自检与基准")
+    parser.add_argument("--check", action="store_true", help="只跑自检")
+    parser.add_argument("-n", type=int, default=500, help="每类输出的样本数")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    failures = check(load_corpus())
+    if not args.check:
+        bench(args.n, args.repeat)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
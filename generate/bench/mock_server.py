@@ -0,0 +1,257 @@
+"""本地模拟的 OpenAI 兼容 chat completions 服务，给基准测试用，不花一分钱。
+
+    python bench/mock_server.py --port 18080 --profile realistic
+    python bench/mock_server.py --port 18080 --median 2.0 --rate-429 0.05 --prose 0.02
+
+支持非流式和 SSE 流式；可以配置延迟分布、429、超时（挂起不回）、5xx、
+截断的 JSON、包在说明文字里的 JSON 和照抄了模板注释的 JSON。批量 prompt 按 "Keys: [...]" 行返回对应的词条，
+字段修复 / 按字段重写的 prompt 只返回 FIELDS TO FIX 里列出的字段。
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from dataclasses import asdict, dataclass, fields
+
+
+@dataclass
+class MockProfile:
+    median: float = 1.5          # 单词条延迟中位数（秒），对数正态分布
+    sigma: float = 0.5           # 对数正态的 sigma，越大尾部越长
+    per_entry: float = 0.6       # 批量请求每多一个词条，延迟增加的比例
+    ttft: float = 0.3            # 流式首 token 延迟（秒）
+    max_concurrency: int = 0     # 同时处理的请求数上限，超出返回 429；0 表示不限
+    rate_429: float = 0.0        # 随机返回 429 的比例
+    rate_5xx: float = 0.0        # 随机返回 500 的比例
+    rate_timeout: float = 0.0    # 挂起 hang 秒不回复的比例
+    hang: float = 600.0
+    malformed: float = 0.0       # 返回被截断的 JSON 的比例
+    prose: float = 0.0           # 在 JSON 外面包一段说明文字和代码块的比例
+    comments: float = 0.0        # 照抄模板里 // 注释和尾随逗号的比例（需要走修复路径）
+    entry_bytes: int = 2500      # 每个词条的大致字节数
+    cached_ratio: float = 0.8    # usage 里报告的 prompt cache 命中比例
+    cheap_model: str = "cheap"   # 模型名以此开头的请求按便宜模型模拟（测模型级联）：更快，坏输出更多
+    cheap_speedup: float = 3.0
+    cheap_malformed: float = 0.2
+    seed: int = 0
+
+
+PROFILES = {
+    # 没有任何故障，只测本地流水线的上限
+    "clean": MockProfile(median=0.2, sigma=0.2, ttft=0.05),
+    # 接近真实服务：秒级延迟、长尾、少量 429 和坏 JSON
+    "realistic": MockProfile(median=1.5, sigma=0.6, max_concurrency=96, rate_429=0.01, rate_5xx=0.005,
+                             rate_timeout=0.002, hang=120.0, malformed=0.01, prose=0.01),
+    # 压力测试：频繁限流、超时和坏输出
+    "hostile": MockProfile(median=2.0, sigma=0.9, max_concurrency=48, rate_429=0.05, rate_5xx=0.02,
+                           rate_timeout=0.01, hang=60.0, malformed=0.05, prose=0.05),
+}
+
+
+# ================= 生成响应内容 =================
+def target_words(prompt):
+    """批量 prompt 返回 Keys 列表；单词 prompt 取 ### TARGET 后第一行。"""
+    for line in prompt.splitlines():
+        line = line.strip()
+        if line.startswith("Keys: "):
+            return json.loads(line[len("Keys: "):]), True
+    tail = prompt.rsplit("### TARGET", 1)[-1]
+    for line in tail.splitlines():
+        line = line.strip()
+        if line:
+            return [line], False
+    return ["?"], False
+
+
+def fake_entry(word, size):
+    filler = "lorem ipsum dolor sit amet " * max(1, size // 27)
+    return {
+        "word": word,
+        "search_keywords": [word, word.lower()],
+        "definitions": [{"pos": "noun", "meaning": filler[:size // 2]}],
+        "examples": [filler[:size // 2]],
+    }
+
+
+def repair_fields(prompt):
+    """字段修复 / 按字段重写的 prompt 返回要重写的字段路径，其它 prompt 返回空列表。"""
+    if "### FIELDS TO FIX" not in prompt:
+        return []
+    tail = prompt.rsplit("### FIELDS TO FIX", 1)[1]
+    return [line.strip()[2:].split(": ", 1)[0] for line in tail.splitlines() if line.strip().startswith("- ")]
+
+
+def build_content(profile, rng, prompt, malformed=None):
+    fields = repair_fields(prompt)
+    if fields:
+        filler = "revised lorem ipsum " * max(1, profile.entry_bytes // 20 // (2 * len(fields)))
+        return json.dumps({f: [filler.strip()] for f in fields}, ensure_ascii=False), 1
+    words, batch = target_words(prompt)
+    if batch:
+        data = {w: fake_entry(w, profile.entry_bytes) for w in words}
+    else:
+        data = fake_entry(words[0], profile.entry_bytes)
+    content = json.dumps(data, ensure_ascii=False)
+    if rng.random() < profile.comments:
+        content = json.dumps(data, ensure_ascii=False, indent=2)
+        content = content.replace('\n  "', '\n  // 🔥 SMART PARADIGM\n  "', 1).replace("]\n", "],\n")
+    if rng.random() < (profile.malformed if malformed is None else malformed):
+        content = content[:int(len(content) * rng.uniform(0.3, 0.9))]
+    elif rng.random() < profile.prose:
+        content = f"Sure! Here is the entry you asked for:\n```json\n{content}\n```\nLet me know if you need more."
+    return content, len(words)
+
+
+def usage_for(profile, messages, content):
+    prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": int(prompt_tokens * profile.cached_ratio)},
+    }
+
+
+# ================= HTTP =================
+class MockServer:
+    def __init__(self, profile):
+        self.profile = profile
+        self.rng = random.Random(profile.seed)
+        self.active = 0
+        self.stats = {"requests": 0, "429": 0, "5xx": 0, "timeouts": 0}
+
+    def latency(self, entries):
+        p = self.profile
+        base = p.median * math.exp(self.rng.gauss(0, p.sigma))
+        return base * (1 + p.per_entry * (entries - 1))
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+                method, path = request_line.decode("latin-1").split()[:2]
+                if method == "POST" and path.rstrip("/").endswith("/chat/completions"):
+                    await self.completion(writer, json.loads(body or b"{}"))
+                else:
+                    self.respond(writer, 404, {"error": {"message": f"no route {path}"}})
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def respond(self, writer, status, payload, extra_headers=""):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        reason = {200: "OK", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error"}[status]
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n{extra_headers}\r\n".encode("latin-1") + body
+        )
+
+    async def completion(self, writer, request):
+        p = self.profile
+        self.stats["requests"] += 1
+        self.active += 1
+        try:
+            roll = self.rng.random()
+            if (p.max_concurrency and self.active > p.max_concurrency) or roll < p.rate_429:
+                self.stats["429"] += 1
+                self.respond(writer, 429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                             "Retry-After: 1\r\n")
+                return
+            roll -= p.rate_429
+            if roll < p.rate_5xx:
+                self.stats["5xx"] += 1
+                await asyncio.sleep(self.rng.uniform(0.05, 0.5))
+                self.respond(writer, 500, {"error": {"message": "Internal server error", "type": "server_error"}})
+                return
+            roll -= p.rate_5xx
+            if roll < p.rate_timeout:
+                self.stats["timeouts"] += 1
+                await asyncio.sleep(p.hang)
+
+            messages = request.get("messages", [])
+            cheap = bool(p.cheap_model) and str(request.get("model", "")).startswith(p.cheap_model)
+            content, entries = build_content(p, self.rng, messages[-1]["content"] if messages else "",
+                                             p.cheap_malformed if cheap else None)
+            usage = usage_for(p, messages, content)
+            latency = self.latency(entries) / (p.cheap_speedup if cheap else 1)
+            if request.get("stream"):
+                await self.stream(writer, request, content, usage, latency)
+                return
+            await asyncio.sleep(latency)
+            self.respond(writer, 200, {
+                "id": f"mock-{self.stats['requests']}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+        finally:
+            self.active -= 1
+
+    async def stream(self, writer, request, content, usage, latency):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+
+        def send(payload):
+            data = f"data: {payload}\n\n".encode("utf-8")
+            writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+
+        base = {"id": f"mock-{self.stats['requests']}", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": request.get("model", "mock")}
+        await asyncio.sleep(min(self.profile.ttft, latency))
+        pieces = [content[i:i + 64] for i in range(0, len(content), 64)] or [""]
+        step = max(0.0, latency - self.profile.ttft) / len(pieces)
+        for piece in pieces:
+            send(json.dumps({**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}))
+            await writer.drain()
+            if step:
+                await asyncio.sleep(step)
+        send(json.dumps({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            send(json.dumps({**base, "choices": [], "usage": usage}))
+        send("[DONE]")
+        writer.write(b"0\r\n\r\n")
+
+
+async def serve(profile, host, port):
+    server = MockServer(profile)
+    tcp = await asyncio.start_server(server.handle, host, port, backlog=1024)
+    print(f"mock server on http://{host}:{port}/v1 | {asdict(profile)}", flush=True)
+    async with tcp:
+        await tcp.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的 OpenAI 兼容服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="realistic")
+    for f in fields(MockProfile):
+        parser.add_argument(f"--{f.name.replace('_', '-')}", type=type(f.default), default=None)
+    args = parser.parse_args()
+
+    overrides = {f.name: getattr(args, f.name) for f in fields(MockProfile) if getattr(args, f.name) is not None}
+    profile = MockProfile(**{**asdict(PROFILES[args.profile]), **overrides})
+    try:
+        asyncio.run(serve(profile, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
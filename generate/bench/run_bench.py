@@ -0,0 +1,231 @@
+"""端到端基准测试：起一个本地模拟服务，依次用它跑各语言的生成脚本。
+
+    python bench/run_bench.py --mock-profile realistic --words 500
+    python bench/run_bench.py --languages english,latin --batch-size 5 --label "K=5"
+    python bench/run_bench.py --words 300 --compare bench/results/20250101-120000-abc1234.json
+    python bench/run_bench.py --lag --label inline
+    python bench/run_bench.py --lag --label "4 procs" --compare bench/results/<上一次>.json -- --parse-workers 4
+
+每个语言报告 词/s、单词条延迟 p50/p99、重试和错误分布、峰值 RSS、写库速度，
+--lag 时还报告事件循环延迟（生成脚本以 --profile 运行），
+结果写进 bench/results/<时间>-<commit>.json，用 --compare 与旧结果对比。
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+SCRIPTS = {
+    "english": "english/generate-eng.py",
+    "japanese": "japanese/new_generate-jp.py",
+    "french": "francais/new_batch_french.py",
+    "latin": "latin/generate-latin.py",
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"模拟服务没有在 {timeout}s 内启动")
+
+
+def git_revision():
+    try:
+        sha = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD", "--", "."], cwd=ROOT) != 0
+        return sha + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+# ================= 单个语言 =================
+def run_language(lang, args, port, workdir):
+    db = os.path.join(workdir, f"bench_{lang}.db")
+    log_path = os.path.join(workdir, f"bench_{lang}.log")
+    cmd = [
+        sys.executable, os.path.join(ROOT, SCRIPTS[lang]),
+        "--base-url", f"http://127.0.0.1:{port}/v1", "--api-key", "mock", "--model", "mock-model",
+        "--db", db, "--limit", str(args.words), "--no-cache", "--quiet", "--progress-interval", "5",
+        "--batch-size", str(args.batch_size),
+    ]
+    if args.concurrency:
+        cmd += ["--concurrency", str(args.concurrency)]
+    if args.stream:
+        cmd.append("--stream")
+    if args.lag:
+        cmd.append("--profile")
+    cmd += args.extra
+
+    start = time.time()
+    with open(log_path, "w", encoding="utf-8") as log:
+        proc = subprocess.Popen(cmd, cwd=workdir, stdout=log, stderr=subprocess.STDOUT,
+                                env={**os.environ, "PYTHONUNBUFFERED": "1"})
+        # wait4 返回这个子进程自己的资源用量，ru_maxrss 即峰值 RSS（Linux 上单位是 KB）
+        _, status, rusage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.time() - start
+    with open(log_path, "r", encoding="utf-8") as log:
+        output = log.read()
+
+    result = {
+        "exit_code": proc.returncode,
+        "wall_s": round(wall, 2),
+        "peak_rss_mb": round(rusage.ru_maxrss / 1024, 1),
+        "cpu_s": round(rusage.ru_utime + rusage.ru_stime, 2),
+        "log": log_path,
+    }
+    m = re.search(r"成功 (\d+) / (\d+)，耗时 ([\d.]+)s", output)
+    if m:
+        ok, total, elapsed = int(m.group(1)), int(m.group(2)), float(m.group(3))
+        result.update(ok=ok, scheduled=total, run_s=elapsed, words_per_s=round(ok / max(elapsed, 1e-9), 2))
+    m = re.search(r"写入速度 (\d+) rows/s", output)
+    if m:
+        result["db_rows_per_s"] = int(m.group(1))
+    m = re.search(r"事件循环延迟: \d+ 次采样 \| 平均 ([\d.]+) ms \| 最大 ([\d.]+) ms", output)
+    if m:
+        result["loop_lag_avg_ms"] = float(m.group(1))
+        result["loop_lag_max_ms"] = float(m.group(2))
+
+    if os.path.exists(db):
+        conn = sqlite3.connect(db)
+        try:
+            latencies = [lat / max(n, 1) for lat, n in conn.execute(
+                "SELECT latency, entries FROM metrics WHERE error IS NULL")]
+            result["latency_p50_s"] = round(percentile(latencies, 0.5) or 0, 3)
+            result["latency_p99_s"] = round(percentile(latencies, 0.99) or 0, 3)
+            result["requests"] = conn.execute("SELECT COUNT(*) FROM metrics").fetchone()[0]
+            result["retries"] = conn.execute("SELECT COUNT(*) FROM metrics WHERE attempt > 1").fetchone()[0]
+            result["errors"] = dict(conn.execute(
+                "SELECT error, COUNT(*) FROM metrics WHERE error IS NOT NULL GROUP BY error"))
+            result["queue_wait_p99_s"] = round(percentile(
+                [w for (w,) in conn.execute("SELECT queue_wait FROM metrics")], 0.99) or 0, 3)
+        finally:
+            conn.close()
+    return result
+
+
+# ================= 输出与对比 =================
+COLUMNS = [
+    ("words_per_s", "词/s", "{:.2f}"),
+    ("latency_p50_s", "p50(s)", "{:.2f}"),
+    ("latency_p99_s", "p99(s)", "{:.2f}"),
+    ("retries", "重试", "{}"),
+    ("peak_rss_mb", "RSS(MB)", "{:.0f}"),
+    ("db_rows_per_s", "写库 rows/s", "{}"),
+    ("loop_lag_avg_ms", "循环延迟(ms)", "{:.1f}"),
+    ("loop_lag_max_ms", "最大延迟(ms)", "{:.0f}"),
+]
+
+
+def print_table(results, baseline=None):
+    width = 20 if baseline else 14
+    print(f"\n{'语言':<10}" + "".join(f"{title:>{width}}" for _, title, _ in COLUMNS))
+    for lang, r in results.items():
+        cells = []
+        for key, _, fmt in COLUMNS:
+            value = r.get(key)
+            cell = "-" if value is None else fmt.format(value)
+            old = (baseline or {}).get(lang, {}).get(key)
+            if value is not None and old:
+                cell += f" ({(value - old) / old:+.0%})"
+            cells.append(f"{cell:>{width}}")
+        print(f"{lang:<12}" + "".join(cells))
+        if r.get("errors"):
+            print(f"{'':<12}错误: {r['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用本地模拟服务跑各语言生成脚本的基准测试")
+    parser.add_argument("--languages", default=",".join(SCRIPTS), help="逗号分隔：" + ",".join(SCRIPTS))
+    parser.add_argument("--words", type=int, default=500, help="每个语言处理的词数")
+    parser.add_argument("--mock-profile", default="realistic", help="模拟服务的预设：clean / realistic / hostile")
+    parser.add_argument("--mock-arg", action="append", default=[], help="透传给模拟服务的参数，如 --mock-arg=--rate-429=0.1")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=0, help="AIMD 初始并发，0 表示用脚本默认值")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--lag", action="store_true", help="以 --profile 运行生成脚本，记录事件循环延迟")
+    parser.add_argument("--label", default="", help="写进结果文件的备注")
+    parser.add_argument("--compare", help="与之前保存的结果文件对比")
+    parser.add_argument("--keep", action="store_true", help="保留临时目录（库文件和日志）")
+    parser.add_argument("extra", nargs=argparse.REMAINDER, help="-- 之后的参数原样传给生成脚本")
+    args = parser.parse_args()
+    if args.extra and args.extra[0] == "--":
+        args.extra = args.extra[1:]
+
+    languages = [lang.strip() for lang in args.languages.split(",") if lang.strip()]
+    port = free_port()
+    mock = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "mock_server.py"), "--port", str(port),
+         "--profile", args.mock_profile, *args.mock_arg],
+        stdout=subprocess.DEVNULL,
+    )
+    workdir = tempfile.mkdtemp(prefix="llexidict-bench-")
+    results = {}
+    try:
+        wait_for_port(port)
+        for lang in languages:
+            print(f"▶ {lang}: {args.words} 词 ...", flush=True)
+            results[lang] = run_language(lang, args, port, workdir)
+            r = results[lang]
+            print(f"  完成 (exit {r['exit_code']}, {r['wall_s']}s)，日志 {r['log']}", flush=True)
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "revision": git_revision(),
+        "label": args.label,
+        "python": sys.version.split()[0],
+        "config": {k: v for k, v in vars(args).items() if k not in ("compare", "keep")},
+        "results": results,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{report['revision']}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            old = json.load(f)
+        baseline = old["results"]
+        print(f"\n对比基线: {args.compare} ({old.get('revision')}, {old.get('label') or '无备注'})")
+    print_table(results, baseline)
+    print(f"\n📁 结果已保存: {out}")
+    if not args.keep:
+        for name in os.listdir(workdir):
+            if not name.endswith(".log"):
+                os.remove(os.path.join(workdir, name))
+
+
+if __name__ == "__main__":
+    main()
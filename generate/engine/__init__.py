@@ -0,0 +1,48 @@
+"""LLexiDict 各语言共用的异步生成引擎。
+
+各语言脚本只需构造一个 LanguageSpec（Prompt、数据源、关键词提取），
+然后调用 run(spec)。run 会解析命令行子命令：
+
+    python generate-latin.py                      在线生成
+    python generate-latin.py export-batch --out DIR
+    python generate-latin.py ingest-batch RESULT.jsonl ...
+    python generate-latin.py --cache-only         只用本地响应缓存重建
+    python generate-latin.py --retry-failed       只重跑任务账本里失败的词
+    python generate-latin.py --coverage 0.95      按频率名次只生成覆盖 95% 语料频次的词
+    python generate-latin.py status               查看任务账本
+    python generate-latin.py --backends B.json    在多个后端 / 密钥之间分摊请求
+    python generate-latin.py --cascade CHEAP      先用便宜模型，校验不通过再升级到 MODEL_NAME
+    python generate-latin.py --shard 0/4          只跑第 0 个分片（多台机器各跑一片）
+    python generate-latin.py shards 4             在本机启动 4 个分片进程
+    python generate-latin.py merge                把分片库归并进词典库
+    python generate-latin.py dedup --dry-run      归一化词头，合并同一个词的不同写法
+    python generate-latin.py regen --fields senses.*.examples --where "..."
+                                                  按字段重写已有词条
+    python generate-latin.py cache-export OUT.jsonl
+"""
+
+from .backends import Backend, BackendConfig, CircuitBreaker, ClientPool, load_backends
+from .batchfile import export_batch_files, ingest_batch_results, iter_batch_results
+from .batching import split_batch_response
+from .cache import CacheMiss, ResponseCache, cache_key
+from .cascade import CascadeTier, build_tier_pools, parse_cascade
+from .cli import run
+from .concurrency import AdaptiveLimiter, PriorityLock
+from .dedup import find_duplicates, fold_headword, rank_value, sync_variants, variant_words, write_variants
+from .ledger import LedgerEvent, coverage_cutoff, frequency_coverage, iter_ledger, ledger_summary, seed_ledger
+from .merge import merge_databases, shard_sources
+from .offload import ParsePool, apply_repair, prepare_batch, prepare_entry
+from .parser import JSONParseError, dump_json, repair_json, robust_json_parser
+from .pipeline import (RunContext, call_model, classify_error, main, process_batch, process_row, regenerate_entry,
+                       repair_entry, try_tier, worker)
+from .profiling import LoopLagMonitor, StageProfiler
+from .prompts import compose_batch_prompt, compose_prompt, compose_repair_prompt
+from .ratelimit import RateLimiter, TokenBucket
+from .regenerate import count_selected, iter_selected, parse_fields, regen_problems
+from .scheduler import PriorityScheduler
+from .sharding import base_db_name, parse_shard, run_shards, shard_db_name, shard_of
+from .spec import LanguageSpec, keywords_to_str, load_word_list
+from .storage import DBWriter, count_existing, init_db, iter_pending
+from .streaming import StreamAbort, StreamGuard
+from .telemetry import MetricRecord, Telemetry
+from .validation import apply_patch, expand_path, get_path, set_path
@@ -0,0 +1,253 @@
+import importlib
+import json
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Optional
+
+from .concurrency import AdaptiveLimiter
+from .ratelimit import RateLimiter
+
+
+KEEPALIVE_EXPIRY = 60
+
+
+@dataclass
+class BackendConfig:
+    """一个 OpenAI 兼容的后端：地址、密钥、模型名，以及它自己的配额。"""
+    base_url: str
+    api_key: str
+    model: str
+    name: Optional[str] = None
+    weight: float = 1.0
+    rpm_limit: int = 0
+    tpm_limit: int = 0
+    max_connections: Optional[int] = None  # 默认等于 spec.max_concurrency
+
+
+def load_backends(path):
+    """读取后端列表 JSON：[{"base_url", "api_key" 或 "api_key_env", "model", "weight", ...}]。
+
+    密钥可以写成 api_key_env 从环境变量读取，避免明文写进配置文件。
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    configs = []
+    for i, item in enumerate(items):
+        item = dict(item)
+        env = item.pop("api_key_env", None)
+        if env:
+            item["api_key"] = os.environ[env]
+        item.setdefault("name", f"{i + 1}:{item['base_url']}")
+        configs.append(BackendConfig(**item))
+    return configs
+
+
+def make_client(config, max_connections, timeout):
+    """显式设置连接池上限和 keep-alive，连接复用不依赖 SDK 默认值。"""
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    # Limits / Timeout 必须来自 SDK 实际使用的 HTTP 包（旧版 openai 是 httpx，新版换成了 httpx2）
+    httpx = importlib.import_module(DefaultAsyncHttpxClient.__mro__[1].__module__.split(".")[0])
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(timeout, connect=10.0),
+    )
+    return AsyncOpenAI(api_key=config.api_key, base_url=config.base_url, http_client=http_client, max_retries=0)
+
+
+def is_backend_failure(e):
+    """只有连不上和 5xx 才说明后端不健康。
+
+    限流和超时交给限速器和 AIMD 处理，计入熔断会让单后端的池因为一波 429 整体停下；坏输出是模型的问题。
+    """
+    status = getattr(e, "status_code", None)
+    if status is not None:
+        return status >= 500
+    return "Connect" in type(e).__name__ or isinstance(e, ConnectionError)
+
+
+def never_reached_model(e):
+    """请求确定没到模型：连不上或 429。超时、5xx 时模型多半已经算过，token 照样花掉了。"""
+    status = getattr(e, "status_code", None)
+    if status is not None:
+        return status == 429
+    name = type(e).__name__
+    return ("Connect" in name and "Timeout" not in name) or isinstance(e, ConnectionError)
+
+
+class CircuitBreaker:
+    """连续失败 threshold 次后熔断 cooldown 秒；到期后只放一个探测请求，失败则冷却时间翻倍。"""
+
+    def __init__(self, threshold=5, cooldown=30.0, max_cooldown=300.0):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.trips = 0
+
+    def available(self, now):
+        if self.failures < self.threshold:
+            return True
+        return now >= self.open_until and not self.probing
+
+    def on_success(self):
+        self.failures = 0
+        self.probing = False
+        self.cooldown = self.base_cooldown
+
+    def on_failure(self, now):
+        """记录一次失败，本次触发熔断时返回 True。"""
+        self.failures += 1
+        if self.probing:
+            # 探测失败：重新熔断，冷却加倍
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            self.probing = False
+        elif self.failures != self.threshold:
+            return False
+        self.open_until = now + self.cooldown
+        self.trips += 1
+        return True
+
+
+class Backend:
+    """一个后端的客户端、限速器、AIMD 并发控制和健康状态。"""
+
+    def __init__(self, config, client, limiter, rate_limiter):
+        self.config = config
+        self.name = config.name or config.base_url
+        self.model = config.model
+        self.client = client
+        self.limiter = limiter
+        self.rate_limiter = rate_limiter
+        self.breaker = CircuitBreaker()
+        self.latency_ewma = None
+        self.stats = {"requests": 0, "errors": 0, "latency_sum": 0.0}
+
+    def score(self, now):
+        """越大越该选：权重 / (预计排队后的延迟)，配额要等的后端大幅降权。"""
+        latency = self.latency_ewma or 1.0
+        load = (self.limiter.in_flight + 1) / max(self.limiter.limit, 1)
+        score = self.config.weight / (latency * (1 + load))
+        wait = 0.0
+        if self.rate_limiter.requests:
+            wait = max(wait, self.rate_limiter.requests.wait_time(1))
+        if self.rate_limiter.tokens:
+            wait = max(wait, self.rate_limiter.tokens.wait_time(1))
+        return score / (1 + wait)
+
+    def on_success(self, latency):
+        self.stats["requests"] += 1
+        self.stats["latency_sum"] += latency
+        self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+        self.limiter.on_success(latency)
+        self.breaker.on_success()
+
+    def on_error(self, kind, error=None):
+        """kind 来自 classify_error；只有 is_backend_failure(error) 的错误计入熔断。"""
+        self.stats["requests"] += 1
+        self.stats["errors"] += 1
+        self.limiter.on_error(kind)
+        if error is not None and is_backend_failure(error) and self.breaker.on_failure(time.monotonic()):
+            print(f"🔌 后端熔断: {self.name}，{self.breaker.cooldown:.0f}s 后探测")
+
+
+class ClientPool:
+    """按权重、实测延迟和剩余配额在多个后端之间分配请求。
+
+    每个后端有独立的 RPM/TPM 限速和 AIMD 并发，所以多一个密钥就多一份配额；
+    连续连接失败或 5xx 的后端被熔断，冷却后用单个请求探测是否恢复；
+    全部熔断时不停下，继续用最早恢复的那个（并发仍由它的 AIMD 控制）。
+    """
+
+    def __init__(self, backends):
+        if not backends:
+            raise ValueError("至少需要一个后端")
+        self.backends = backends
+
+    @classmethod
+    def from_spec(cls, spec, configs=None, client=None):
+        """没有配置后端列表时，用 spec 里的 api_key / base_url / model_name 组成单后端池。
+
+        传入 client 时（如测试替身）直接使用，不创建 HTTP 客户端。
+        """
+        if not configs:
+            configs = [BackendConfig(spec.base_url, spec.api_key, spec.model_name, name=spec.base_url or "default",
+                                     rpm_limit=spec.rpm_limit, tpm_limit=spec.tpm_limit)]
+        backends = []
+        for config in configs:
+            limiter = AdaptiveLimiter(spec.concurrency, spec.min_concurrency, spec.max_concurrency)
+            rate_limiter = RateLimiter(config.rpm_limit, config.tpm_limit)
+            backend_client = client
+            if backend_client is None and not spec.cache_only:
+                backend_client = make_client(config, config.max_connections or spec.max_concurrency, spec.timeout)
+            backends.append(Backend(config, backend_client, limiter, rate_limiter))
+        return cls(backends)
+
+    @property
+    def limit(self):
+        return sum(b.limiter.limit for b in self.backends)
+
+    @property
+    def idle(self):
+        """所有后端空闲的并发槽位数。"""
+        return sum(max(0, b.limiter.limit - b.limiter.in_flight) for b in self.backends)
+
+    @property
+    def max_concurrency(self):
+        return sum(b.limiter.max_limit for b in self.backends)
+
+    def pick(self):
+        """按得分加权随机选一个可用后端，返回 (backend, 是否可用)。
+
+        全部熔断时返回最早恢复的那个：最后一个后端也熔断掉只会让所有 worker 干等，
+        不如照常发请求，成功一次熔断器就复位。
+        """
+        now = time.monotonic()
+        available = [b for b in self.backends if b.breaker.available(now)]
+        if not available:
+            return min(self.backends, key=lambda b: b.breaker.open_until), False
+        if len(available) == 1:
+            return available[0], True
+        scores = [b.score(now) for b in available]
+        return random.choices(available, weights=scores)[0], True
+
+    @asynccontextmanager
+    async def acquire(self):
+        """选定后端；熔断器处于探测期时占住探测名额，直到请求结束。"""
+        backend, available = self.pick()
+        breaker = backend.breaker
+        probe = available and breaker.failures >= breaker.threshold
+        if probe:
+            breaker.probing = True
+        try:
+            yield backend
+        finally:
+            if probe and breaker.probing:
+                # 请求被取消、没有走到 on_success / on_failure
+                breaker.probing = False
+
+    async def close(self):
+        closed = set()
+        for b in self.backends:
+            close = getattr(b.client, "close", None)
+            if close is not None and id(b.client) not in closed:
+                closed.add(id(b.client))
+                await close()
+
+    def report(self):
+        if len(self.backends) == 1:
+            return
+        for b in self.backends:
+            s = b.stats
+            ok = s["requests"] - s["errors"]
+            print(f"🔀 {b.name} ({b.model}): 请求 {s['requests']} 次，失败 {s['errors']} | "
+                  f"平均延迟 {s['latency_sum'] / max(ok, 1):.2f}s | 并发 {b.limiter.limit} | 熔断 {b.breaker.trips} 次")
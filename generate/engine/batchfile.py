@@ -0,0 +1,155 @@
+import asyncio
+import json
+import os
+import time
+
+from .cache import ResponseCache, cache_key
+from .dedup import sync_variants, variant_words
+from .offload import prepare_entry
+from .pipeline import build_messages
+from .storage import DBWriter, init_db, iter_pending
+
+
+# OpenAI Batch API 单个输入文件的上限是 50000 个请求、200 MB
+MAX_REQUESTS_PER_FILE = 50000
+MAX_BYTES_PER_FILE = 190 * 1024 * 1024
+
+
+# ================= 导出请求文件 =================
+def batch_request(spec, row, custom_id):
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": spec.model_name,
+            "messages": build_messages(spec, row),
+            "response_format": {"type": "json_object"},
+            "temperature": spec.temperature,
+        },
+    }
+
+
+def export_batch_files(spec, out_dir, max_requests=MAX_REQUESTS_PER_FILE, max_bytes=MAX_BYTES_PER_FILE):
+    """把库中还没有的词写成 Batch API 格式的 JSONL，按请求数和字节数分片。
+
+    custom_id 就是词头，导入结果时据此对回源数据行。返回写出的文件列表。
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    init_db(spec.db_name).close()
+    prefix = os.path.splitext(os.path.basename(spec.db_name))[0]
+
+    paths = []
+    f = None
+    count = size = 0
+    seen = set()
+    sync_variants(spec)
+    variants = variant_words(spec.db_name)
+    try:
+        for row in iter_pending(spec.load_rows(spec.source_path), spec.word_of, spec.db_name):
+            word = spec.word_of(row)
+            # 同一个 custom_id 在一个批次里只能出现一次；分片运行时只导出本分片的词；dedup 归并掉的变体不导出
+            if word in seen or word in variants or not spec.in_shard(word):
+                continue
+            seen.add(word)
+
+            line = (json.dumps(batch_request(spec, row, word), ensure_ascii=False) + "\n").encode("utf-8")
+            if f is None or count >= max_requests or size + len(line) > max_bytes:
+                if f is not None:
+                    f.close()
+                    print(f"📦 {paths[-1]}: {count} 个请求, {size / 1024 / 1024:.1f} MB")
+                paths.append(os.path.join(out_dir, f"{prefix}_batch_{len(paths) + 1:03d}.jsonl"))
+                f = open(paths[-1], "wb")
+                count = size = 0
+            f.write(line)
+            count += 1
+            size += len(line)
+    finally:
+        if f is not None:
+            f.close()
+            print(f"📦 {paths[-1]}: {count} 个请求, {size / 1024 / 1024:.1f} MB")
+
+    if not paths:
+        print("数据库已是最新，无需导出！")
+    else:
+        print(f"✅ 共导出 {len(seen)} 个词，{len(paths)} 个文件 → {out_dir}")
+    return paths
+
+
+# ================= 导入结果文件 =================
+def iter_batch_results(path):
+    """逐行读取 Batch API 结果文件，产出 (custom_id, content, usage, error)。"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            custom_id = record.get("custom_id")
+            response = record.get("response") or {}
+            body = response.get("body") or {}
+            error = record.get("error")
+            if error or response.get("status_code", 200) != 200:
+                yield custom_id, None, None, error or body.get("error") or f"HTTP {response.get('status_code')}"
+                continue
+            try:
+                content = body["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                yield custom_id, None, None, "NO_CONTENT"
+                continue
+            yield custom_id, content, body.get("usage"), None
+
+
+async def ingest_batch_results(spec, paths):
+    """把结果文件流式送进与在线生成相同的解析、关键词提取和批量写库路径。"""
+    # 关键词提取需要源数据行（如拉丁语的 lemma_clean），按词头建索引
+    rows = {}
+    for row in spec.load_rows(spec.source_path):
+        rows.setdefault(spec.word_of(row), row)
+
+    # 结果同时写进响应缓存，之后改了关键词提取也能离线重建
+    cache = ResponseCache(spec.cache_file, spec.cache_max_mb * 1024 * 1024) if spec.use_cache else None
+
+    writer = DBWriter(spec.db_name, spec.durability)
+    queue = writer.queue
+    db_task = asyncio.create_task(writer.run())
+
+    stats = {"ok": 0, "failed": 0, "tokens": 0, "invalid": 0}
+    failed_ids = []
+    start = time.time()
+    for path in paths:
+        print(f"📥 导入 {path} ...")
+        for custom_id, content, usage, error in iter_batch_results(path):
+            row = rows.get(custom_id, custom_id)
+            try:
+                if error:
+                    raise ValueError(error)
+                keywords, data_str, problems = prepare_entry(spec.extract_keywords, spec.validate, row, content)
+                # 离线导入不发修复请求，有问题的词照常入库并列出来
+                if problems:
+                    stats["invalid"] += 1
+                    print(f"⚠️ {custom_id} 有字段未通过校验: {problems}")
+                await queue.put((custom_id, keywords, data_str))
+                stats["ok"] += 1
+                if cache is not None and custom_id in rows:
+                    request = batch_request(spec, row, custom_id)["body"]
+                    key = cache_key(spec.model_name, request["messages"], spec.temperature, request["response_format"])
+                    cache.put(key, spec.model_name, content, usage)
+                if usage:
+                    stats["tokens"] += usage.get("total_tokens", 0)
+            except Exception as e:
+                stats["failed"] += 1
+                failed_ids.append(custom_id)
+                print(f"❌ {custom_id} 导入失败 | {e}")
+
+    await writer.close(db_task)
+    if cache is not None:
+        cache.close()
+
+    elapsed = time.time() - start
+    print(f"✅ 导入完成：成功 {stats['ok']}，失败 {stats['failed']}，"
+          f"{stats['ok'] / max(elapsed, 1e-9):.0f} 词/s，共 {stats['tokens']} tokens，"
+          f"未通过校验 {stats['invalid']}")
+    if failed_ids:
+        print(f"⚠️ 失败的词仍不在库中，重新导出即可再次生成: {failed_ids[:20]}{' ...' if len(failed_ids) > 20 else ''}")
+    return stats
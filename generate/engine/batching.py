@@ -0,0 +1,42 @@
+import unicodedata
+
+
+# ================= 拆分批量结果 =================
+def _strict_key(word):
+    return unicodedata.normalize("NFC", str(word)).strip().casefold()
+
+
+def _loose_key(word):
+    # 第二次匹配时去掉附加符号：模型偶尔会在键名里丢掉拉丁语长音符
+    decomposed = unicodedata.normalize("NFD", _strict_key(word))
+    return "".join(c for c in decomposed if unicodedata.category(c) != "Mn")
+
+
+def split_batch_response(data, words):
+    """把按词头组织的批量结果拆成 {word: entry}，返回 (entries, missing)。
+
+    缺失或不是对象的条目算作 missing，由调用方单独重试。
+    """
+    # 兼容模型把结果再包一层，如 {"entries": {...}}
+    if isinstance(data, dict) and len(data) == 1 and len(words) > 1:
+        (key, inner), = data.items()
+        known = {_loose_key(w) for w in words}
+        if isinstance(inner, dict) and _loose_key(key) not in known:
+            data = inner
+    if not isinstance(data, dict):
+        return {}, list(words)
+
+    strict = {_strict_key(k): v for k, v in data.items()}
+    loose = {_loose_key(k): v for k, v in data.items()}
+
+    entries = {}
+    missing = []
+    for word in words:
+        entry = strict.get(_strict_key(word))
+        if entry is None:
+            entry = loose.get(_loose_key(word))
+        if isinstance(entry, dict) and entry:
+            entries[word] = entry
+        else:
+            missing.append(word)
+    return entries, missing
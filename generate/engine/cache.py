@@ -0,0 +1,145 @@
+import hashlib
+import json
+import sqlite3
+import time
+import zlib
+from types import SimpleNamespace
+
+
+class CacheMiss(Exception):
+    """--cache-only 模式下缓存未命中；不发 API 请求，也不重试。"""
+
+
+def cache_key(model, messages, temperature, response_format):
+    """请求内容的 sha256；参数完全相同的请求才会命中。"""
+    payload = json.dumps(
+        {"model": model, "messages": messages, "temperature": temperature, "response_format": response_format},
+        ensure_ascii=False, sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cached_response(content, usage):
+    """把缓存内容包装成与 SDK 返回值同形的对象，下游代码无需区分来源。"""
+    usage_ns = SimpleNamespace(**usage) if usage else None
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=usage_ns,
+        from_cache=True,
+    )
+
+
+class ResponseCache:
+    """按请求哈希保存原始 LLM 输出的本地缓存（SQLite + zlib）。
+
+    改了关键词提取或表结构后，可以直接用缓存重建词典而不必再付一次 API 费用。
+    总体积超过 max_bytes 时按最近访问时间淘汰。
+    """
+
+    def __init__(self, path, max_bytes=2 * 1024 ** 3):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("PRAGMA synchronous=NORMAL;")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                content BLOB,
+                usage TEXT,
+                size INTEGER,
+                created_at REAL,
+                accessed_at REAL
+            )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+        self.conn.commit()
+        self._size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key):
+        row = self.conn.execute("SELECT content, usage FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        self.conn.commit()
+        content = zlib.decompress(row[0]).decode("utf-8")
+        usage = json.loads(row[1]) if row[1] else None
+        return content, usage
+
+    def discard(self, key):
+        old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        if old is None:
+            return
+        self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self.conn.commit()
+        self._size -= old[0]
+
+    def put(self, key, model, content, usage=None):
+        blob = zlib.compress(content.encode("utf-8"), 6)
+        now = time.time()
+        old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (key, model, content, usage, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, model, blob, json.dumps(usage) if usage else None, len(blob), now, now),
+        )
+        self.conn.commit()
+        self._size += len(blob) - (old[0] if old else 0)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def evict(self, target_ratio=0.9):
+        """删除最久未访问的条目，直到体积降到 max_bytes * target_ratio 以下。"""
+        target = self.max_bytes * target_ratio
+        removed = 0
+        while self._size > target:
+            rows = self.conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed_at LIMIT 500"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._size <= target:
+                    break
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._size -= size
+                removed += 1
+            self.conn.commit()
+        if removed:
+            print(f"🧹 缓存淘汰 {removed} 条，当前 {self._size / 1024 / 1024:.1f} MB")
+        return removed
+
+    def stats(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"entries": count, "bytes": self._size}
+
+    def export(self, out_path):
+        """导出为 JSONL（每行 key / model / content / usage / created_at），返回条数。"""
+        n = 0
+        with open(out_path, "w", encoding="utf-8") as f:
+            for key, model, blob, usage, created_at in self.conn.execute(
+                "SELECT key, model, content, usage, created_at FROM responses ORDER BY created_at"
+            ):
+                record = {
+                    "key": key,
+                    "model": model,
+                    "content": zlib.decompress(blob).decode("utf-8"),
+                    "usage": json.loads(usage) if usage else None,
+                    "created_at": created_at,
+                }
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                n += 1
+        return n
+
+    def close(self):
+        self.conn.close()
+
+
+def usage_to_dict(usage):
+    if usage is None:
+        return None
+    if isinstance(usage, dict):
+        return usage
+    if hasattr(usage, "model_dump"):
+        return usage.model_dump()
+    return {k: getattr(usage, k) for k in ("prompt_tokens", "completion_tokens", "total_tokens") if hasattr(usage, k)}
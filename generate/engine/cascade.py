@@ -0,0 +1,66 @@
+import dataclasses
+from dataclasses import dataclass
+
+from .backends import BackendConfig, ClientPool, load_backends
+
+
+@dataclass
+class CascadeTier:
+    """模型级联里的一档：名字和本次运行的命中统计。
+
+    words 是到达这一档的词数，accepted 是在这一档通过校验入库的词数，
+    其余的（解析失败、校验不通过）升级到下一档；最后一档不再升级，修不好的照常入库或记失败。
+    """
+    name: str
+    level: int
+    words: int = 0
+    accepted: int = 0
+    requests: int = 0
+    tokens: int = 0
+    latency_sum: float = 0.0   # 成功请求的耗时之和（不含排队、退避）
+
+    @property
+    def escalated(self):
+        return self.words - self.accepted
+
+
+def parse_cascade(text):
+    """--cascade 参数：逗号分隔、便宜的在前，每项是模型名或后端配置 JSON 文件。"""
+    return tuple(item.strip() for item in text.split(",") if item.strip())
+
+
+def tier_spec(spec, item):
+    """级联里一个便宜档对应的 spec 和后端配置。
+
+    item 以 .json 结尾时按 --backends 的格式读取后端列表，否则当作模型名，
+    沿用 spec 的地址、密钥和限额。spec.model_name 换成这一档的模型，缓存键因此各档分开。
+    """
+    if item.endswith(".json"):
+        configs = load_backends(item)
+        model = configs[0].model
+    else:
+        model = item
+        configs = [BackendConfig(spec.base_url, spec.api_key, model, name=model,
+                                 rpm_limit=spec.rpm_limit, tpm_limit=spec.tpm_limit)]
+    return dataclasses.replace(spec, model_name=model, backends_file=None), configs
+
+
+def build_tier_pools(spec, client=None):
+    """为 spec.cascade 里每个便宜档创建独立的客户端池（各自的限速、AIMD 并发和熔断），
+    返回 [(tier_spec, pool)]。"""
+    tiers = []
+    for item in spec.cascade:
+        sub_spec, configs = tier_spec(spec, item)
+        tiers.append((sub_spec, ClientPool.from_spec(sub_spec, configs, client)))
+    return tiers
+
+
+def print_cascade_report(tiers, total_words):
+    total = max(total_words, 1)
+    for tier in tiers:
+        words = max(tier.words, 1)
+        missed = "失败" if tier is tiers[-1] else "升级"
+        print(f"🪜 第 {tier.level + 1} 档 {tier.name}: 到达 {tier.words} 词，命中 {tier.accepted} "
+              f"({tier.accepted / words:.0%})，{missed} {tier.escalated} | "
+              f"平均延迟 {tier.latency_sum / max(tier.requests, 1):.2f}s | "
+              f"{tier.requests} 次请求 {tier.tokens} tokens，折合全部词 {tier.tokens / total:.0f} tokens/词")
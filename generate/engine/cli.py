@@ -0,0 +1,190 @@
+import argparse
+import asyncio
+import dataclasses
+import os
+import sqlite3
+import sys
+
+from .batchfile import MAX_BYTES_PER_FILE, MAX_REQUESTS_PER_FILE, export_batch_files, ingest_batch_results
+from .cache import ResponseCache
+from .cascade import parse_cascade
+from .ledger import ledger_summary
+from .dedup import find_duplicates, print_dedup_report, write_variants
+from .merge import MERGE_POLICIES, merge_databases, print_merge_report, shard_sources
+from .offload import PARSE_POOLS
+from .pipeline import main
+from .regenerate import count_selected, parse_fields
+from .sharding import parse_shard, run_shards, shard_db_name
+from .storage import DURABILITY_PROFILES, init_db
+
+
+def build_parser(spec):
+    parser = argparse.ArgumentParser(description=f"{spec.name}词典生成")
+    sub = parser.add_subparsers(dest="command")
+
+    parser.add_argument("--base-url", default=spec.base_url, help="覆盖脚本里的 BASE_URL（如本地模拟服务）")
+    parser.add_argument("--api-key", default=spec.api_key, help="覆盖脚本里的 API_KEY")
+    parser.add_argument("--model", default=spec.model_name, help="覆盖脚本里的 MODEL_NAME")
+    parser.add_argument("--cascade", type=parse_cascade, default=spec.cascade,
+                        help="模型级联：逗号分隔的便宜模型（或后端配置 JSON），先试便宜的，校验不通过再升级到 --model")
+    parser.add_argument("--db", default=spec.db_name, help="词典库路径")
+    parser.add_argument("--limit", type=int, default=spec.limit, help="本次最多处理的词数，0 表示不限")
+    parser.add_argument("--coverage", type=float, default=spec.coverage,
+                        help="只生成按频率名次累计覆盖这个比例语料频次的词，如 0.95；0 表示全部")
+    parser.add_argument("--batch-size", type=int, default=spec.batch_size, help="每次请求的词数 K")
+    parser.add_argument("--concurrency", type=int, default=spec.concurrency, help="AIMD 初始并发")
+    parser.add_argument("--stream", action="store_true", help="流式接收并在输出明显损坏时提前中止")
+    parser.add_argument("--no-cache", action="store_true", help="不读写本地响应缓存")
+    parser.add_argument("--cache-only", action="store_true", help="只用本地缓存重建词典，不调用 API")
+    parser.add_argument("--cache-max-mb", type=int, default=spec.cache_max_mb, help="本地缓存体积上限 (MB)")
+    parser.add_argument("--durability", choices=sorted(DURABILITY_PROFILES), default=spec.durability,
+                        help="写库持久化档位：normal=WAL+NORMAL，full=每次提交 fsync，off=不 fsync（仅限可重建的导入）")
+    parser.add_argument("--backends", default=spec.backends_file,
+                        help="多后端配置 JSON：[{base_url, api_key 或 api_key_env, model, weight, rpm_limit, tpm_limit}]")
+    parser.add_argument("--hedge", action="store_true", help="慢请求超过 p95 延迟后发备份请求，缩短收尾时间")
+    parser.add_argument("--hedge-budget", type=float, default=spec.hedge_budget, help="对冲请求占总请求数的比例上限")
+    parser.add_argument("--fixed-timeout", action="store_true", help="不按延迟分位数收紧超时，始终用固定超时")
+    parser.add_argument("--quiet", action="store_true", help="不逐词打印成功行，只输出定时进度")
+    parser.add_argument("--progress-interval", type=float, default=spec.progress_interval, help="进度行间隔 (秒)")
+    parser.add_argument("--metrics-port", type=int, default=spec.metrics_port, help="在本地端口提供 Prometheus /metrics")
+    parser.add_argument("--profile", action="store_true", help="统计各阶段耗时和事件循环延迟，结束时打印直方图")
+    parser.add_argument("--parse-workers", type=int, default=spec.parse_workers,
+                        help="解析、修复和关键词提取用的进程（线程）数，0 表示在事件循环里直接做")
+    parser.add_argument("--parse-pool", choices=PARSE_POOLS, default=spec.parse_pool,
+                        help="解析池类型：process 真正并行；thread 开销小，但解析不释放 GIL")
+    parser.add_argument("--retry-failed", action="store_true", help="只重跑任务账本里失败的词")
+    parser.add_argument("--shard", type=parse_shard, metavar="I/N",
+                        help="只处理第 I 个分片（共 N 个，I 从 0 开始），写入独立的分片库；多台机器各跑一个分片")
+
+    sub.add_parser("generate", help="在线生成（默认）")
+
+    p = sub.add_parser("export-batch", help="把待生成的词导出为 Batch API 请求文件 (JSONL)")
+    p.add_argument("--out", default="batch_requests", help="输出目录")
+    p.add_argument("--max-requests", type=int, default=MAX_REQUESTS_PER_FILE, help="每个文件的最大请求数")
+    p.add_argument("--max-mb", type=float, default=MAX_BYTES_PER_FILE / 1024 / 1024, help="每个文件的最大体积 (MB)")
+
+    p = sub.add_parser("ingest-batch", help="导入 Batch API 结果文件")
+    p.add_argument("files", nargs="+", help="结果 JSONL 文件")
+
+    p = sub.add_parser("cache-export", help="把本地响应缓存导出为 JSONL")
+    p.add_argument("out", help="输出文件")
+
+    sub.add_parser("cache-stats", help="查看本地响应缓存的条数和体积")
+
+    sub.add_parser("status", help="查看任务账本中各状态的词数和失败原因")
+
+    p = sub.add_parser("shards", help="在本机启动 N 个分片进程并行生成，各写各的分片库")
+    p.add_argument("count", type=int, help="分片数 N")
+    p.add_argument("--poll", type=float, default=30.0, help="汇总各分片进度的间隔 (秒)")
+
+    p = sub.add_parser("merge", help="把多个词典库（分片库、局部库）按词流式归并进 --db")
+    p.add_argument("sources", nargs="*", help="源库；不给时合并 --db 对应的全部分片库")
+    p.add_argument("--policy", choices=MERGE_POLICIES, default="newest",
+                   help="同一个词的取舍：newest=created_at 最新，longest=能解析的最长词条，prefer=优先 --prefer 库")
+    p.add_argument("--prefer", help="prefer 策略优先采用的源库")
+
+    p = sub.add_parser("regen", help="按字段重写库里已有的词条，只请求指定字段，其余字段作为上下文")
+    p.add_argument("--fields", type=parse_fields, required=True,
+                   help="逗号分隔的字段路径，可以用 * 匹配列表项，如 senses.*.examples,cultural_decoding")
+    p.add_argument("--where", default="1",
+                   help="选择词条的 SQL 条件，可用 word / data 列和 JSON 函数，如 \"json_extract(data, '$.pos') = 'n.'\"")
+    p.add_argument("--note", default="", help="写给模型的重写要求，如 'use more colloquial examples'")
+
+    p = sub.add_parser("dedup", help="生成前按语言归一化词头，合并同一个词的不同写法，写入 variants 映射表")
+    p.add_argument("--dry-run", action="store_true", help="只打印会合并哪些写法，不写库")
+    p.add_argument("--show", type=int, default=20, help="打印的合并组数")
+
+    return parser
+
+
+def run(spec, argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    args = build_parser(spec).parse_args(argv)
+    if args.command == "shards":
+        # 子进程沿用子命令之前的全局参数，各自加上 --shard i/N
+        passthrough = argv[:argv.index("shards")]
+        codes = run_shards(os.path.abspath(sys.argv[0]), args.count, passthrough, args.db, args.poll)
+        sys.exit(max(codes, key=abs))
+
+    shard_index, shard_count = args.shard or (0, 1)
+    if shard_count > 1:
+        args.db = shard_db_name(args.db, shard_index, shard_count)
+        # 同一台机器上的分片各占一个端口
+        if args.metrics_port:
+            args.metrics_port += shard_index
+    spec = dataclasses.replace(
+        spec,
+        base_url=args.base_url,
+        api_key=args.api_key,
+        model_name=args.model,
+        cascade=args.cascade,
+        db_name=args.db,
+        limit=args.limit,
+        coverage=args.coverage,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        use_cache=not args.no_cache,
+        cache_only=args.cache_only,
+        cache_max_mb=args.cache_max_mb,
+        stream=args.stream or spec.stream,
+        retry_failed=args.retry_failed,
+        durability=args.durability,
+        backends_file=args.backends,
+        hedge=args.hedge or spec.hedge,
+        hedge_budget=args.hedge_budget,
+        adaptive_timeout=spec.adaptive_timeout and not args.fixed_timeout,
+        quiet=args.quiet or spec.quiet,
+        progress_interval=args.progress_interval,
+        metrics_port=args.metrics_port,
+        profile=args.profile or spec.profile,
+        parse_workers=args.parse_workers,
+        parse_pool=args.parse_pool,
+        shard_index=shard_index,
+        shard_count=shard_count,
+    )
+
+    if args.command in ("cache-export", "cache-stats"):
+        cache = ResponseCache(spec.cache_file, spec.cache_max_mb * 1024 * 1024)
+        if args.command == "cache-export":
+            print(f"✅ 已导出 {cache.export(args.out)} 条 → {args.out}")
+        else:
+            stats = cache.stats()
+            print(f"🗄️ {spec.cache_file}: {stats['entries']} 条, {stats['bytes'] / 1024 / 1024:.1f} MB")
+        cache.close()
+    elif args.command == "status":
+        init_db(spec.db_name).close()
+        states, errors = ledger_summary(spec.db_name)
+        print(f"📒 {spec.db_name}: " + " | ".join(f"{k} {v}" for k, v in sorted(states.items())) if states else "📒 任务账本为空")
+        for kind, n in sorted(errors.items(), key=lambda x: -x[1]):
+            print(f"   failed/{kind}: {n}")
+    elif args.command == "merge":
+        sources = args.sources or shard_sources(spec.db_name)
+        if not sources:
+            print(f"❌ 没有找到 {spec.db_name} 的分片库，请指定源库")
+            sys.exit(1)
+        print_merge_report(merge_databases(sources, spec.db_name, args.policy, args.prefer), spec.db_name)
+    elif args.command == "dedup":
+        mapping, report = find_duplicates(spec)
+        print_dedup_report(report, args.show)
+        if not args.dry_run:
+            # 带 --shard 时也写进主库：映射是全表的，各分片建账时从主库同步
+            init_db(spec.variants_db).close()
+            write_variants(spec.variants_db, mapping)
+            print(f"✅ 已写入 {len(mapping)} 条写法映射 → {spec.variants_db} (variants 表)，下次生成时跳过变体")
+    elif args.command == "regen":
+        if not os.path.exists(spec.db_name):
+            print(f"❌ 找不到词典库 {spec.db_name}")
+            sys.exit(1)
+        try:
+            count_selected(spec.db_name, args.where)
+        except sqlite3.Error as e:
+            print(f"❌ --where 条件无效: {e}")
+            sys.exit(1)
+        spec = dataclasses.replace(spec, regen_fields=args.fields, regen_where=args.where, regen_note=args.note)
+        asyncio.run(main(spec))
+    elif args.command == "export-batch":
+        export_batch_files(spec, args.out, args.max_requests, int(args.max_mb * 1024 * 1024))
+    elif args.command == "ingest-batch":
+        asyncio.run(ingest_batch_results(spec, args.files))
+    else:
+        asyncio.run(main(spec))
@@ -0,0 +1,133 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+
+
+class PriorityLock:
+    """按优先级交出的 asyncio 锁：priority 小的先拿到，同优先级先到先得。"""
+
+    def __init__(self):
+        self._locked = False
+        self._waiters = []   # (priority, 到达序号, future)
+        self._tickets = itertools.count()
+
+    @asynccontextmanager
+    async def hold(self, priority=0):
+        if self._locked or self._waiters:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._tickets), future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                # 已经轮到自己但在恢复前被取消：把锁交给下一个
+                if future.done() and not future.cancelled():
+                    self._release()
+                raise
+        else:
+            self._locked = True
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        # 锁直接交给优先级最高的等待者，不经过“释放再抢”；被取消的等待者跳过
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._locked = False
+
+
+class AdaptiveLimiter:
+    """AIMD 自适应并发控制。
+
+    延迟和错误率正常时，每完成约一个窗口（limit 个请求）上限 +1；
+    遇到 429 或超时时上限乘以 decrease_factor。每个延迟窗口（约一次往返）
+    内只下调一次，避免同一波 429 把并发直接砍到底。
+    槽位按 priority 交出（小的先，同优先级先到先得），并发被压低时名次靠前的词先发。
+    """
+
+    def __init__(self, initial, min_limit=1, max_limit=256, decrease_factor=0.5,
+                 latency_tolerance=2.0, cooldown=None):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+
+        self._limit = float(max(min_limit, min(initial, max_limit)))
+        self._in_flight = 0
+        self._cond = asyncio.Condition()
+        self._waiting = []   # (priority, 到达序号)
+        self._tickets = itertools.count()
+        self._last_decrease = 0.0
+
+        # 延迟基线：取观察到的最低 EWMA，代表“不拥塞”时的延迟
+        self._latency_ewma = None
+        self._latency_floor = None
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    @asynccontextmanager
+    async def slot(self, priority=0):
+        async with self._cond:
+            entry = (priority, next(self._tickets))
+            heapq.heappush(self._waiting, entry)
+            try:
+                await self._cond.wait_for(lambda: self._waiting[0] is entry and self._in_flight < self.limit)
+            except asyncio.CancelledError:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._waiting)
+            self._in_flight += 1
+            # 还有空位时让下一个等待者接着检查
+            self._cond.notify_all()
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def on_success(self, latency):
+        if self._latency_ewma is None:
+            self._latency_ewma = latency
+        else:
+            self._latency_ewma = 0.8 * self._latency_ewma + 0.2 * latency
+        if self._latency_floor is None or self._latency_ewma < self._latency_floor:
+            self._latency_floor = self._latency_ewma
+
+        # 延迟明显高于基线说明服务端已在排队，此时只保持不增长
+        if self._latency_ewma > self._latency_floor * self.latency_tolerance:
+            return
+        # 在 slot 释放前调用：释放时的 notify_all 会让等待者按新上限重新检查
+        if self._limit < self.max_limit:
+            self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+
+    def on_error(self, kind):
+        """kind 来自 classify_error；只有限流和超时才视为拥塞信号。"""
+        if kind not in ("rate_limit", "timeout"):
+            return
+        now = time.monotonic()
+        cooldown = self.cooldown if self.cooldown is not None else (self._latency_ewma or 1.0)
+        if now - self._last_decrease < cooldown:
+            return
+        self._last_decrease = now
+        old = self.limit
+        self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+        # 拥塞后重置基线，让新的延迟水平重新建立
+        self._latency_floor = self._latency_ewma
+        if self.limit != old:
+            print(f"📉 并发下调: {old} → {self.limit} ({kind})")
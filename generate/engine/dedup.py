@@ -0,0 +1,159 @@
+import math
+import os
+import re
+import sqlite3
+import unicodedata
+from collections import defaultdict
+
+
+# 查词时的写法映射：variant 是变体（或别名），canonical 是库里实际生成的词头
+VARIANTS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS variants (
+        variant TEXT PRIMARY KEY,
+        canonical TEXT NOT NULL,
+        reason TEXT
+    );
+'''
+
+_SPACES = re.compile(r"\s+")
+
+
+def fold_headword(word):
+    """通用的归一化：NFKC（统一全角半角、兼容字符）、casefold、合并空白。"""
+    return _SPACES.sub(" ", unicodedata.normalize("NFKC", str(word)).casefold()).strip()
+
+
+def find_duplicates(spec):
+    """读一遍源文件，按 spec.dedup_key（默认 fold_headword(词头)）把同一个词的不同写法聚成一组。
+
+    每组保留频率名次最高（spec.rank 最小，默认源文件里最靠前）的写法，其余写法记为它的变体；
+    spec.aliases 给出的其它写法在不与任何词头、也不与其它别名冲突时记为别名。
+    同一个词头出现多次的行只统计：键不同的是共用词头的同形词，账本里只会生成排在前面的那个。
+    返回 (mapping, report)：mapping 是 {variant: (canonical, reason)}。
+    """
+    groups = {}          # 归一化键 -> [(名次, 源文件行号, 词头)]
+    first_key = {}       # 词头 -> 第一次出现时的键
+    homographs = []
+    alias_targets = defaultdict(set)
+    rows = exact = 0
+    for index, row in enumerate(spec.load_rows(spec.source_path)):
+        rows += 1
+        word = spec.word_of(row)
+        key = spec.dedup_key(row) if spec.dedup_key else fold_headword(word)
+        if word in first_key:
+            exact += 1
+            if first_key[word] != key:
+                homographs.append(word)
+            continue
+        first_key[word] = key
+        rank = spec.rank(row) if spec.rank else index
+        groups.setdefault(key, []).append((rank, index, word))
+        for alias in (spec.aliases(row) if spec.aliases else ()):
+            if alias and alias != word:
+                alias_targets[alias].add(word)
+
+    mapping = {}
+    clusters = []
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        members.sort()
+        canonical = members[0][2]
+        clusters.append([canonical] + [w for _, _, w in members[1:]])
+        for _, _, word in members[1:]:
+            mapping[word] = (canonical, "variant")
+
+    headwords = set(first_key)
+    aliases = 0
+    for alias, targets in alias_targets.items():
+        # 指向变体的别名改指向保留的写法
+        targets = {mapping[t][0] if t in mapping else t for t in targets}
+        if len(targets) == 1 and alias not in headwords:
+            mapping[alias] = (targets.pop(), "alias")
+            aliases += 1
+
+    report = {
+        "rows": rows,
+        "headwords": len(headwords),
+        "exact": exact,
+        "clusters": clusters,
+        "removed": sum(len(c) - 1 for c in clusters),
+        "aliases": aliases,
+        "homographs": homographs,
+    }
+    return mapping, report
+
+
+def write_variants(db_name, mapping):
+    """整表替换 variants，并让任务账本下次运行时重新读源文件、按新的映射剔除变体。"""
+    conn = sqlite3.connect(db_name)
+    try:
+        conn.execute("DELETE FROM variants")
+        conn.executemany("INSERT INTO variants (variant, canonical, reason) VALUES (?, ?, ?)",
+                         [(variant, canonical, reason) for variant, (canonical, reason) in mapping.items()])
+        conn.execute("DELETE FROM ledger_meta WHERE key = 'source'")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _read_variants(conn):
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'variants'").fetchone() is None:
+        return set()
+    return set(conn.execute("SELECT variant, canonical, reason FROM variants"))
+
+
+def sync_variants(spec):
+    """分片运行时把主库（spec.variants_db）的 variants 映射抄进分片库。
+
+    映射有变化时清掉分片库的源文件签名，让 seed_ledger 重新读源文件、剔除变体。
+    调用前分片库需已 init_db；主库不存在（没跑过 dedup）时什么都不做。
+    """
+    if spec.variants_db == spec.db_name or not os.path.exists(spec.variants_db):
+        return
+    base = sqlite3.connect(spec.variants_db)
+    try:
+        mapping = _read_variants(base)
+    finally:
+        base.close()
+    conn = sqlite3.connect(spec.db_name)
+    try:
+        if _read_variants(conn) == mapping:
+            return
+        conn.execute("DELETE FROM variants")
+        conn.executemany("INSERT INTO variants (variant, canonical, reason) VALUES (?, ?, ?)", sorted(mapping))
+        conn.execute("DELETE FROM ledger_meta WHERE key = 'source'")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def variant_words(db_name):
+    """已经归并到别的写法、不需要再生成的词头。"""
+    conn = sqlite3.connect(db_name)
+    try:
+        return {row[0] for row in conn.execute("SELECT variant FROM variants WHERE reason = 'variant'")}
+    finally:
+        conn.close()
+
+
+def rank_value(value):
+    """把源数据里的名次字段转成可比较的数；缺失或不是数字时排在最后。"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.inf
+
+
+def print_dedup_report(report, show=10):
+    print(f"🔎 源文件 {report['rows']} 行，{report['headwords']} 个不同词头"
+          f"（词头重复的行 {report['exact']} 行，账本本来就只登记一次）")
+    print(f"🧹 归一化后合并 {len(report['clusters'])} 组，去掉 {report['removed']} 个变体"
+          f"（省下 {report['removed']} 次生成），另记别名 {report['aliases']} 个")
+    for cluster in report["clusters"][:show]:
+        print(f"   {cluster[0]} ← {', '.join(cluster[1:])}")
+    if len(report["clusters"]) > show:
+        print(f"   ... 共 {len(report['clusters'])} 组")
+    if report["homographs"]:
+        print(f"⚠️ {len(report['homographs'])} 个词头对应多个不同的词（同形词），只会生成排在前面的那个: "
+              f"{report['homographs'][:show]}")
@@ -0,0 +1,40 @@
+from collections import deque
+
+
+class LatencyTracker:
+    """最近 window 次成功请求的单词条延迟，用来推算超时和对冲时机。
+
+    样本不足 min_samples 时不给出估计，调用方退回固定超时。
+    分位数每 refresh 次观测重算一次，避免每个请求都排序。
+    """
+
+    def __init__(self, window=500, min_samples=50, refresh=20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.refresh = refresh
+        self._since_refresh = 0
+        self._sorted = []
+
+    def observe(self, latency):
+        self.samples.append(latency)
+        self._since_refresh += 1
+        if self._since_refresh >= self.refresh:
+            self._sorted = sorted(self.samples)
+            self._since_refresh = 0
+
+    @property
+    def ready(self):
+        return len(self._sorted) >= self.min_samples
+
+    def percentile(self, q):
+        if not self.ready:
+            return None
+        index = min(len(self._sorted) - 1, int(q * len(self._sorted)))
+        return self._sorted[index]
+
+    def timeout(self, ceiling, floor=30.0, multiplier=3.0):
+        """p99 的 multiplier 倍，限制在 [floor, ceiling] 之间；样本不足时就是 ceiling。"""
+        p99 = self.percentile(0.99)
+        if p99 is None:
+            return ceiling
+        return min(ceiling, max(floor, p99 * multiplier))
@@ -0,0 +1,227 @@
+import json
+import math
+import os
+import sqlite3
+from collections import namedtuple
+
+from .dedup import sync_variants
+
+
+# 每个词头在 jobs 表里的状态：pending / in_flight / done / failed
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+# 通过写库队列发给 db_writer 的状态变更；state 为 None 时只累加尝试次数 / 记录错误
+LedgerEvent = namedtuple("LedgerEvent", ["word", "state", "attempts", "error"])
+
+# priority 是调度顺序（spec.rank 给的频率名次，默认源文件顺序，越小越先生成）；
+# weight 是语料频次（spec.weight），为空时按名次估计，见 frequency_mass
+LEDGER_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS jobs (
+        word TEXT PRIMARY KEY,
+        seq INTEGER,
+        priority REAL,
+        weight REAL,
+        state TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        payload TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state, seq);
+    CREATE TABLE IF NOT EXISTS ledger_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+'''
+
+EVENT_SQL = '''
+    UPDATE jobs SET
+        state = COALESCE(?, state),
+        attempts = attempts + ?,
+        last_error = COALESCE(?, last_error),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE word = ?
+'''
+DONE_SQL = "UPDATE jobs SET state = 'done', attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP WHERE word = ?"
+
+
+def upgrade_ledger(cursor):
+    """旧账本没有 priority / weight 列时补上，先按 seq 填优先级，并清掉源文件签名让下次建账重新读名次。"""
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(jobs)")]
+    if 'priority' not in columns:
+        cursor.execute("ALTER TABLE jobs ADD COLUMN priority REAL")
+        cursor.execute("ALTER TABLE jobs ADD COLUMN weight REAL")
+        cursor.execute("UPDATE jobs SET priority = seq")
+        cursor.execute("DELETE FROM ledger_meta WHERE key = 'source'")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_priority ON jobs(state, priority, seq)")
+
+
+def apply_events(conn, events):
+    conn.executemany(EVENT_SQL, [(e.state, e.attempts, e.error, e.word) for e in events])
+
+
+def mark_done(conn, words):
+    conn.executemany(DONE_SQL, [(w,) for w in words])
+
+
+# ================= 从源文件建账 =================
+# 已登记的词只更新优先级和频次；seed_ledger 先把优先级清空，同一个词头第一次出现时的名次生效
+SEED_SQL = '''
+    INSERT INTO jobs (word, seq, priority, weight, payload) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(word) DO UPDATE SET priority = excluded.priority, weight = excluded.weight
+    WHERE jobs.priority IS NULL
+'''
+
+def _source_signature(path):
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}|{st.st_size}|{int(st.st_mtime)}"
+
+
+def seed_ledger(spec, chunk_size=2000):
+    """把源文件里的词登记进 jobs 表（已登记的不动），并与 dictionary 表对账。
+
+    源文件没变时跳过整遍读取；对账能发现被 modify_dict.py 删掉的词并重新排队。
+    源文件变了时所有词的优先级按新源文件重算（同一个词头出现多次取第一次），源文件里已经没有的词排到最后。
+    返回本次新登记的词数。
+    """
+    # 分片库里的 variants 从主库同步；映射变了时会清掉签名，下面重新读源文件剔除变体
+    sync_variants(spec)
+    conn = sqlite3.connect(spec.db_name)
+    try:
+        signature = _source_signature(spec.source_path)
+        row = conn.execute("SELECT value FROM ledger_meta WHERE key = 'source'").fetchone()
+        added = 0
+        if row is None or row[0] != signature:
+            base = conn.execute("SELECT COALESCE(MAX(seq), -1) + 1 FROM jobs").fetchone()[0]
+            before = conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            conn.execute("UPDATE jobs SET priority = NULL")
+            chunk = []
+            for i, source_row in enumerate(spec.load_rows(spec.source_path)):
+                word = spec.word_of(source_row)
+                if not spec.in_shard(word):
+                    continue
+                priority = spec.rank(source_row) if spec.rank else base + i
+                weight = spec.weight(source_row) if spec.weight else None
+                chunk.append((word, base + i, priority, weight, json.dumps(source_row, ensure_ascii=False)))
+                if len(chunk) >= chunk_size:
+                    conn.executemany(SEED_SQL, chunk)
+                    chunk = []
+            if chunk:
+                conn.executemany(SEED_SQL, chunk)
+            conn.execute("UPDATE jobs SET priority = ? WHERE priority IS NULL", (math.inf,))
+            conn.execute("INSERT OR REPLACE INTO ledger_meta (key, value) VALUES ('source', ?)", (signature,))
+            added = conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] - before
+            # dedup 归并掉的变体不再生成（已经生成过的保留）；dedup 会清掉签名，保证这里重新执行
+            conn.execute('''
+                DELETE FROM jobs WHERE state != 'done'
+                AND word IN (SELECT variant FROM variants WHERE reason = 'variant')
+            ''')
+
+        # 与 dictionary 表对账：已入库的记为 done，被删掉的重新排队
+        conn.execute('''
+            UPDATE jobs SET state = 'done', updated_at = CURRENT_TIMESTAMP
+            WHERE state != 'done' AND word IN (SELECT word FROM dictionary)
+        ''')
+        conn.execute('''
+            UPDATE jobs SET state = 'pending', updated_at = CURRENT_TIMESTAMP
+            WHERE state = 'done' AND word NOT IN (SELECT word FROM dictionary)
+        ''')
+        # 上次运行中断时还在途的词重新排队
+        conn.execute("UPDATE jobs SET state = 'pending' WHERE state = 'in_flight'")
+        conn.commit()
+        return added
+    finally:
+        conn.close()
+
+
+# ================= 调度 =================
+def iter_ledger(db_name, states=(PENDING,), page_size=500, until=None):
+    """按优先级（频率名次）分页读出指定状态的词，产出 (priority, 反序列化后的源数据行)。
+
+    until 是 coverage_cutoff 给出的 (priority, seq)，只读到这个词为止。
+    """
+    conn = sqlite3.connect(db_name)
+    placeholders = ",".join("?" * len(states))
+    bound = "AND (priority, seq) <= (?, ?)" if until else ""
+    last = (-math.inf, -1)
+    try:
+        while True:
+            page = conn.execute(
+                f"SELECT priority, seq, payload FROM jobs WHERE state IN ({placeholders}) "
+                f"AND (priority, seq) > (?, ?) {bound} ORDER BY priority, seq LIMIT ?",
+                (*states, *last, *(until or ()), page_size),
+            ).fetchall()
+            if not page:
+                return
+            for priority, _, payload in page:
+                yield priority, json.loads(payload)
+            last = page[-1][:2]
+    finally:
+        conn.close()
+
+
+# ================= 频率覆盖 =================
+def frequency_mass(conn):
+    """按调度顺序逐个产出每个词的 (priority, seq, state, 频率质量)，走游标，不把账本读进内存。
+
+    没有语料频次（weight 为空）时按 Zipf 定律估计：排第 n 位的词频次正比于 1/n。
+    """
+    rows = conn.execute("SELECT priority, seq, state, weight FROM jobs ORDER BY priority, seq")
+    for n, (priority, seq, state, weight) in enumerate(rows, 1):
+        yield priority, seq, state, weight if weight is not None else 1 / n
+
+
+def coverage_cutoff(db_name, target, states=(PENDING,)):
+    """按调度顺序累计频率质量，达到 target（如 0.95）所需的最后一个词。
+
+    返回 (until, planned)：until 是这个词的 (priority, seq)，交给 iter_ledger；
+    planned 是截止位置之前处于 states 状态、本次要生成的词数。账本为空时返回 (None, 0)。
+    """
+    conn = sqlite3.connect(db_name)
+    try:
+        # 两遍流式扫描：先求总质量，再累计到目标
+        total = sum(m for *_, m in frequency_mass(conn))
+        cumulative = planned = 0
+        last = None
+        for priority, seq, state, m in frequency_mass(conn):
+            cumulative += m
+            last = (priority, seq)
+            if state in states:
+                planned += 1
+            if cumulative >= target * total:
+                break
+        return last, planned
+    finally:
+        conn.close()
+
+
+def frequency_coverage(db_name):
+    """已生成（done）的词占全部频率质量的比例，以及 done 的词数。"""
+    conn = sqlite3.connect(db_name)
+    try:
+        total = covered = done = 0
+        for _, _, state, m in frequency_mass(conn):
+            total += m
+            if state == DONE:
+                covered += m
+                done += 1
+    finally:
+        conn.close()
+    return (covered / total if total else 0.0), done
+
+
+def ledger_summary(db_name):
+    """各状态的词数，以及失败词的错误类型分布。"""
+    conn = sqlite3.connect(db_name)
+    try:
+        states = dict(conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"))
+        errors = dict(conn.execute(
+            "SELECT COALESCE(last_error, '?'), COUNT(*) FROM jobs WHERE state = 'failed' GROUP BY last_error"
+        ))
+        return states, errors
+    finally:
+        conn.close()
@@ -0,0 +1,228 @@
+import glob
+import heapq
+import itertools
+import json
+import os
+import re
+import sqlite3
+import time
+
+from .sharding import shard_db_name
+from .storage import init_db
+
+
+MERGE_INSERT_SQL = "INSERT INTO dictionary (word, keywords, data, created_at) VALUES (?, ?, ?, ?)"
+MERGE_POLICIES = ("newest", "longest", "prefer")
+MERGE_COMMIT_ROWS = 100_000   # 每个事务写入的行数
+MERGE_FETCH_ROWS = 5_000      # 每个源库每次从游标取的行数
+
+
+def shard_sources(db_name):
+    """某个词典库对应的全部分片库，按文件名排序。
+
+    glob 的 * 也会匹配分片的响应缓存（如 l.shard-1-of-2_cache.db），再按完整文件名严格过滤。
+    """
+    stem, ext = os.path.splitext(db_name)
+    strict = re.compile(re.escape(stem) + r"\.shard-\d+-of-\d+" + re.escape(ext or ".db"))
+    return sorted(p for p in glob.glob(shard_db_name(db_name, "*", "*")) if strict.fullmatch(p))
+
+
+def _has_table(path, table):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+    finally:
+        conn.close()
+
+
+def _copy_variants(conn, sources, out):
+    """把各源库和 out 原有的 variants 写法映射并进合并结果，同一个变体以 out（dedup 写入的库）为准；返回映射条数。"""
+    order = [p for p in sources if p != out] + ([out] if out in sources else [])
+    for path in order:
+        if not _has_table(path, "variants"):
+            continue
+        src = sqlite3.connect(path)
+        try:
+            rows = src.execute("SELECT variant, canonical, reason FROM variants").fetchall()
+        finally:
+            src.close()
+        conn.executemany("INSERT OR REPLACE INTO variants (variant, canonical, reason) VALUES (?, ?, ?)", rows)
+    return conn.execute("SELECT COUNT(*) FROM variants").fetchone()[0]
+
+
+def _iter_source(index, path, fetch_rows):
+    """按 word 升序逐块读出一个源库的 dictionary 表。
+
+    word 是主键，ORDER BY word 直接走主键索引，不需要排序，也不会把整张表读进内存。
+    SQLite 的 BINARY 排序按 UTF-8 字节比较，和 Python 按码位比较字符串的顺序一致。
+    """
+    # 不用 mode=ro：只读连接关闭时删不掉 WAL 和 shm 文件，源库旁会留下残留
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA query_only=ON")
+    try:
+        # 旧库（如英语的基线库）没有 keywords 列，按空值读
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(dictionary)")}
+        keywords = "keywords" if "keywords" in columns else "NULL AS keywords"
+        cursor = conn.execute(f"SELECT word, {keywords}, data, created_at FROM dictionary ORDER BY word")
+        while True:
+            chunk = cursor.fetchmany(fetch_rows)
+            if not chunk:
+                return
+            for word, keywords, data, created_at in chunk:
+                yield word, keywords, data, created_at or "", index
+    finally:
+        conn.close()
+
+
+def _valid_length(row):
+    """词条 JSON 能解析且非空时返回其长度，否则返回 -1。"""
+    try:
+        return len(row[2]) if row[2] and json.loads(row[2]) else -1
+    except (TypeError, ValueError):
+        return -1
+
+
+def _chooser(policy, prefer):
+    """返回从同一个词的多个候选行里选出保留行的函数。
+
+    - newest：created_at 最新的；
+    - longest：能解析的词条里最长的，都解析不了时退回 newest；
+    - prefer：优先取 prefer 源库里的，该库没有这个词时退回 newest。
+    平局时取参数里排在后面的源库。
+    """
+    def newest(rows):
+        return max(rows, key=lambda r: (r[3], r[4]))
+
+    if policy == "newest":
+        return newest
+    if policy == "longest":
+        return lambda rows: max(rows, key=lambda r: (_valid_length(r), r[3], r[4]))
+    if policy == "prefer":
+        def preferred(rows):
+            chosen = [r for r in rows if r[4] == prefer]
+            return chosen[0] if chosen else newest(rows)
+        return preferred
+    raise ValueError(f"未知的合并策略: {policy}（可选 {', '.join(MERGE_POLICIES)}）")
+
+
+def _source_indexes(paths):
+    """各源库 dictionary 表上的自建索引（不含主键自动索引），按名字去重。"""
+    indexes = {}
+    for path in paths:
+        conn = sqlite3.connect(path)
+        try:
+            for name, sql in conn.execute(
+                    "SELECT name, sql FROM sqlite_master "
+                    "WHERE type = 'index' AND tbl_name = 'dictionary' AND sql IS NOT NULL"):
+                indexes.setdefault(name, sql)
+        finally:
+            conn.close()
+    return indexes
+
+
+def merge_databases(sources, out, policy="newest", prefer=None,
+                    commit_rows=MERGE_COMMIT_ROWS, fetch_rows=MERGE_FETCH_ROWS):
+    """把多个词典库的 dictionary 表流式 k 路归并进 out。
+
+    每个源库按 word 顺序读，heapq.merge 每次只持有每个库的一行，内存与行数无关；
+    同一个词出现在多个库里时按 policy 取一行。out 已存在且不在 sources 里时，
+    它自己也作为一个源参与合并，保证原有词条不丢。结果先写进 out + ".merging"，
+    写完、建好索引后再替换 out，中途失败不影响原库。合并 dictionary 表和 dedup 写的
+    variants 写法映射；任务账本不合并，下次运行时按源文件重新登记、对账（会按 variants 剔除变体）。
+    返回统计字典。
+    """
+    sources = [os.path.abspath(p) for p in sources]
+    out = os.path.abspath(out)
+    if os.path.exists(out) and out not in sources:
+        sources.append(out)
+    missing = [p for p in sources if not os.path.exists(p)]
+    if missing:
+        raise FileNotFoundError(f"源库不存在: {', '.join(missing)}")
+    # 没有 dictionary 表的（如误传的响应缓存库）不是词典库，开始归并前跳过
+    skipped = [p for p in sources if not _has_table(p, "dictionary")]
+    for path in skipped:
+        print(f"⚠️ 跳过 {os.path.basename(path)}：没有 dictionary 表，不是词典库")
+    sources = [p for p in sources if p not in skipped]
+    if not sources:
+        raise ValueError("没有可合并的词典库")
+    prefer_index = None
+    if policy == "prefer":
+        if not prefer or os.path.abspath(prefer) not in sources:
+            raise ValueError("prefer 策略需要用 --prefer 指定一个源库")
+        prefer_index = sources.index(os.path.abspath(prefer))
+    choose = _chooser(policy, prefer_index)
+
+    tmp = out + ".merging"
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(tmp + suffix):
+            os.remove(tmp + suffix)
+
+    start = time.perf_counter()
+    stats = {"read": 0, "written": 0, "conflicts": 0, "wins": [0] * len(sources)}
+    conn = init_db(tmp)
+    try:
+        # 临时文件写完才替换原库，不需要 fsync
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("PRAGMA cache_size=-65536")
+        merged = heapq.merge(*(_iter_source(i, p, fetch_rows) for i, p in enumerate(sources)),
+                             key=lambda r: r[0])
+        batch = []
+        for word, group in itertools.groupby(merged, key=lambda r: r[0]):
+            rows = list(group)
+            stats["read"] += len(rows)
+            row = rows[0] if len(rows) == 1 else choose(rows)
+            if len(rows) > 1:
+                stats["conflicts"] += 1
+            stats["wins"][row[4]] += 1
+            batch.append((word, row[1], row[2], row[3] or None))
+            if len(batch) >= commit_rows:
+                _write_rows(conn, batch)
+                stats["written"] += len(batch)
+                print(f"🔀 已合并 {stats['written']} 词 ({stats['written'] / (time.perf_counter() - start):.0f} rows/s)")
+                batch = []
+        if batch:
+            _write_rows(conn, batch)
+            stats["written"] += len(batch)
+
+        stats["variants"] = _copy_variants(conn, sources, out)
+        # 索引放在最后一次性建，比逐行维护快
+        indexes = _source_indexes(sources)
+        for sql in indexes.values():
+            conn.execute(sql.replace("CREATE INDEX", "CREATE INDEX IF NOT EXISTS", 1))
+        conn.commit()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    if os.path.exists(out):
+        _checkpoint(out)
+    os.replace(tmp, out)
+
+    stats["indexes"] = len(indexes)
+    stats["elapsed"] = time.perf_counter() - start
+    stats["sources"] = sources
+    return stats
+
+
+def _write_rows(conn, rows):
+    conn.executemany(MERGE_INSERT_SQL, rows)
+    conn.commit()
+
+
+def _checkpoint(path):
+    """把库的 WAL 合并回主文件并删掉，替换主文件后残留的旧 WAL 会被误当成新库的日志。"""
+    if os.path.exists(path + "-wal"):
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            conn.close()
+
+
+def print_merge_report(stats, out):
+    elapsed = max(stats["elapsed"], 1e-9)
+    print(f"✅ 合并完成 → {out}: 读入 {stats['read']} 行，写出 {stats['written']} 词，"
+          f"冲突 {stats['conflicts']} 个，写法映射 {stats['variants']} 条，重建索引 {stats['indexes']} 个，"
+          f"耗时 {elapsed:.1f}s ({stats['read'] / elapsed:.0f} rows/s)")
+    for path, wins in zip(stats["sources"], stats["wins"]):
+        print(f"   {os.path.basename(path)}: 保留 {wins} 词")
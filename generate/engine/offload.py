@@ -0,0 +1,98 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .batching import split_batch_response
+from .parser import JSONParseError, dump_json, loads, robust_json_parser
+from .spec import keywords_to_str
+from .validation import apply_patch
+
+
+PARSE_POOLS = ("process", "thread")
+
+
+# ================= 在池里执行的函数 =================
+# 只用模块级函数和可 pickle 的参数，进程池里也能跑；extract_keywords / validate 按引用传过去
+def finish_entry(extract_keywords, validate, row, data):
+    """校验（校验函数可能就地修正小问题）后提取关键词，返回 (keywords, data_str, problems)。"""
+    problems = validate(row, data) if validate else {}
+    return keywords_to_str(extract_keywords(row, data)), dump_json(data), problems
+
+
+def prepare_entry(extract_keywords, validate, row, raw_content, allow_truncated=False):
+    """解析单词条输出，返回 (keywords, data_str, problems)。"""
+    data, _ = robust_json_parser(raw_content, allow_truncated=allow_truncated)
+    return finish_entry(extract_keywords, validate, row, data)
+
+
+def apply_repair(extract_keywords, validate, row, data_str, raw_content, paths):
+    """把字段修复（或按字段重写）的响应合并回词条并重新校验，返回 (keywords, data_str, problems)。"""
+    patch, _ = robust_json_parser(raw_content)
+    data = loads(data_str)
+    if not apply_patch(data, patch, paths):
+        raise JSONParseError(f"PATCH_EMPTY: 响应里没有请求的字段 {paths[:3]}")
+    return finish_entry(extract_keywords, validate, row, data)
+
+
+def prepare_batch(extract_keywords, validate, rows, words, raw_content):
+    """解析批量输出、按词拆分、校验并提取关键词。
+
+    返回 (prepared, errors)：prepared 是 {word: (keywords, data_str, problems)}，
+    errors 是关键词提取失败的 {word: 错误信息}；两边都没有的词就是批量结果里缺失的。
+    整段输出解析失败时抛出 JSONParseError，由调用方拆分重试。
+    """
+    data, _ = robust_json_parser(raw_content)
+    entries, _ = split_batch_response(data, words)
+    prepared = {}
+    errors = {}
+    for row, word in zip(rows, words):
+        entry = entries.get(word)
+        if entry is None:
+            continue
+        try:
+            prepared[word] = finish_entry(extract_keywords, validate, row, entry)
+        except Exception as e:
+            errors[word] = f"{type(e).__name__}: {e}"
+    return prepared, errors
+
+
+# ================= 解析池 =================
+class ParsePool:
+    """把解析、修复、校验和关键词提取放到进程池或线程池里，事件循环只管 I/O。
+
+    workers 为 0 时直接在事件循环里执行（旧行为）。json / re / orjson 解析时都不释放 GIL，
+    线程池只能让出调度间隙，真正并行要用进程池。
+    """
+
+    def __init__(self, extract_keywords, validate=None, workers=0, kind="process"):
+        if kind not in PARSE_POOLS:
+            raise ValueError(f"未知的解析池类型: {kind}（可选 {', '.join(PARSE_POOLS)}）")
+        self.extract_keywords = extract_keywords
+        self.validate = validate
+        self.workers = workers
+        self.kind = kind
+        self._executor = None
+        if workers > 0 and kind == "process":
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        elif workers > 0:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="parse")
+
+    async def _call(self, fn, *args):
+        if self._executor is None:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def entry(self, row, raw_content, allow_truncated=False):
+        return await self._call(prepare_entry, self.extract_keywords, self.validate, row, raw_content, allow_truncated)
+
+    async def batch(self, rows, words, raw_content):
+        return await self._call(prepare_batch, self.extract_keywords, self.validate, rows, words, raw_content)
+
+    async def repair(self, row, data_str, raw_content, paths):
+        return await self._call(apply_repair, self.extract_keywords, self.validate, row, data_str, raw_content, paths)
+
+    def describe(self):
+        return f"{self.workers} 个{'进程' if self.kind == 'process' else '线程'}" if self._executor else "事件循环内"
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
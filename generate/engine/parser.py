@@ -0,0 +1,150 @@
+import json
+import re
+
+try:
+    import orjson
+except ImportError:  # 没装 orjson 时退回标准库，结果一致，只是慢一些
+    orjson = None
+
+
+class JSONParseError(ValueError):
+    """模型输出无法解析为 JSON。"""
+
+
+# ================= 序列化 =================
+if orjson is not None:
+    def loads(text):
+        return orjson.loads(text)
+
+    def dump_json(data):
+        """入库用的规范 JSON：紧凑分隔符、保留键顺序、不转义非 ASCII。"""
+        return orjson.dumps(data).decode("utf-8")
+
+    _DECODE_ERRORS = (orjson.JSONDecodeError, ValueError)
+else:
+    def loads(text):
+        return json.loads(text)
+
+    def dump_json(data):
+        """入库用的规范 JSON：紧凑分隔符、保留键顺序、不转义非 ASCII。"""
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+    _DECODE_ERRORS = (ValueError,)
+
+
+# ================= 单遍修复 =================
+# 完整的字符串和冒号、字面量、空白连成一段整体照抄，只有括号、逗号、注释和被截断的字符串单独处理，
+# 一个 "key": "value" 只产生一个 token
+_TOKEN = re.compile(r'''
+    (?P<run>(?:"[^"\\]*(?:\\.[^"\\]*)*"|[^"{}\[\],/]+)+)
+  | (?P<cut>"[^"\\]*(?:\\.[^"\\]*)*\\?\Z)           # 没有结尾引号的字符串：输出在这里被截断
+  | (?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z))           # 注释（模板里的 // 🔥 SMART PARADIGM）
+  | (?P<char>[{}\[\],/])
+''', re.VERBOSE | re.DOTALL)
+
+_CLOSE = {"{": "}", "[": "]"}
+
+
+def repair_json(text):
+    """从第一个 '{' 开始单遍扫描，返回 (修复后的 JSON 文本, 是否被截断)。
+
+    一遍之内完成：跳过前面的说明文字和代码块标记、去掉 // 和 /* */ 注释、
+    去掉 } ] 前的尾随逗号、在最外层对象闭合处截止（忽略后面的文字和 ```）。
+    输出在中途被截断时，回退到最后一个完整的元素并补齐括号，truncated 为 True。
+    """
+    start = text.find("{")
+    if start < 0:
+        raise JSONParseError("JSON_BLOCK_NOT_FOUND: 输出里没有 '{'。")
+
+    out = []
+    stack = []
+    # 截断时回退的位置：每个逗号之前结构都是完整的；还没遇到逗号时只能回退到最外层的 '{'
+    checkpoint = None
+    for m in _TOKEN.finditer(text, start):
+        kind = m.lastgroup
+        tok = m.group()
+        if kind == "run":
+            tok = tok.strip()
+            if tok:
+                out.append(tok)
+        elif kind == "char":
+            if tok == "{" or tok == "[":
+                stack.append(tok)
+                out.append(tok)
+                if checkpoint is None:
+                    checkpoint = (1, (tok,))
+            elif tok == "}" or tok == "]":
+                if not stack or _CLOSE[stack[-1]] != tok:
+                    raise JSONParseError(f"JSON_PARSE_FAIL: 第 {m.start()} 个字符处括号不匹配。")
+                _drop_trailing_comma(out)
+                stack.pop()
+                out.append(tok)
+                if not stack:
+                    return "".join(out), False
+            elif tok == ",":
+                _drop_trailing_comma(out)
+                checkpoint = (len(out), tuple(stack))
+                out.append(tok)
+            else:
+                out.append(tok)
+        elif kind == "cut" or not tok.startswith("//") and not tok.endswith("*/"):
+            # 字符串或块注释没有结尾：输出在这里被截断
+            return _close_truncated(out, checkpoint)
+        # 其余是注释，直接丢掉
+    return _close_truncated(out, checkpoint)
+
+
+def _drop_trailing_comma(out):
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def _close_truncated(out, checkpoint):
+    if checkpoint is None:
+        raise JSONParseError("JSON_TRUNCATED: 输出在第一个对象内就被截断，无法恢复。")
+    length, stack = checkpoint
+    del out[length:]
+    _drop_trailing_comma(out)
+    out.extend(_CLOSE[c] for c in reversed(stack))
+    return "".join(out), True
+
+
+# ================= JSON 解析=================
+def _loads_slice(text):
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        return None
+    try:
+        return loads(text[start:end + 1])
+    except _DECODE_ERRORS:
+        return None
+
+
+def robust_json_parser(raw_content, allow_truncated=False):
+    """解析模型输出，返回 (data, 规范 JSON 字符串)。
+
+    先直接解析，再试首个 '{' 到最后一个 '}' 之间的切片（代码块、前后说明文字最常见，
+    这一步在 C 里完成）；都失败时用 repair_json 单遍修复后再解析。被截断的输出默认
+    仍算失败（重试通常能拿到完整词条），allow_truncated=True 时接受回退到最后完整元素的结果。
+    """
+    try:
+        data = loads(raw_content)
+    except _DECODE_ERRORS:
+        data = _loads_slice(raw_content)
+    if data is None:
+        repaired, truncated = repair_json(raw_content)
+        if truncated and not allow_truncated:
+            raise JSONParseError("JSON_TRUNCATED: 输出被截断，只能恢复部分字段。")
+        try:
+            data = loads(repaired)
+        except _DECODE_ERRORS:
+            try:
+                # 字符串里夹着未转义的换行、制表符时，宽松模式还能读
+                data = json.loads(repaired, strict=False)
+            except ValueError as e:
+                raise JSONParseError(f"JSON_PARSE_FAIL: 修复后仍无法解析。Error: {e}")
+    if not isinstance(data, dict):
+        raise JSONParseError(f"JSON_NOT_OBJECT: 顶层是 {type(data).__name__} 而不是对象。")
+    if not data:
+        raise JSONParseError("JSON_EMPTY: 解析结果是空对象。")
+    return data, dump_json(data)
@@ -0,0 +1,775 @@
+import asyncio
+import dataclasses
+import itertools
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .backends import ClientPool, load_backends, never_reached_model
+from .cascade import CascadeTier, build_tier_pools, print_cascade_report
+from .cache import CacheMiss, ResponseCache, cache_key, cached_response, usage_to_dict
+from .latency import LatencyTracker
+from .ledger import (FAILED, IN_FLIGHT, PENDING, LedgerEvent, coverage_cutoff, frequency_coverage, iter_ledger,
+                     ledger_summary, seed_ledger)
+from .offload import ParsePool
+from .parser import JSONParseError, loads
+from .profiling import LoopLagMonitor, StageProfiler
+from .prompts import compose_repair_prompt
+from .regenerate import count_selected, iter_selected, regen_problems
+from .scheduler import PriorityScheduler
+from .spec import LanguageSpec
+from .streaming import StreamAbort, StreamGuard, assembled_response, consume_stream
+from .storage import DBWriter, count_existing, init_db
+from .telemetry import MetricRecord, Telemetry
+
+
+# ================= 错误分类与退避 =================
+def classify_error(e):
+    """把异常归为 rate_limit / timeout / json / other 四类。"""
+    if isinstance(e, JSONParseError):
+        return "json"
+    if isinstance(e, CacheMiss):
+        return "cache_miss"
+    if isinstance(e, asyncio.TimeoutError):
+        return "timeout"
+    error_str = str(e)
+    if "429" in error_str or type(e).__name__ == "RateLimitError":
+        return "rate_limit"
+    if "timeout" in error_str.lower() or "Timeout" in type(e).__name__:
+        return "timeout"
+    return "other"
+
+
+def backoff_delay(attempt, kind):
+    if kind == "json":
+        return 1
+    if kind == "rate_limit":
+        # 限流时退避更久，并加抖动避免所有 worker 同时醒来
+        return min(60, 5 * (2 ** attempt)) + random.uniform(0, 5)
+    return (2 ** attempt) + random.uniform(0, 1)
+
+
+def cached_tokens(usage):
+    """命中服务端 prompt cache 的 token 数。
+
+    OpenAI 放在 prompt_tokens_details.cached_tokens，DeepSeek 用 prompt_cache_hit_tokens。
+    """
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details is not None else None
+    if cached is None:
+        cached = getattr(usage, "prompt_cache_hit_tokens", None)
+    return cached or 0
+
+
+def build_messages(spec, row):
+    return [
+        {"role": "system", "content": spec.system_message},
+        {"role": "user", "content": spec.build_prompt(row)}
+    ]
+
+
+def build_batch_messages(spec, rows):
+    return [
+        {"role": "system", "content": spec.system_message},
+        {"role": "user", "content": spec.build_batch_prompt(rows)}
+    ]
+
+
+def build_repair_messages(spec, row, data_str, problems):
+    return [
+        {"role": "system", "content": spec.system_message},
+        {"role": "user", "content": compose_repair_prompt(spec.build_prompt(row), data_str, problems)}
+    ]
+
+
+# ================= 运行上下文 =================
+@dataclass
+class RunContext:
+    """一次生成运行中所有 worker 共享的对象。"""
+    spec: LanguageSpec
+    pool: ClientPool
+    queue: asyncio.Queue
+    cache: Optional[ResponseCache] = None
+    stats: dict = field(default_factory=lambda: {
+        "ok": 0, "failed": 0, "tokens": 0, "prompt_tokens": 0, "cached_tokens": 0,
+        "requests": 0, "batched": 0, "fallback": 0, "cache_hits": 0,
+        "aborted": 0, "ttft_sum": 0.0, "ttft_count": 0, "hedges": 0, "hedge_wins": 0,
+        "invalid": 0, "repair_requests": 0, "repaired": 0, "unrepaired": 0,
+        "regen_skipped": 0,
+    })
+    latency: LatencyTracker = field(default_factory=LatencyTracker)
+    telemetry: Telemetry = field(default_factory=Telemetry)
+    profiler: StageProfiler = field(default_factory=StageProfiler)
+    parsing: Optional[ParsePool] = None
+    tier: Optional[CascadeTier] = None  # 模型级联时这个上下文对应的档位
+    tiers: list = field(default_factory=list)  # 模型级联的全部档位上下文，便宜的在前，最后一个是自己
+    scheduler: Optional[PriorityScheduler] = None  # 按频率名次分词、接收重试的调度器；按字段重写时为空
+
+    def __post_init__(self):
+        if self.parsing is None:
+            self.parsing = ParsePool(self.spec.extract_keywords, self.spec.validate)
+
+
+# ================= 单次请求 =================
+async def request_completion(ctx, backend, messages, response_format, entries):
+    """真正发请求的地方。流式模式下边收边检查，坏输出提前中止。"""
+    spec = ctx.spec
+    if not spec.stream:
+        return await backend.client.chat.completions.create(
+            model=backend.model,
+            messages=messages,
+            response_format=response_format,
+            temperature=spec.temperature
+        )
+
+    # TTFT 从发请求算起，包括等响应头的时间
+    sent = time.monotonic()
+    stream = await backend.client.chat.completions.create(
+        model=backend.model,
+        messages=messages,
+        response_format=response_format,
+        temperature=spec.temperature,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    guard = StreamGuard(spec.max_output_chars * entries)
+    try:
+        content, usage, ttft = await consume_stream(stream, guard, sent)
+    except StreamAbort:
+        ctx.stats["aborted"] += 1
+        raise
+    if ttft is not None:
+        ctx.stats["ttft_sum"] += ttft
+        ctx.stats["ttft_count"] += 1
+    return assembled_response(content, usage, ttft)
+
+
+# ================= API 调用 =================
+async def call_model(ctx, messages, entries=1, word=None, attempt=0):
+    """发出一次 chat completion：先从客户端池选定后端，再依次经过该后端的
+    RPM/TPM 限速、AIMD 并发槽位和超时。
+
+    entries 是预计产出的词条数，用于批量请求的 token 预估和超时放宽。
+    命中本地缓存时直接返回，不占限速额度和并发槽位。缓存键用 spec.model_name，
+    各后端应提供同一个模型（只是名字可能不同）。
+    word / attempt 只用于 metrics 表记录。
+    """
+    spec = ctx.spec
+    response_format = {"type": "json_object"}
+    key = None
+    if ctx.cache is not None:
+        key = cache_key(spec.model_name, messages, spec.temperature, response_format)
+        with ctx.profiler.stage("cache_lookup"):
+            hit = ctx.cache.get(key)
+        if hit is not None:
+            ctx.stats["cache_hits"] += 1
+            response = cached_response(*hit)
+            response.cache_key = key
+            return response
+        if spec.cache_only:
+            raise CacheMiss("CACHE_MISS: 缓存中没有该请求")
+
+    response = await hedged_request(ctx, messages, response_format, entries, word, attempt)
+    response.cache_key = key
+    return response
+
+
+async def send_request(ctx, messages, response_format, entries, word=None, attempt=0, started=None):
+    """选后端、限速、占槽位，并按自适应超时等待一次响应。started 在真正发出请求时置位。"""
+    spec = ctx.spec
+    timeout = ctx.latency.timeout(spec.timeout) if spec.adaptive_timeout else spec.timeout
+    queued = time.monotonic()
+    start = None
+    error = "cancelled"
+    # 限速和并发槽位都按词的频率名次排队，拥塞时常用词先发
+    priority = ctx.scheduler.priority(word) if ctx.scheduler is not None else 0
+    async with ctx.pool.acquire() as backend:
+        with ctx.profiler.stage("rate_limit_wait"):
+            reserved = await backend.rate_limiter.reserve(messages, entries, priority)
+        usage = None
+        # 还没拿到槽位就被取消的请求没发出去，退回 token 预留
+        refund = True
+        try:
+            # 只有 API 调用本身占用并发槽位；退避等待不占
+            slot_requested = time.monotonic()
+            async with backend.limiter.slot(priority):
+                if started is not None:
+                    started.set()
+                start = time.monotonic()
+                ctx.profiler.record("slot_wait", start - slot_requested)
+                refund = False
+                try:
+                    response = await asyncio.wait_for(
+                        request_completion(ctx, backend, messages, response_format, entries),
+                        timeout=timeout * entries
+                    )
+                except Exception as e:
+                    error = classify_error(e)
+                    refund = never_reached_model(e)
+                    backend.on_error(error, e)
+                    raise
+                error = None
+                latency = (time.monotonic() - start) / entries
+                backend.on_success(latency)
+                ctx.latency.observe(latency)
+            ctx.stats["requests"] += 1
+            usage = getattr(response, "usage", None)
+            if usage:
+                ctx.stats["tokens"] += usage.total_tokens
+                ctx.stats["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+                ctx.stats["cached_tokens"] += cached_tokens(usage)
+            if ctx.tier is not None:
+                ctx.tier.requests += 1
+                ctx.tier.tokens += usage.total_tokens if usage else 0
+                ctx.tier.latency_sum += latency * entries
+            return response
+        finally:
+            backend.rate_limiter.settle(reserved, usage, entries, refund)
+            if start is not None:
+                ctx.profiler.record("api", time.monotonic() - start)
+                # 被取消的对冲请求也记一行，error 为 cancelled
+                ctx.telemetry.observe(MetricRecord(
+                    time.time(), word, entries, backend.name, attempt,
+                    time.monotonic() - start, start - queued,
+                    getattr(usage, "prompt_tokens", 0) or 0,
+                    getattr(usage, "completion_tokens", 0) or 0,
+                    cached_tokens(usage) if usage else 0,
+                    error,
+                ))
+
+
+def can_hedge(ctx):
+    """对冲请求数不超过已完成请求的 hedge_budget 比例，且只在有空闲槽位时发出。"""
+    budget = ctx.spec.hedge_budget * max(ctx.stats["requests"], 1)
+    return ctx.stats["hedges"] < budget and ctx.pool.idle > 0
+
+
+async def hedged_request(ctx, messages, response_format, entries, word=None, attempt=0):
+    """请求发出后超过 p95 延迟仍未返回时，再发一个相同的请求，取先成功的那个。"""
+    p95 = ctx.latency.percentile(0.95) if ctx.spec.hedge else None
+    if p95 is None:
+        return await send_request(ctx, messages, response_format, entries, word, attempt)
+
+    started = asyncio.Event()
+    tasks = [asyncio.ensure_future(send_request(ctx, messages, response_format, entries, word, attempt, started))]
+    waiter = asyncio.ensure_future(started.wait())
+    try:
+        # 从真正发出请求开始计时，排队等限速和槽位的时间不算
+        await asyncio.wait([tasks[0], waiter], return_when=asyncio.FIRST_COMPLETED)
+        # 超过 p95 后每隔 p95 再看一次：运行中段槽位满时不对冲，收尾阶段有空位了再发
+        while True:
+            done, _ = await asyncio.wait(tasks, timeout=p95 * entries)
+            if done:
+                return await tasks[0]
+            if can_hedge(ctx):
+                break
+
+        ctx.stats["hedges"] += 1
+        tasks.append(asyncio.ensure_future(send_request(ctx, messages, response_format, entries, word, attempt)))
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is tasks[1]:
+                        ctx.stats["hedge_wins"] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        waiter.cancel()
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+def remember(ctx, response):
+    """解析成功后才写入缓存，避免把坏输出缓存下来在重试时反复命中。"""
+    key = getattr(response, "cache_key", None)
+    if ctx.cache is None or key is None or getattr(response, "from_cache", False):
+        return
+    with ctx.profiler.stage("cache_store"):
+        ctx.cache.put(key, ctx.spec.model_name, response.choices[0].message.content, usage_to_dict(response.usage))
+
+
+def forget(ctx, response):
+    """缓存里的内容解析失败（如解析规则变了）时删掉，下次重试走 API。"""
+    key = getattr(response, "cache_key", None)
+    if ctx.cache is not None and key is not None and getattr(response, "from_cache", False):
+        ctx.cache.discard(key)
+
+
+# ================= API Worker =================
+async def store_entry(ctx, row, keywords, data_str, problems=None):
+    if problems:
+        keywords, data_str = await repair_entry(ctx, row, keywords, data_str, problems)
+    # 队列满时这里会等写库协程（背压），等待时间也算在 enqueue 里
+    with ctx.profiler.stage("enqueue"):
+        await ctx.queue.put((ctx.spec.word_of(row), keywords, data_str))
+
+
+async def repair_entry(ctx, row, keywords, data_str, problems):
+    """词条有字段没通过校验时，只请求重写这些字段（其余字段作为上下文），合并回词条。
+
+    修复请求和普通请求走同一条并发、限速和缓存路径。修不好时仍然入库，
+    保留已有内容，问题打印出来，之后可以按字段重新生成。返回 (keywords, data_str)。
+    """
+    spec = ctx.spec
+    word = spec.word_of(row)
+    ctx.stats["invalid"] += 1
+    for attempt in range(spec.repair_attempts):
+        response = None
+        try:
+            with ctx.profiler.stage("prompt"):
+                messages = build_repair_messages(spec, row, data_str, problems)
+            response = await call_model(ctx, messages, word=word, attempt=attempt + 1)
+            ctx.stats["repair_requests"] += 1
+            with ctx.profiler.stage("parse"):
+                keywords, data_str, problems = await ctx.parsing.repair(
+                    row, data_str, response.choices[0].message.content, list(problems))
+            remember(ctx, response)
+        except Exception as e:
+            if response is not None:
+                forget(ctx, response)
+            if classify_error(e) != "cache_miss":
+                print(f"⚠️ 字段修复失败: {word} | {e}")
+            break
+        if not problems:
+            ctx.stats["repaired"] += 1
+            if not spec.quiet:
+                print(f"🩹 {word} 字段修复完成")
+            return keywords, data_str
+    ctx.stats["unrepaired"] += 1
+    print(f"⚠️ {word} 仍有字段未通过校验，照常入库: {problems}")
+    return keywords, data_str
+
+
+async def regenerate_entry(ctx, row, data_str):
+    """按字段重写已有词条：只请求 spec.regen_fields 匹配到的字段，整条旧词条作为上下文，
+    结果合并回 data 后照常校验、写库。和生成走同一条并发、限速和缓存路径。成功返回 True。"""
+    spec = ctx.spec
+    word = spec.word_of(row)
+    problems = regen_problems(loads(data_str), spec.regen_fields, spec.regen_note)
+    if not problems:
+        ctx.stats["regen_skipped"] += 1
+        return True
+    last_error = None
+    for attempt in range(spec.max_attempts):
+        response = None
+        try:
+            with ctx.profiler.stage("prompt"):
+                messages = build_repair_messages(spec, row, data_str, problems)
+            response = await call_model(ctx, messages, word=word, attempt=attempt + 1)
+            with ctx.profiler.stage("parse"):
+                keywords, new_data, invalid = await ctx.parsing.repair(
+                    row, data_str, response.choices[0].message.content, list(problems))
+            remember(ctx, response)
+            await store_entry(ctx, row, keywords, new_data, invalid)
+            if not spec.quiet:
+                print(f"✏️ {word} 重写 {len(problems)} 个字段 | 并发 {ctx.pool.limit}")
+            return True
+        except Exception as e:
+            last_error = e
+            kind = classify_error(e)
+            if response is not None:
+                forget(ctx, response)
+            if kind == "cache_miss":
+                break
+            wait_time = backoff_delay(attempt, kind)
+            print(f"⚠️ 字段重写失败: {word} ({kind})，等待 {wait_time:.1f}s | {e}")
+            await asyncio.sleep(wait_time)
+    # 旧词条原样保留在库里，不动任务账本
+    print(f"❌ {word} 字段重写失败 | 最终原因: {last_error}")
+    return False
+
+
+async def record(ctx, word, state=None, attempts=0, error=None):
+    """把任务账本的状态变更交给写库协程，与词条写入走同一个连接。"""
+    await ctx.queue.put(LedgerEvent(word, state, attempts, error))
+
+
+async def try_tier(ctx, row):
+    """在模型级联的便宜档生成一次：通过校验返回 (keywords, data_str)，
+    解析失败或校验不通过返回 None，由下一档重新生成。限流、超时照常在本档重试。"""
+    spec = ctx.spec
+    word = spec.word_of(row)
+    for attempt in range(spec.max_attempts):
+        response = None
+        try:
+            with ctx.profiler.stage("prompt"):
+                messages = build_messages(spec, row)
+            response = await call_model(ctx, messages, word=word, attempt=attempt + 1)
+            with ctx.profiler.stage("parse"):
+                keywords, data_str, problems = await ctx.parsing.entry(row, response.choices[0].message.content)
+        except Exception as e:
+            kind = classify_error(e)
+            if response is not None:
+                forget(ctx, response)
+            if kind in ("json", "cache_miss"):
+                return None
+            await asyncio.sleep(backoff_delay(attempt, kind))
+            continue
+        # 校验不通过的输出也缓存：下次运行命中缓存后直接升级，不再为便宜档付费
+        remember(ctx, response)
+        if problems:
+            if not spec.quiet:
+                print(f"🪜 {word} 在 {ctx.tier.name} 未通过校验，升级: {list(problems)[:3]}")
+            return None
+        return keywords, data_str
+    return None
+
+
+async def process_row(ctx, row, attempt=0):
+    """生成单个词条并放入写库队列，成功返回 True，放回调度器等重试时返回 None。
+
+    配置了模型级联时先依次试便宜档（spec.hard 判为难词的直接用最后一档），
+    都不通过再走下面的完整流程（重试、截断恢复、字段修复）。
+    attempt > 0 是调度器分回来的重试，这个词已经到了最后一档，接着在这一档重试。
+    """
+    if not ctx.tiers:
+        return await generate_row(ctx, row, attempt)
+    if attempt:
+        ok = await generate_row(ctx, row, attempt)
+        if ok:
+            ctx.tier.accepted += 1
+        return ok
+    spec = ctx.spec
+    first = len(ctx.tiers) - 1 if spec.hard is not None and spec.hard(row) else 0
+    for tier_ctx in ctx.tiers[first:]:
+        tier = tier_ctx.tier
+        tier.words += 1
+        if tier_ctx is ctx:
+            ok = await generate_row(ctx, row)
+        else:
+            entry = await try_tier(tier_ctx, row)
+            ok = entry is not None
+            if ok:
+                await store_entry(ctx, row, *entry)
+                if not spec.quiet:
+                    print(f"✅ {spec.word_of(row)} | {tier.name}")
+        if ok:
+            tier.accepted += 1
+            return True
+    return ok
+
+
+async def generate_row(ctx, row, first_attempt=0):
+    """在 ctx 的模型上生成单个词条：失败重试，最后一次接受截断恢复，校验不通过时修复字段。
+
+    有调度器时失败的词不在 worker 里退避，而是交回调度器按原优先级重排，返回 None。
+    """
+    spec = ctx.spec
+    word = spec.word_of(row)
+    last_error = None
+
+    for attempt in range(first_attempt, spec.max_attempts):
+        response = None
+        try:
+            with ctx.profiler.stage("prompt"):
+                messages = build_messages(spec, row)
+            response = await call_model(ctx, messages, word=word, attempt=attempt + 1)
+
+            raw_content = response.choices[0].message.content
+            # 解析、修复和关键词提取在解析池里做；最后一次尝试时接受截断输出里能恢复的部分
+            with ctx.profiler.stage("parse"):
+                keywords, data_str, problems = await ctx.parsing.entry(
+                    row, raw_content, allow_truncated=attempt == spec.max_attempts - 1)
+            remember(ctx, response)
+            await store_entry(ctx, row, keywords, data_str, problems)
+
+            usage = getattr(response, "usage", None)
+            tokens = f" | {usage.total_tokens} tokens (缓存 {cached_tokens(usage)})" if usage else ""
+            if not spec.quiet:
+                with ctx.profiler.stage("log"):
+                    print(f"✅ {word}{tokens} | 并发 {ctx.pool.limit}")
+            return True
+
+        except Exception as e:
+            last_error = e
+            kind = classify_error(e)
+            if kind == "cache_miss":
+                break
+            await record(ctx, word, attempts=1, error=kind)
+            if response is not None:
+                forget(ctx, response)
+            wait_time = backoff_delay(attempt, kind)
+
+            if kind == "rate_limit":
+                print(f"⏳ 限流等待: {word}. 等待 {wait_time:.1f}s")
+            elif kind == "timeout":
+                print(f"⏳ 超时错误: {word}. 尝试重试...")
+            elif kind == "json":
+                print(f"⚠️ JSON 严重错误: {word} | {e}")
+            else:
+                print(f"❌ Worker 错误: {word} | {e}. 等待 {wait_time:.1f}s")
+            if ctx.scheduler is not None and attempt + 1 < spec.max_attempts:
+                await ctx.scheduler.retry(row, attempt + 1, wait_time)
+                return None
+            await asyncio.sleep(wait_time)
+
+    print(f"❌ {word} 失败 | 最终原因: {last_error}")
+    # 仅缓存未命中的词留在 pending，下次在线生成时照常调度
+    kind = classify_error(last_error)
+    await record(ctx, word, PENDING if kind == "cache_miss" else FAILED, error=kind)
+    return False
+
+
+async def process_batch(ctx, rows):
+    """一次请求生成多个词条，返回每个词是否成功。
+
+    整批请求失败或 JSON 损坏时对半拆分重试；
+    批量结果里缺失或格式不对的词单独回退到逐词请求。
+    """
+    spec = ctx.spec
+    if len(rows) == 1:
+        return [await process_row(ctx, rows[0])]
+
+    words = [spec.word_of(row) for row in rows]
+    prepared = None
+    for attempt in range(spec.max_attempts):
+        response = None
+        try:
+            with ctx.profiler.stage("prompt"):
+                messages = build_batch_messages(spec, rows)
+            response = await call_model(ctx, messages, entries=len(rows), word=words[0], attempt=attempt + 1)
+            with ctx.profiler.stage("parse"):
+                prepared, errors = await ctx.parsing.batch(rows, words, response.choices[0].message.content)
+            remember(ctx, response)
+            break
+        except Exception as e:
+            kind = classify_error(e)
+            if response is not None:
+                forget(ctx, response)
+            if kind == "cache_miss":
+                break
+            for word in words:
+                await record(ctx, word, attempts=1, error=kind)
+            if kind == "json":
+                # 多半是输出太长被截断，再试同样大小的批次意义不大
+                print(f"⚠️ 批量 JSON 损坏 ({len(rows)} 词)，拆分重试 | {e}")
+                break
+            wait_time = backoff_delay(attempt, kind)
+            print(f"⏳ 批量请求失败 ({len(rows)} 词, {kind})，等待 {wait_time:.1f}s | {e}")
+            await asyncio.sleep(wait_time)
+
+    if prepared is None:
+        half = len(rows) // 2
+        left = await process_batch(ctx, rows[:half])
+        right = await process_batch(ctx, rows[half:])
+        return left + right
+
+    stored = []
+    fallback_rows = []
+    for row, word in zip(rows, words):
+        if word not in prepared:
+            if word in errors:
+                print(f"⚠️ 批量条目处理失败: {word} | {errors[word]}")
+            fallback_rows.append(row)
+            continue
+        stored.append(store_entry(ctx, row, *prepared[word]))
+    # 有字段要修复的词各自发修复请求，并发进行
+    await asyncio.gather(*stored)
+    results = [True] * len(stored)
+    ctx.stats["batched"] += len(stored)
+
+    if not spec.quiet:
+        print(f"✅ 批量 {len(rows) - len(fallback_rows)}/{len(rows)} 词 | 并发 {ctx.pool.limit}")
+    if fallback_rows:
+        print(f"↩️ 单独重试: {[spec.word_of(row) for row in fallback_rows]}")
+        ctx.stats["fallback"] += len(fallback_rows)
+        results += await asyncio.gather(*[process_row(ctx, row) for row in fallback_rows])
+    return results
+
+
+async def worker(ctx, scheduler):
+    """常驻 worker：每次从调度器取优先级最高的 batch_size 个词，直到全部处理完。
+
+    新词按批量请求；调度器分回来的重试词逐个接着上次的尝试次数重试。
+    """
+    batch_size = ctx.spec.batch_size if ctx.spec.build_batch_prompt else 1
+    while True:
+        items = await scheduler.take(batch_size)
+        if not items:
+            return
+        batch = [row for row, attempt in items if not attempt]
+        for row in batch:
+            await record(ctx, ctx.spec.word_of(row), IN_FLIGHT)
+        try:
+            results = await process_batch(ctx, batch) if batch else []
+            results += await asyncio.gather(*[process_row(ctx, row, attempt) for row, attempt in items if attempt])
+        finally:
+            await scheduler.done([row for row, _ in items])
+        for ok in results:
+            # None 表示已放回调度器，等重试的结果
+            if ok:
+                ctx.stats["ok"] += 1
+            elif ok is not None:
+                ctx.stats["failed"] += 1
+
+
+async def regen_worker(ctx, items):
+    """按字段重写模式的 worker：每次取一个 (row, data)，逐词请求。"""
+    for row, data_str in items:
+        if await regenerate_entry(ctx, row, data_str):
+            ctx.stats["ok"] += 1
+        else:
+            ctx.stats["failed"] += 1
+
+
+# ================= 主程序 =================
+async def main(spec, client=None, pool=None):
+    """在线生成。client / pool 可由调用方传入（如测试替身），否则按 spec 创建。"""
+    if not os.path.exists(spec.source_path):
+        print(f"❌ 找不到 {spec.source_file}！请确保文件存在。")
+        return
+
+    init_db(spec.db_name).close()
+    print(f"库中已有 {count_existing(spec.db_name)} 个词。")
+
+    if pool is None:
+        configs = load_backends(spec.backends_file) if spec.backends_file else None
+        pool = ClientPool.from_spec(spec, configs, client)
+
+    if spec.shard_count > 1:
+        print(f"🧩 分片 {spec.shard_index}/{spec.shard_count}: 只处理本分片的词，写入 {spec.db_name}")
+    # 源文件登记进任务账本后，直接从账本分页调度：不预先加载整张词表
+    added = seed_ledger(spec)
+    states, errors = ledger_summary(spec.db_name)
+    print(f"📒 任务账本: 新登记 {added} | " + " | ".join(f"{k} {v}" for k, v in sorted(states.items())))
+    if errors and not spec.retry_failed:
+        print(f"📒 失败原因: {errors}，使用 --retry-failed 只重跑这些词")
+    if spec.regen_fields:
+        # 按字段重写：从 dictionary 表里按条件选词，不看任务账本的状态
+        rows = iter_selected(spec.db_name, spec.regen_where, spec.word_of)
+        total = count_selected(spec.db_name, spec.regen_where)
+        run_worker = regen_worker
+        print(f"✏️ 按字段重写 {total} 个词条: {', '.join(spec.regen_fields)} | 条件: {spec.regen_where}")
+    else:
+        scheduled = (FAILED,) if spec.retry_failed else (PENDING,)
+        until = None
+        total = states.get(scheduled[0], 0)
+        if spec.coverage:
+            until, total = coverage_cutoff(spec.db_name, spec.coverage, scheduled)
+            covered, done = frequency_coverage(spec.db_name)
+            print(f"🎯 覆盖目标 {spec.coverage:.0%} 频率质量: 按名次截止，本次生成 {total} 词 | "
+                  f"当前已覆盖 {covered:.1%}（{done} 词）")
+        rows = iter_ledger(spec.db_name, scheduled, until=until)
+        run_worker = worker
+    if spec.limit:
+        rows = itertools.islice(rows, spec.limit)
+        total = min(total, spec.limit)
+    scheduler = None
+    if not spec.regen_fields:
+        # 新词和重试的词都按频率名次分给 worker，中途停下时先覆盖最常用的词
+        scheduler = rows = PriorityScheduler(rows, spec.word_of)
+
+    profiler = StageProfiler(spec.profile)
+    writer = DBWriter(spec.db_name, spec.durability, profiler=profiler)
+    queue = writer.queue
+    db_task = asyncio.create_task(writer.run())
+
+    cache = ResponseCache(spec.cache_file, spec.cache_max_mb * 1024 * 1024) if spec.use_cache else None
+    parsing = ParsePool(spec.extract_keywords, spec.validate, spec.parse_workers, spec.parse_pool)
+    ctx = RunContext(spec, pool, queue, cache, telemetry=Telemetry(total), profiler=profiler, parsing=parsing,
+                     scheduler=scheduler)
+    stats = ctx.stats
+    if spec.cascade:
+        # 每个便宜档是共享队列、缓存、统计和解析池的子上下文，只换模型、客户端池和延迟统计
+        ctx.tier = CascadeTier(spec.model_name, len(spec.cascade))
+        ctx.tiers = [
+            dataclasses.replace(ctx, spec=tier_spec, pool=tier_pool, latency=LatencyTracker(),
+                                tier=CascadeTier(tier_spec.model_name, level))
+            for level, (tier_spec, tier_pool) in enumerate(build_tier_pools(spec, client))
+        ] + [ctx]
+        print(f"🪜 模型级联: {' → '.join(t.tier.name for t in ctx.tiers)}"
+              f"{'' if spec.validate else ' | 没有校验函数，只有解析失败才升级'}"
+              f"{' | 批量请求只用最后一档' if spec.batch_size > 1 and spec.build_batch_prompt else ''}")
+    if cache is not None:
+        cached = cache.stats()
+        print(f"🗄️ 响应缓存: {spec.cache_file} ({cached['entries']} 条, {cached['bytes'] / 1024 / 1024:.1f} MB)"
+              f"{' | 仅用缓存' if spec.cache_only else ''}")
+
+    print(f"🏃 开始处理... 使用模型: {spec.model_name} | 初始并发: {pool.limit} (范围 {spec.min_concurrency}-{spec.max_concurrency}"
+          f"{f' × {len(pool.backends)} 个后端' if len(pool.backends) > 1 else ''}) | 解析: {parsing.describe()}")
+    for backend in pool.backends:
+        config = backend.config
+        if backend.rate_limiter.enabled:
+            print(f"🚦 {backend.name} 限速: RPM {config.rpm_limit or '不限'} | TPM {config.tpm_limit or '不限'}")
+    progress = asyncio.create_task(ctx.telemetry.run_progress(ctx, spec.progress_interval))
+    lag_monitor = LoopLagMonitor() if spec.profile else None
+    if lag_monitor is not None:
+        lag_monitor.start()
+    server = await ctx.telemetry.serve(ctx, spec.metrics_port) if spec.metrics_port else None
+    start = time.time()
+    # worker 数取所有后端的并发上限之和，实际在途请求数由各后端的 AIMD 控制器决定
+    # 级联时 worker 可能停在任何一档，按各档上限之和开
+    workers = [
+        asyncio.create_task(run_worker(ctx, rows))
+        for _ in range(sum(t.pool.max_concurrency for t in ctx.tiers) if ctx.tiers else pool.max_concurrency)
+    ]
+    try:
+        await asyncio.gather(*workers)
+    except Exception as e:
+        print(f"❌ 读取源文件时发生错误: {e}")
+        for w in workers:
+            w.cancel()
+    progress.cancel()
+    print(ctx.telemetry.progress_line(ctx))
+
+    total = stats["ok"] + stats["failed"]
+    if total == 0:
+        print("数据库已是最新，无需操作！")
+    else:
+        elapsed = time.time() - start
+        print(f"\n✅ 所有 API worker 均已完成。成功 {stats['ok']} / {total}，耗时 {elapsed:.1f}s，最终并发 {pool.limit}")
+        print(f"📊 共消耗 {stats['tokens']} tokens，约 {stats['tokens'] / max(elapsed, 1e-9) * 60:.0f} tokens/min")
+        print(f"📊 K={spec.batch_size if spec.build_batch_prompt else 1} | 请求 {stats['requests']} 次 | "
+              f"{stats['ok'] / max(elapsed, 1e-9):.2f} 词/s | {stats['tokens'] / max(stats['ok'], 1):.0f} tokens/词 | "
+              f"批量命中 {stats['batched']} 词，回退逐词 {stats['fallback']} 词")
+        print(f"📊 本地缓存命中 {stats['cache_hits']} 次")
+        if spec.stream:
+            ttft = stats['ttft_sum'] / max(stats['ttft_count'], 1)
+            print(f"📊 流式: 平均首 token {ttft:.2f}s | 提前中止 {stats['aborted']} 次")
+        print(f"📊 Prompt 缓存命中 {stats['cached_tokens']} / {stats['prompt_tokens']} tokens "
+              f"({stats['cached_tokens'] / max(stats['prompt_tokens'], 1):.0%})")
+        if ctx.latency.ready:
+            p50, p95, p99 = (ctx.latency.percentile(q) for q in (0.5, 0.95, 0.99))
+            timeout = ctx.latency.timeout(spec.timeout) if spec.adaptive_timeout else spec.timeout
+            print(f"📊 单词条延迟 p50 {p50:.1f}s / p95 {p95:.1f}s / p99 {p99:.1f}s | 超时 {timeout:.0f}s")
+        if stats["regen_skipped"]:
+            print(f"📊 字段重写: {stats['regen_skipped']} 个词条没有匹配的字段，已跳过")
+        if stats["invalid"]:
+            print(f"📊 校验: {stats['invalid']} 词有字段未通过 | 修复请求 {stats['repair_requests']} 次，"
+                  f"修好 {stats['repaired']} 词，仍有问题 {stats['unrepaired']} 词")
+        if spec.hedge:
+            print(f"📊 对冲请求 {stats['hedges']} 次（上限 {spec.hedge_budget:.0%}），其中备份先返回 {stats['hedge_wins']} 次")
+        if ctx.tiers:
+            print_cascade_report([t.tier for t in ctx.tiers], total)
+        for tier_ctx in ctx.tiers[:-1]:
+            tier_ctx.pool.report()
+        pool.report()
+
+    print("⏳ 正在等待数据库队列清空...")
+    await ctx.telemetry.flush(queue)
+    await writer.close(db_task)
+    if scheduler is not None:
+        covered, done = frequency_coverage(spec.db_name)
+        print(f"🎯 已覆盖频率质量 {covered:.1%}（{done} 词{'' if spec.weight else '，频次按名次的 Zipf 分布估计'}）")
+    if cache is not None:
+        cache.close()
+    for tier_ctx in ctx.tiers[:-1]:
+        await tier_ctx.pool.close()
+    await pool.close()
+    parsing.close()
+    if lag_monitor is not None:
+        lag_monitor.stop()
+        profiler.report()
+        lag_monitor.report()
+    if server is not None:
+        server.close()
+        await server.wait_closed()
+
+    print(f"{spec.name}词典构建完成！")
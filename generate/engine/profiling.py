@@ -0,0 +1,99 @@
+import asyncio
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+
+# 事件循环延迟直方图的桶上界（秒）
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+
+class StageProfiler:
+    """按阶段累计耗时：prompt 构建、限速等待、槽位等待、API 调用、解析、入队、写库。
+
+    enabled 为 False 时 stage() 返回空上下文，record() 直接返回，开销可以忽略。
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.samples = defaultdict(list)
+
+    def stage(self, name):
+        if not self.enabled:
+            return nullcontext()
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[name].append(time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        if self.enabled:
+            self.samples[name].append(seconds)
+
+    def report(self):
+        if not self.enabled or not self.samples:
+            return
+        print("🔬 阶段耗时 (ms):")
+        # 中文表头每个字占两列，宽度相应减去
+        print(f"   {'阶段':<14}{'次数':>6}{'合计(s)':>8}{'均值':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'最大':>7}")
+        for name, values in self.samples.items():
+            values = sorted(values)
+            n = len(values)
+
+            def pct(q):
+                return values[min(n - 1, int(q * n))] * 1000
+
+            print(f"   {name:<16}{n:>8}{sum(values):>10.2f}{sum(values) / n * 1000:>9.2f}"
+                  f"{pct(0.5):>9.2f}{pct(0.95):>9.2f}{pct(0.99):>9.2f}{values[-1] * 1000:>9.2f}")
+
+
+class LoopLagMonitor:
+    """每 interval 秒睡一次，实际醒来比预期晚多少就是事件循环被同步代码占住的时间。"""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.buckets = [0] * (len(LAG_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.observe(max(0.0, loop.time() - expected))
+
+    def observe(self, lag):
+        self.count += 1
+        self.total += lag
+        self.max = max(self.max, lag)
+        for i, bound in enumerate(LAG_BUCKETS):
+            if lag <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def report(self):
+        if not self.count:
+            return
+        print(f"🔬 事件循环延迟: {self.count} 次采样 | 平均 {self.total / self.count * 1000:.2f} ms | "
+              f"最大 {self.max * 1000:.1f} ms")
+        labels = [f"≤{b * 1000:g}ms" for b in LAG_BUCKETS] + [f">{LAG_BUCKETS[-1] * 1000:g}ms"]
+        width = max(self.buckets)
+        for label, n in zip(labels, self.buckets):
+            bar = "█" * (round(n / width * 40) if width else 0)
+            print(f"   {label:>9} {n:>8} {bar}")
@@ -0,0 +1,61 @@
+import json
+
+
+# 前缀缓存友好的布局：
+#   system 消息 + 语言指令块（与具体词无关，逐字节相同）在前，
+#   每个词的输入（目标词、拉丁语的元数据锚点等）只出现在最末尾。
+# 服务端的 prompt cache 按最长公共前缀命中，第一个变化的字节越靠后，命中的部分越长。
+
+BATCH_RULES = """
+    ### BATCH MODE
+    Produce one complete, independent entry for EACH target word listed at the end, applying every instruction above to each word separately.
+    Output ONE JSON object whose keys are exactly the listed headwords, spelled verbatim.
+    The value for each key is that word's full entry in the structure above. Do not merge, skip or add words.
+    """
+
+REPAIR_RULES = """
+    ### REPAIR MODE
+    An entry for the target word was already generated (CURRENT ENTRY below), but some fields failed validation.
+    Regenerate ONLY the fields listed under FIELDS TO FIX, following every instruction above and staying consistent with the rest of the entry.
+    Output ONE JSON object whose keys are exactly the listed field paths (dot-separated; numbers are list indices) and whose values are the corrected values.
+    """
+
+
+def compose_prompt(instructions, target):
+    """单词请求：固定指令在前，目标词输入在后。"""
+    return f"""{instructions.rstrip()}
+
+    ### TARGET
+    {target.strip()}
+    """
+
+
+def compose_batch_prompt(instructions, words, targets):
+    """把 K 个词的输入块拼到同一份指令后面，要求按词头返回一个 JSON 对象。
+
+    instructions 和 BATCH_RULES 与具体词无关，整段可被缓存；
+    targets 是每个词各自的输入块，与 words 一一对应，全部放在末尾。
+    """
+    target_lines = "\n".join(f"    [{i}] {target.strip()}" for i, target in enumerate(targets, 1))
+    return f"""{instructions.rstrip()}
+{BATCH_RULES.rstrip()}
+
+    ### TARGETS ({len(words)} words)
+    Keys: {json.dumps(words, ensure_ascii=False)}
+{target_lines}
+    """
+
+
+def compose_repair_prompt(prompt, entry_json, problems):
+    """字段修复请求：原来的整段 prompt（指令 + 目标词）原样在前，可以命中前缀缓存；
+    当前词条和要重写的字段及原因放在最后。"""
+    fields = "\n".join(f"    - {path}: {reason}" for path, reason in problems.items())
+    return f"""{prompt.rstrip()}
+{REPAIR_RULES.rstrip()}
+
+    ### CURRENT ENTRY
+    {entry_json}
+
+    ### FIELDS TO FIX
+{fields}
+    """
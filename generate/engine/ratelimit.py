@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+from .concurrency import PriorityLock
+
+
+class TokenBucket:
+    """按分钟额度连续回填的令牌桶；余额允许为负（实际用量超出预估时记账）。"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        self._refill()
+        # 单次请求超过整桶时，只要求桶满即可放行，避免永远等不到
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self._refill()
+        self.tokens -= amount
+
+    def give_back(self, amount):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """同时按 RPM 和 TPM 给出站请求限速。
+
+    调用前按预估 token 数预留额度，拿到 response.usage 后用实际用量多退少补。
+    headroom 让实际速率略低于账户上限，减少撞线后的 429 退避。
+    """
+
+    def __init__(self, rpm=0, tpm=0, headroom=0.9, expected_completion_tokens=1500):
+        self.requests = TokenBucket(rpm * headroom) if rpm else None
+        self.tokens = TokenBucket(tpm * headroom) if tpm else None
+        self._lock = PriorityLock()
+        self._completion_ewma = float(expected_completion_tokens)
+
+    @property
+    def enabled(self):
+        return self.requests is not None or self.tokens is not None
+
+    def estimate(self, messages, entries=1):
+        # 粗估：英文约 4 字符 / token，中日文更密，统一按 3 取偏保守的值
+        prompt_chars = sum(len(m["content"]) for m in messages)
+        return int(prompt_chars / 3 + self._completion_ewma * entries)
+
+    async def reserve(self, messages, entries=1, priority=0):
+        """等待两个桶都有余量后扣除，返回本次预留的 token 数。
+
+        entries 是这次请求预计产出的词条数（批量模式下为 K）；priority 小的先排上。
+        """
+        if not self.enabled:
+            return 0
+        estimated = self.estimate(messages, entries)
+        # 持锁排队：按优先级、同优先级先到先得，大请求不会被小请求一直插队饿死
+        async with self._lock.hold(priority):
+            while True:
+                wait = 0.0
+                if self.requests:
+                    wait = max(wait, self.requests.wait_time(1))
+                if self.tokens:
+                    wait = max(wait, self.tokens.wait_time(estimated))
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(estimated)
+        return estimated
+
+    def settle(self, reserved, usage, entries=1, refund=False):
+        """按 response.usage 修正预留。
+
+        usage 为空（请求失败）时，只有 refund 为真（请求确定没到模型：连不上、429、拿到槽位前被取消）
+        才退回预留；超时和被取消的对冲请求服务端多半已经算过，按预估记账，否则 TPM 会少算。
+        """
+        if not self.enabled:
+            return
+        if usage is None:
+            if refund and self.tokens:
+                self.tokens.give_back(reserved)
+            return
+        completion = getattr(usage, "completion_tokens", None)
+        if completion:
+            self._completion_ewma = 0.9 * self._completion_ewma + 0.1 * completion / entries
+        if self.tokens:
+            diff = reserved - usage.total_tokens
+            if diff > 0:
+                self.tokens.give_back(diff)
+            else:
+                self.tokens.take(-diff)
@@ -0,0 +1,63 @@
+import json
+import sqlite3
+
+from .validation import expand_path
+
+
+# 没给 --note 时写在每个要重写的字段后面的说明
+REGEN_NOTE = "regenerate this field from scratch with higher quality, following every instruction above"
+
+
+def parse_fields(text):
+    """--fields 参数：逗号分隔的字段路径，可以含 *。"""
+    fields = tuple(f.strip() for f in text.split(",") if f.strip())
+    if not fields:
+        raise ValueError("--fields 至少要给一个字段路径")
+    return fields
+
+
+def regen_problems(data, fields, note=""):
+    """把字段模式展开成这个词条里实际存在的路径，返回 {路径: 说明}，格式与校验结果相同。"""
+    return {path: note or REGEN_NOTE for pattern in fields for path in expand_path(data, pattern)}
+
+
+def count_selected(db_name, where):
+    """符合条件的词条数；条件写错时抛出 sqlite3.OperationalError。"""
+    conn = sqlite3.connect(db_name)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM dictionary WHERE ({where})").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def iter_selected(db_name, where, word_of=None, page_size=500):
+    """按 word 分页读出 dictionary 表里符合 where 条件的词条，产出 (源数据行, data)。
+
+    where 是直接拼进 SQL 的条件，可以用 word / keywords / data / created_at 列和 SQLite 的
+    JSON 函数，例如 "json_array_length(data, '$.senses') > 3"。源数据行取自任务账本的 payload，
+    账本里没有的词（如旧库）退回词头本身，拉丁语这类需要元数据的脚本会在构造 prompt 时报错跳过。
+    按主键翻页、每页单独查询，不长时间占着读事务，写库协程同时回写也不影响。
+    """
+    conn = sqlite3.connect(db_name)
+    last = ""
+    try:
+        while True:
+            page = conn.execute(
+                f"SELECT word, data FROM dictionary WHERE word > ? AND ({where}) ORDER BY word LIMIT ?",
+                (last, page_size),
+            ).fetchall()
+            if not page:
+                return
+            words = [word for word, _ in page]
+            placeholders = ",".join("?" * len(words))
+            payloads = dict(conn.execute(
+                f"SELECT word, payload FROM jobs WHERE word IN ({placeholders}) AND payload IS NOT NULL", words))
+            for word, data in page:
+                row = json.loads(payloads[word]) if word in payloads else word
+                # 账本里的词头与库里的 word 不一致时（脚本改过 headword）按库里的为准
+                if word_of is not None and word_of(row) != word:
+                    row = word
+                yield row, data
+            last = words[-1]
+    finally:
+        conn.close()
@@ -0,0 +1,109 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+
+_UNREAD = object()
+_END = object()
+
+
+class PriorityScheduler:
+    """按频率名次把待生成的词分给 worker。
+
+    新词从任务账本按优先级顺序读入（iter_ledger 产出的 (priority, row)）；要重试的词
+    退避期间不占 worker，期满后按原来的优先级插回，排在名次更靠后的新词前面。
+    worker 每次拿当前能发的优先级最高的词，运行中途停下时已生成的总是最常用的那部分。
+    """
+
+    def __init__(self, rows, word_of):
+        self._rows = iter(rows)
+        self._word_of = word_of
+        self._fresh = _UNREAD
+        self._ready = []       # (priority, 序号, row, attempt)：退避已到期、等着重发的词
+        self._backoff = []     # (到期时间, 序号, priority, row, attempt)
+        self._tickets = itertools.count()
+        # 在 worker 手里的词 -> [优先级, 持有数]：放回重试的词可能在原 worker 调 done 之前就被别的 worker
+        # 取走，按持有数清理，保证只记在途的词，内存与词表大小无关
+        self._priorities = {}
+        self._in_flight = 0
+        self._cond = asyncio.Condition()
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    @property
+    def retrying(self):
+        return len(self._ready) + len(self._backoff)
+
+    def priority(self, word):
+        """词的调度优先级，call_model 用它在限速和并发槽位前排队；不是调度器分出的词返回 0。"""
+        entry = self._priorities.get(word)
+        return entry[0] if entry else 0
+
+    def _peek(self):
+        if self._fresh is _UNREAD:
+            self._fresh = next(self._rows, _END)
+        return self._fresh
+
+    def _pop(self, now):
+        while self._backoff and self._backoff[0][0] <= now:
+            _, ticket, priority, row, attempt = heapq.heappop(self._backoff)
+            heapq.heappush(self._ready, (priority, ticket, row, attempt))
+        fresh = self._peek()
+        # 同优先级时重试的词先走
+        if self._ready and (fresh is _END or self._ready[0][0] <= fresh[0]):
+            priority, _, row, attempt = heapq.heappop(self._ready)
+        elif fresh is not _END:
+            priority, row = fresh
+            attempt = 0
+            self._fresh = _UNREAD
+        else:
+            return None
+        entry = self._priorities.setdefault(self._word_of(row), [priority, 0])
+        entry[0] = priority
+        entry[1] += 1
+        return row, attempt
+
+    async def take(self, n=1):
+        """取最多 n 个词，返回 [(row, attempt)]；没有能发的词时等到有重试到期，全部处理完返回空列表。"""
+        async with self._cond:
+            while True:
+                now = time.monotonic()
+                items = []
+                while len(items) < n:
+                    item = self._pop(now)
+                    if item is None:
+                        break
+                    items.append(item)
+                if items:
+                    self._in_flight += len(items)
+                    return items
+                if not self._backoff and not self._in_flight:
+                    return []
+                timeout = self._backoff[0][0] - now if self._backoff else None
+                try:
+                    await asyncio.wait_for(self._cond.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def retry(self, row, attempt, delay):
+        """把失败的词放回调度器：delay 秒后以原优先级重新参与分配，attempt 是下一次的尝试序号。"""
+        priority = self.priority(self._word_of(row))
+        async with self._cond:
+            heapq.heappush(self._backoff, (time.monotonic() + delay, next(self._tickets), priority, row, attempt))
+            self._cond.notify_all()
+
+    async def done(self, rows):
+        """worker 处理完（成功、失败或已放回重试）这些词。"""
+        async with self._cond:
+            for row in rows:
+                word = self._word_of(row)
+                entry = self._priorities.get(word)
+                if entry is not None:
+                    entry[1] -= 1
+                    if entry[1] <= 0:
+                        del self._priorities[word]
+            self._in_flight -= len(rows)
+            self._cond.notify_all()
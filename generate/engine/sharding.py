@@ -0,0 +1,85 @@
+import hashlib
+import os
+import re
+import subprocess
+import sys
+import time
+
+
+def shard_of(word, count):
+    """词头所属的分片号。用 blake2b 而不是 hash()，跨进程、跨机器、跨 Python 版本都稳定。"""
+    digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count
+
+
+def parse_shard(text):
+    """解析 "i/n"（i 从 0 开始），返回 (i, n)。"""
+    m = re.fullmatch(r"(\d+)/(\d+)", text.strip())
+    if not m:
+        raise ValueError(f"分片格式应为 i/n，例如 0/4: {text!r}")
+    index, count = int(m.group(1)), int(m.group(2))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"分片号超出范围: {text!r}")
+    return index, count
+
+
+def shard_db_name(db_name, index, count):
+    """english_dictionary.db → english_dictionary.shard-0-of-4.db"""
+    stem, ext = os.path.splitext(db_name)
+    return f"{stem}.shard-{index}-of-{count}{ext or '.db'}"
+
+
+def base_db_name(db_name):
+    """shard_db_name 的逆：english_dictionary.shard-0-of-4.db → english_dictionary.db；不是分片库时原样返回。"""
+    stem, ext = os.path.splitext(db_name)
+    return re.sub(r"\.shard-\d+-of-\d+$", "", stem) + ext
+
+
+def run_shards(script, count, args, db_name, poll=30.0):
+    """在本机启动 count 个生成进程，每个只处理自己的分片、写自己的分片库。
+
+    args 是透传给每个子进程的全局参数；子进程输出写到分片库旁边的 .log 文件，
+    协调进程定时汇总各分片最新的进度行。返回各分片的退出码列表。
+    """
+    procs = []
+    for index in range(count):
+        log_path = os.path.splitext(shard_db_name(db_name, index, count))[0] + ".log"
+        log = open(log_path, "w", encoding="utf-8")
+        cmd = [sys.executable, script, *args, "--shard", f"{index}/{count}"]
+        proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, env={**os.environ, "PYTHONUNBUFFERED": "1"})
+        procs.append((proc, log, log_path))
+        print(f"🚀 分片 {index}/{count}: pid {proc.pid}，日志 {log_path}")
+
+    try:
+        while any(proc.poll() is None for proc, _, _ in procs):
+            time.sleep(poll)
+            for index, (proc, _, log_path) in enumerate(procs):
+                state = "运行中" if proc.poll() is None else f"已退出 ({proc.returncode})"
+                print(f"   [{index}/{count}] {state} | {_last_progress(log_path)}")
+    except KeyboardInterrupt:
+        print("⚠ 收到中断，正在停止所有分片...")
+        for proc, _, _ in procs:
+            proc.terminate()
+        for proc, _, _ in procs:
+            proc.wait()
+    finally:
+        for _, log, _ in procs:
+            log.close()
+
+    codes = [proc.returncode for proc, _, _ in procs]
+    for index, (proc, _, log_path) in enumerate(procs):
+        print(f"🏁 分片 {index}/{count}: 退出码 {proc.returncode} | {_last_progress(log_path)}")
+    return codes
+
+
+def _last_progress(log_path):
+    """日志里最后一行进度或完成汇总。"""
+    last = ""
+    try:
+        with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if line.startswith("⏱") or "所有 API worker 均已完成" in line:
+                    last = line.strip()
+    except OSError:
+        pass
+    return last or "(暂无进度)"
@@ -0,0 +1,107 @@
+import os
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from .sharding import base_db_name, shard_of
+
+
+@dataclass
+class LanguageSpec:
+    """一种语言的生成配置。
+
+    各语言脚本只需提供 Prompt 构造、数据源读取和关键词提取，
+    并发、重试、解析和写库都由 engine 统一处理。
+    """
+    name: str
+    db_name: str
+    source_file: str
+    base_dir: str
+    system_message: str
+
+    build_prompt: Callable        # row -> 用户消息
+    load_rows: Callable           # 源文件路径 -> 可迭代的 row
+    extract_keywords: Callable    # (row, data) -> 关键词列表
+    headword: Optional[Callable] = None  # row -> 主键；默认 row 本身就是单词
+    build_batch_prompt: Optional[Callable] = None  # [row] -> 多词用户消息
+    validate: Optional[Callable] = None  # (row, data) -> {字段路径: 问题}，见 validation 模块
+    hard: Optional[Callable] = None      # row -> True 时跳过模型级联的便宜档，直接用最后一档
+    rank: Optional[Callable] = None      # row -> 频率名次，越小越常用，也是调度顺序；默认按源文件顺序
+    weight: Optional[Callable] = None    # row -> 语料频次，用于 coverage；默认按名次的 Zipf 分布估计
+    dedup_key: Optional[Callable] = None  # row -> 归一化后的分组键，默认 dedup.fold_headword(词头)
+    aliases: Optional[Callable] = None   # row -> 查词时也应指向这个词头的其它写法，见 dedup 模块
+
+    api_key: str = ""
+    base_url: str = ""
+    model_name: str = ""
+    cascade: tuple = ()          # 模型级联里比 model_name 便宜的档位（模型名或后端配置 JSON），便宜的在前
+
+    concurrency: int = 64        # AIMD 初始并发
+    min_concurrency: int = 4
+    max_concurrency: int = 256
+    rpm_limit: int = 0           # 账户每分钟请求数上限，0 表示不限
+    tpm_limit: int = 0           # 账户每分钟 token 上限，0 表示不限
+    timeout: float = 200         # 超时上限；adaptive_timeout 时实际超时按延迟分位数收紧
+    adaptive_timeout: bool = True
+    max_attempts: int = 3
+    repair_attempts: int = 1     # 校验不通过时只重写问题字段的请求次数，0 表示不修复
+    batch_size: int = 1          # 每次请求的词数 K，1 表示逐词请求
+    limit: int = 0               # 本次最多处理的词数，0 表示不限（基准测试、试跑用）
+    coverage: float = 0          # >0 时只生成按名次累计频率质量达到这个比例的词（如 0.95），见 ledger.coverage_cutoff
+
+    stream: bool = False         # 流式接收，边收边检查，坏输出提前中止
+    max_output_chars: int = 0    # 单个词条输出的字符上限，超过即中止；0 表示不限
+
+    hedge: bool = False          # 超过 p95 延迟仍未返回时再发一个相同请求，取先返回的
+    hedge_budget: float = 0.05   # 对冲请求占已完成请求数的比例上限
+
+    use_cache: bool = True       # 调用 API 前先查本地响应缓存
+    cache_only: bool = False     # 只用缓存重建，未命中的词直接跳过
+    cache_path: Optional[str] = None  # 默认与词典库同目录：<库名>_cache.db
+    cache_max_mb: int = 2048
+    retry_failed: bool = False   # 只重跑任务账本里标记为 failed 的词
+    durability: str = "normal"   # 写库持久化档位：normal / full / off，见 storage.DURABILITY_PROFILES
+    backends_file: Optional[str] = None  # 多后端 / 多密钥配置（JSON），见 backends.load_backends
+    quiet: bool = False          # 不逐词打印成功行，只看定时进度行
+    progress_interval: float = 10.0
+    metrics_port: int = 0        # >0 时在本地该端口提供 Prometheus 文本格式的 /metrics
+    profile: bool = False        # 记录各阶段耗时和事件循环延迟，结束时打印
+    parse_workers: int = 0       # >0 时把解析、修复和关键词提取放进这么多个进程（或线程）里
+    parse_pool: str = "process"  # process / thread，见 offload.ParsePool
+    shard_index: int = 0         # 分片运行：只处理 shard_of(词头, shard_count) == shard_index 的词
+    shard_count: int = 1
+    regen_fields: tuple = ()     # 非空时按字段重写已有词条（regen 子命令），见 regenerate 模块
+    regen_where: str = "1"       # 选择要重写的词条的 SQL 条件
+    regen_note: str = ""         # 写给模型的重写要求，空时用 regenerate.REGEN_NOTE
+    temperature: float = 0.1
+
+    def word_of(self, row):
+        return self.headword(row) if self.headword else row
+
+    def in_shard(self, word):
+        return self.shard_count <= 1 or shard_of(word, self.shard_count) == self.shard_index
+
+    @property
+    def variants_db(self):
+        """dedup 写 variants 映射的库：分片运行时是未分片的主库，各分片共用一份。"""
+        return base_db_name(self.db_name) if self.shard_count > 1 else self.db_name
+
+    @property
+    def cache_file(self):
+        return self.cache_path or os.path.splitext(self.db_name)[0] + "_cache.db"
+
+    @property
+    def source_path(self):
+        return os.path.join(self.base_dir, self.source_file)
+
+
+def load_word_list(file_path):
+    """逐行读取词表，跳过空行。"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            word = line.strip()
+            if word:
+                yield word
+
+
+def keywords_to_str(keywords):
+    return " ".join([str(x) for x in keywords]).lower()
@@ -0,0 +1,240 @@
+import asyncio
+import itertools
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .dedup import VARIANTS_SCHEMA
+from .ledger import LEDGER_SCHEMA, LedgerEvent, apply_events, mark_done, upgrade_ledger
+from .telemetry import METRICS_SCHEMA, METRICS_SQL, MetricRecord
+
+
+INSERT_SQL = "INSERT OR REPLACE INTO dictionary (word, keywords, data) VALUES (?, ?, ?)"
+
+
+# ================= 数据库 =================
+def init_db(db_name):
+    """建表（含 jobs 任务账本、metrics 请求指标和 variants 写法映射）；旧库（如英语）缺少 keywords 列、旧账本缺少优先级列时自动补上。"""
+    conn = sqlite3.connect(db_name, check_same_thread=False)
+    cursor = conn.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL;')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS dictionary (
+            word TEXT PRIMARY KEY,
+            keywords TEXT,
+            data JSON,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(dictionary)")]
+    if 'keywords' not in columns:
+        cursor.execute("ALTER TABLE dictionary ADD COLUMN keywords TEXT")
+    cursor.executescript(LEDGER_SCHEMA)
+    upgrade_ledger(cursor)
+    cursor.executescript(METRICS_SCHEMA)
+    cursor.executescript(VARIANTS_SCHEMA)
+    conn.commit()
+    return conn
+
+
+def count_existing(db_name):
+    conn = sqlite3.connect(db_name)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM dictionary").fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        conn.close()
+
+
+def iter_pending(rows, word_of, db_name, chunk_size=500):
+    """惰性过滤掉库中已有的词。
+
+    每次只读入 chunk_size 行，用主键索引批量查询，
+    内存占用与词表大小无关。调用前需先 init_db 建表。
+    """
+    conn = sqlite3.connect(db_name)
+    try:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield from _filter_chunk(conn, chunk, word_of)
+                chunk = []
+        if chunk:
+            yield from _filter_chunk(conn, chunk, word_of)
+    finally:
+        conn.close()
+
+
+def _filter_chunk(conn, chunk, word_of):
+    words = list({word_of(row) for row in chunk})
+    placeholders = ",".join("?" * len(words))
+    done = set(r[0] for r in conn.execute(f"SELECT word FROM dictionary WHERE word IN ({placeholders})", words))
+    for row in chunk:
+        if word_of(row) not in done:
+            yield row
+
+
+# ================= 写入协程 =================
+# 持久化档位：synchronous 决定每次提交是否等 fsync，wal_autocheckpoint 是 WAL 合并回主库的页数阈值
+DURABILITY_PROFILES = {
+    # WAL + NORMAL：断电最多丢最后几次提交，进程崩溃不丢；检查点放宽到约 16 MB
+    "normal": {"synchronous": "NORMAL", "wal_autocheckpoint": 4000},
+    # WAL + FULL：每次提交都 fsync
+    "full": {"synchronous": "FULL", "wal_autocheckpoint": 1000},
+    # 不 fsync：只适合能从缓存或 Batch 结果重建的批量导入
+    "off": {"synchronous": "OFF", "wal_autocheckpoint": 10000},
+}
+
+WRITE_QUEUE_SIZE = 2000
+FLUSH_BYTES = 1024 * 1024
+FLUSH_INTERVAL = 2.0
+EVENT_BYTES = 64
+_TIMER = object()  # 定时器到期，没有新条目
+
+
+def _item_bytes(item):
+    if isinstance(item, (LedgerEvent, MetricRecord)):
+        return EVENT_BYTES
+    # 按 UTF-8 字节数算：中日文一个字符 3 字节，按字符数会让组提交的体积阈值偏大约 3 倍
+    return sum(len(field.encode("utf-8")) for field in item if field)
+
+
+class DBWriter:
+    """单连接的批量写库协程。
+
+    - queue 有界，写库跟不上时 worker 的 put 会等待（背压）；
+    - 按字节数凑够一组再提交，另有定时器保证最早入队的条目最多等 flush_interval 秒；
+    - 所有 SQLite 操作都在同一个专用线程里执行；
+    - 队列里是 (word, keywords, data) 词条、LedgerEvent 账本变更或 MetricRecord 请求指标，
+      词条写入与账本标记 done 在同一个事务里提交，崩溃后两者不会对不上。
+
+    用法：task = create_task(writer.run())，完成后 await writer.close(task)。
+    """
+
+    def __init__(self, db_name, durability="normal", max_queue=WRITE_QUEUE_SIZE,
+                 flush_bytes=FLUSH_BYTES, flush_interval=FLUSH_INTERVAL, profiler=None):
+        if durability not in DURABILITY_PROFILES:
+            raise ValueError(f"未知的持久化档位: {durability}（可选 {', '.join(DURABILITY_PROFILES)}）")
+        self.db_name = db_name
+        self.durability = durability
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.stats = {"rows": 0, "events": 0, "bytes": 0, "commits": 0, "busy": 0.0}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._conn = None
+        self._started = None
+        self._profiler = profiler
+
+    # ---------- 写库线程 ----------
+    def _open(self):
+        conn = init_db(self.db_name)
+        profile = DURABILITY_PROFILES[self.durability]
+        conn.execute(f"PRAGMA synchronous={profile['synchronous']}")
+        conn.execute(f"PRAGMA wal_autocheckpoint={profile['wal_autocheckpoint']}")
+        self._conn = conn
+
+    def _write(self, batch):
+        start = time.perf_counter()
+        conn = self._conn
+        rows = events = 0
+        try:
+            # 按入队顺序分段执行，同一个词先 in_flight 后 done 的顺序不能乱
+            for kind, group in itertools.groupby(batch, key=type):
+                group = list(group)
+                if kind is LedgerEvent:
+                    apply_events(conn, group)
+                    events += len(group)
+                elif kind is MetricRecord:
+                    conn.executemany(METRICS_SQL, group)
+                    events += len(group)
+                else:
+                    conn.executemany(INSERT_SQL, group)
+                    mark_done(conn, [row[0] for row in group])
+                    rows += len(group)
+            conn.commit()
+        except Exception:
+            # 整批回滚：_flush 失败后会原样重试这一批，已执行的部分不能留在事务里
+            # （否则 attempts 累加两次、metrics 重复插入）
+            conn.rollback()
+            raise
+        return rows, events, time.perf_counter() - start
+
+    def _close(self):
+        # 收尾时把 WAL 合并回主库并截断，留下一个干净的 .db 文件
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._conn.close()
+
+    # ---------- 事件循环侧 ----------
+    async def _flush(self, batch, size):
+        loop = asyncio.get_running_loop()
+        try:
+            rows, events, elapsed = await loop.run_in_executor(self._executor, self._write, batch)
+        except Exception as e:
+            print(f"⚠️ DB Error: {e}")
+            return False
+        self.stats["rows"] += rows
+        self.stats["events"] += events
+        self.stats["bytes"] += size
+        self.stats["commits"] += 1
+        self.stats["busy"] += elapsed
+        if self._profiler is not None:
+            self._profiler.record("db_flush", elapsed)
+        if rows:
+            print(f"[{time.strftime('%H:%M:%S')}] DB Wrote Batch: {rows} entries, "
+                  f"{size / 1024:.0f} KB, {rows / max(elapsed, 1e-9):.0f} rows/s")
+        return True
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._open)
+        self._started = time.monotonic()
+
+        buffer = []
+        size = 0
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                item = _TIMER
+            if item is None:
+                self.queue.task_done()
+                break
+            if item is not _TIMER:
+                buffer.append(item)
+                size += _item_bytes(item)
+                self.queue.task_done()
+                if deadline is None:
+                    deadline = loop.time() + self.flush_interval
+
+            if buffer and (size >= self.flush_bytes or loop.time() >= deadline):
+                if await self._flush(buffer, size):
+                    buffer, size, deadline = [], 0, None
+                else:
+                    # 写失败时保留缓冲，等下一个周期重试
+                    deadline = loop.time() + self.flush_interval
+
+        # 处理循环退出后剩余的任何项目
+        if buffer and not await self._flush(buffer, size):
+            print(f"⚠️ Final DB Error: {len(buffer)} 项未写入")
+        await loop.run_in_executor(self._executor, self._close)
+        self._executor.shutdown()
+        self.report()
+        print("数据库写入完成。")
+
+    async def close(self, task):
+        """等队列清空后发送关闭信号，并等写库协程结束。"""
+        await self.queue.join()
+        await self.queue.put(None)
+        await task
+
+    def report(self):
+        s = self.stats
+        wall = time.monotonic() - self._started if self._started else 0.0
+        print(f"💾 写库 {s['rows']} 条 + 账本/指标 {s['events']} 项 | {s['commits']} 次提交 | "
+              f"{s['bytes'] / 1024 / 1024:.1f} MB | 写入速度 {s['rows'] / max(s['busy'], 1e-9):.0f} rows/s | "
+              f"写库线程忙碌 {s['busy'] / max(wall, 1e-9):.0%} ({self.durability})")
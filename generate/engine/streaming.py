@@ -0,0 +1,90 @@
+import time
+from types import SimpleNamespace
+
+from .parser import JSONParseError
+
+
+class StreamAbort(JSONParseError):
+    """流式输出在中途就能判定为坏输出，提前取消。按 JSON 错误处理。"""
+
+
+class StreamGuard:
+    """边接收边检查流式输出。
+
+    - 开头必须是 '{'（允许前面有空白或 ``` 代码块标记），否则多半是模型在写说明文字；
+    - 累计长度超过 max_chars 视为失控输出（重复、跑题）。
+    """
+
+    def __init__(self, max_chars=0):
+        self.max_chars = max_chars
+        self.parts = []
+        self.length = 0
+        self.head = ""
+        self.checked_head = False
+
+    def feed(self, text):
+        self.parts.append(text)
+        self.length += len(text)
+        if not self.checked_head:
+            self.head += text
+            self._check_head()
+        if self.max_chars and self.length > self.max_chars:
+            raise StreamAbort(f"STREAM_ABORT: 输出超过 {self.max_chars} 字符仍未结束")
+
+    def _check_head(self):
+        head = self.head.lstrip()
+        if not head:
+            return
+        if head.startswith("```"):
+            # 跳过 ```json 这一行再看
+            if "\n" not in head:
+                return
+            head = head.split("\n", 1)[1].lstrip()
+            if not head:
+                return
+        if head[0] != "{":
+            raise StreamAbort(f"STREAM_ABORT: 输出不是以 '{{' 开头: {head[:40]!r}")
+        self.checked_head = True
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+
+async def consume_stream(stream, guard, start=None):
+    """读完一个流式响应，返回 (content, usage, ttft)。guard 触发时关闭连接并抛出 StreamAbort。
+
+    start 是发出请求时的 time.monotonic()。有的服务商等第一个 token 出来才返回响应头，
+    从拿到 stream 对象开始计时会把这段等待漏掉，TTFT 接近 0。
+    """
+    if start is None:
+        start = time.monotonic()
+    ttft = None
+    usage = None
+    try:
+        async for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            if ttft is None:
+                ttft = time.monotonic() - start
+            guard.feed(delta)
+    except StreamAbort:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            await close()
+        raise
+    return guard.text, usage, ttft
+
+
+def assembled_response(content, usage, ttft=None):
+    """把流式结果拼成与非流式返回值同形的对象。"""
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=usage,
+        ttft=ttft,
+    )
@@ -0,0 +1,162 @@
+import asyncio
+import time
+from collections import Counter, namedtuple
+
+
+# 每次 API 请求（含失败和被取消的对冲请求）一行，经写库队列写进 metrics 表
+MetricRecord = namedtuple("MetricRecord", [
+    "ts", "word", "entries", "backend", "attempt", "latency", "queue_wait",
+    "prompt_tokens", "completion_tokens", "cached_tokens", "error",
+])
+
+METRICS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS metrics (
+        id INTEGER PRIMARY KEY,
+        ts REAL,
+        word TEXT,
+        entries INTEGER,
+        backend TEXT,
+        attempt INTEGER,
+        latency REAL,
+        queue_wait REAL,
+        prompt_tokens INTEGER,
+        completion_tokens INTEGER,
+        cached_tokens INTEGER,
+        error TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_metrics_ts ON metrics(ts);
+'''
+
+METRICS_SQL = f"INSERT INTO metrics ({', '.join(MetricRecord._fields)}) VALUES ({', '.join('?' * len(MetricRecord._fields))})"
+
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class Telemetry:
+    """请求级指标的汇总与输出：metrics 表、定时进度行和 Prometheus 文本格式。
+
+    observe() 是同步的，可以在 finally 里调用；记录先攒在内存里，
+    由进度协程定时交给写库队列。
+    """
+
+    def __init__(self, total=0):
+        self.total = total
+        self.start = time.monotonic()
+        self.errors = Counter()
+        self.completion_tokens = 0
+        self.queue_wait_sum = 0.0
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        self.latency_count = 0
+        self._records = []
+
+    def observe(self, record):
+        self._records.append(record)
+        self.queue_wait_sum += record.queue_wait
+        if record.error:
+            self.errors[record.error] += 1
+            return
+        self.completion_tokens += record.completion_tokens
+        self.latency_sum += record.latency
+        self.latency_count += 1
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if record.latency <= bound:
+                self.latency_buckets[i] += 1
+
+    async def flush(self, queue):
+        records, self._records = self._records, []
+        for record in records:
+            await queue.put(record)
+
+    # ---------- 进度行 ----------
+    def progress_line(self, ctx):
+        stats = ctx.stats
+        done = stats["ok"] + stats["failed"]
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        rate = done / elapsed
+        eta = format_duration((self.total - done) / rate) if rate > 0 and self.total > done else "-"
+        errors = " ".join(f"{k} {v}" for k, v in self.errors.most_common()) or "无"
+        in_flight = sum(b.limiter.in_flight for b in ctx.pool.backends)
+        return (f"⏱ {done}/{self.total} 词 (失败 {stats['failed']}) | {rate:.2f} 词/s | "
+                f"{stats['tokens'] / elapsed:.0f} tokens/s | ETA {eta} | "
+                f"并发 {in_flight}/{ctx.pool.limit} | 错误: {errors}")
+
+    async def run_progress(self, ctx, interval):
+        """每 interval 秒打印一次进度并把攒下的指标交给写库队列，直到被取消。"""
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush(ctx.queue)
+            print(self.progress_line(ctx))
+
+    # ---------- Prometheus ----------
+    def prometheus(self, ctx):
+        stats = ctx.stats
+        lang = ctx.spec.name
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP llexidict_{name} {help_text}")
+            lines.append(f"# TYPE llexidict_{name} {kind}")
+            for labels, value in samples:
+                label_str = ",".join(f'{k}="{v}"' for k, v in {"language": lang, **labels}.items())
+                lines.append(f"llexidict_{name}{{{label_str}}} {value}")
+
+        metric("words_total", "counter", "Words finished by status.",
+               [({"status": "ok"}, stats["ok"]), ({"status": "failed"}, stats["failed"])])
+        metric("words_scheduled", "gauge", "Words scheduled for this run.", [({}, self.total)])
+        metric("requests_total", "counter", "Successful API requests.", [({}, stats["requests"])])
+        metric("request_errors_total", "counter", "Failed API requests by error class.",
+               [({"kind": k}, v) for k, v in sorted(self.errors.items())])
+        metric("tokens_total", "counter", "Tokens used by type.",
+               [({"type": "total"}, stats["tokens"]), ({"type": "prompt"}, stats["prompt_tokens"]),
+                ({"type": "completion"}, self.completion_tokens), ({"type": "cached"}, stats["cached_tokens"])])
+        metric("cache_hits_total", "counter", "Local response cache hits.", [({}, stats["cache_hits"])])
+        metric("queue_wait_seconds_total", "counter", "Time spent waiting for rate limits and slots.",
+               [({}, round(self.queue_wait_sum, 3))])
+        metric("concurrency_limit", "gauge", "AIMD concurrency limit by backend.",
+               [({"backend": b.name}, b.limiter.limit) for b in ctx.pool.backends])
+        metric("in_flight", "gauge", "Requests in flight by backend.",
+               [({"backend": b.name}, b.limiter.in_flight) for b in ctx.pool.backends])
+
+        lines.append("# HELP llexidict_request_latency_seconds Per-entry latency of successful requests.")
+        lines.append("# TYPE llexidict_request_latency_seconds histogram")
+        for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets):
+            lines.append(f'llexidict_request_latency_seconds_bucket{{language="{lang}",le="{bound}"}} {count}')
+        lines.append(f'llexidict_request_latency_seconds_bucket{{language="{lang}",le="+Inf"}} {self.latency_count}')
+        lines.append(f'llexidict_request_latency_seconds_sum{{language="{lang}"}} {self.latency_sum:.3f}')
+        lines.append(f'llexidict_request_latency_seconds_count{{language="{lang}"}} {self.latency_count}')
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, ctx, port, host="127.0.0.1"):
+        """在本地起一个只响应 GET /metrics 的 HTTP 服务，返回 asyncio.Server。"""
+
+        async def handle(reader, writer):
+            try:
+                request = await reader.readline()
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                parts = request.split()
+                if len(parts) >= 2 and parts[1] == b"/metrics":
+                    status, body = "200 OK", self.prometheus(ctx).encode("utf-8")
+                else:
+                    status, body = "404 Not Found", b"not found\n"
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                    f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("ascii") + body
+                )
+                await writer.drain()
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(handle, host, port)
+        print(f"📈 Prometheus 指标: http://{host}:{port}/metrics")
+        return server
@@ -0,0 +1,68 @@
+"""词条校验与字段级修复的通用部分。
+
+各语言在 LanguageSpec.validate 里提供校验函数：(row, data) -> {字段路径: 问题描述}，
+没有问题时返回空字典。能确定怎么改的小问题（如去掉长音符）可以直接就地修正，不必上报。
+字段路径用点分隔，数字表示列表下标，例如 "readings.pitch_accent"、"senses.0.examples.1.ruby"。
+按字段重新生成时路径里还可以用 * 匹配列表的每一项或对象的每个键，例如 "senses.*.examples"。
+"""
+
+
+def _key(container, part):
+    return int(part) if isinstance(container, list) else part
+
+
+def get_path(data, path):
+    """按字段路径取值，路径不存在时返回 None。"""
+    node = data
+    for part in path.split("."):
+        try:
+            node = node[_key(node, part)]
+        except (KeyError, IndexError, TypeError, ValueError):
+            return None
+    return node
+
+
+def expand_path(data, pattern):
+    """把含 * 的字段路径展开成词条里实际存在的路径；不含 * 时路径存在才返回。"""
+    paths = [("", data)]
+    for part in pattern.split("."):
+        expanded = []
+        for prefix, node in paths:
+            if part == "*":
+                keys = range(len(node)) if isinstance(node, list) else node.keys() if isinstance(node, dict) else ()
+            else:
+                keys = (part,)
+            for key in keys:
+                try:
+                    child = node[_key(node, str(key))]
+                except (KeyError, IndexError, TypeError, ValueError):
+                    continue
+                expanded.append((f"{prefix}.{key}" if prefix else str(key), child))
+        paths = expanded
+    return [path for path, _ in paths]
+
+
+def set_path(data, path, value):
+    """按字段路径写入；中间节点必须已经存在。"""
+    parts = path.split(".")
+    node = data
+    for part in parts[:-1]:
+        node = node[_key(node, part)]
+    node[_key(node, parts[-1])] = value
+
+
+def apply_patch(data, patch, paths):
+    """把修复响应里请求过的字段合并回词条，返回实际写入的路径。
+
+    只接受 paths 里的键，模型顺手改的其它字段一律忽略。
+    """
+    applied = []
+    for path in paths:
+        if path not in patch:
+            continue
+        try:
+            set_path(data, path, patch[path])
+        except (KeyError, IndexError, TypeError, ValueError):
+            continue
+        applied.append(path)
+    return applied
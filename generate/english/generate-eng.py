@@ -1,8 +1,8 @@
 import os
-import json
-import asyncio
-import sqlite3
-from openai import AsyncOpenAI
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from engine import LanguageSpec, compose_batch_prompt, compose_prompt, load_word_list, run
 
 # ================= 配置 =================
 API_KEY = "" 
@@ -11,43 +11,21 @@ MODEL_NAME = ""
 
 
 CONCURRENCY = 64
+# 账户限额 (每分钟请求数 / token 数)，0 表示不限
+RPM_LIMIT = 0
+TPM_LIMIT = 0
+# 每次请求生成的词数，1 表示逐词请求
+BATCH_SIZE = 1
+# 流式模式 (--stream) 下单个词条的输出字符上限，超过视为失控输出并中止
+MAX_OUTPUT_CHARS = 12000
 
 SOURCE_FILE = "count_1w_20k_english_clean.txt"
 DB_NAME = "english_dictionary.db"
-
-# ================= 数据库 =================
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS dictionary (
-            word TEXT PRIMARY KEY,
-            data JSON,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-def word_exists(word):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM dictionary WHERE word = ?", (word,))
-    exists = cursor.fetchone() is not None
-    conn.close()
-    return exists
-
-def save_word(word, data_str):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("INSERT OR REPLACE INTO dictionary (word, data) VALUES (?, ?)", (word, data_str))
-    conn.commit()
-    conn.close()
+SYSTEM_MESSAGE_CONTENT = "You are a dictionary generator. Output valid JSON only."
 
 # ================= 英语 Prompt =================
-def get_english_prompt(word):
-    return f"""
-    Role: Expert Lexicographer & Linguist. Target: English word "{word}".
+ENGLISH_INSTRUCTIONS = """
+    Role: Expert Lexicographer & Linguist.
     Task: Create a deep, insightful entry for an advanced learner (C1/C2 level).
     
     CRITICAL INSTRUCTIONS FOR DEPTH:
@@ -59,12 +37,12 @@ def get_english_prompt(word):
     Output Format: STRICT JSON (No Markdown).
     
     JSON Structure Requirement:
-    {{
-      "word": "{word}",
+    {
+      "word": "The target word",
       "ipa": "IPA pronunciation (US/UK)",
       "etymology": "Brief origin + The root logic (e.g., Latin 'portare' -> to carry -> portable)",
       "senses": [  // List the top 3-5 distinct senses.
-        {{
+        {
           "pos": "Part of Speech",
           "definition_cn": "Chinese Definition (Precise & Contextual), not a direct translation.",
           "core_image": "The 'Soul' of the definition (e.g. 'Violent separation' for 'break'), be insightful and accurate, detailed and explicit.",
@@ -75,67 +53,51 @@ def get_english_prompt(word):
             "Idiomatic expression",
             "Other common idioms or expressions"
           ],
-          "synonym_discrimination": "Compare with [Synonym]. Explain the unique 'flavor' or specific usage scenario of '{word}'.",
+          "synonym_discrimination": "Compare with [Synonym]. Explain the unique 'flavor' or specific usage scenario of the target word.",
           "examples": [
-            {{ "en": "A sentence showing typical usage.", "cn": "Natural Chinese translation." }}
+            { "en": "A sentence showing typical usage.", "cn": "Natural Chinese translation." }
           ]
-        }}
+        }
       ]
-    }}
+    }
     """
 
-# ================= 异步 Worker =================
-async def process_word(sem, client, word):
-    async with sem:
-        if word_exists(word):
-            print(f"⚠[已存在] {word}")
-            return
-
-        print(f"[生成中] {word} ...")
-        
-        try:
-            response = await client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[
-                    {"role": "system", "content": "You are a dictionary generator. Output valid JSON only."},
-                    {"role": "user", "content": get_english_prompt(word)}
-                ],
-                response_format={"type": "json_object"}, # 强制 JSON
-                temperature=0.1
-            )
-            
-            content = response.choices[0].message.content
-            
-            json.loads(content) 
-            
-            save_word(word, content)
-            print(f"✅ [成功] {word}")
-            
-        except Exception as e:
-            print(f"❌ [失败] {word}: {e}")
+def get_english_target(word):
+    return f'Target: English word "{word}".'
 
-# ================= 主程序 =================
-async def main():
-    init_db()
-    
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(base_dir, SOURCE_FILE)
-    
-    with open(file_path, 'r', encoding='utf-8') as f:
-        words = [line.strip() for line in f if line.strip()]
-
-    print(f"任务开始：共 {len(words)} 个单词。")
-    print(f"数据库：{DB_NAME}")
-    print("--------------------------------")
-
-    client = AsyncOpenAI(api_key=API_KEY, base_url=BASE_URL)
-    sem = asyncio.Semaphore(CONCURRENCY)
-
-    tasks = []
-    for word in words:
-        tasks.append(process_word(sem, client, word))
-
-    await asyncio.gather(*tasks)
+def get_english_prompt(word):
+    return compose_prompt(ENGLISH_INSTRUCTIONS, get_english_target(word))
+
+def get_english_batch_prompt(words):
+    return compose_batch_prompt(ENGLISH_INSTRUCTIONS, words, [get_english_target(w) for w in words])
+
+# ================= 关键词 =================
+def extract_keywords(word, data):
+    # 英语模板没有 search_keywords，只索引词头本身
+    keywords = [str(x) for x in data.get("search_keywords", [])]
+    if word not in keywords:
+        keywords.append(word)
+    return keywords
+
+SPEC = LanguageSpec(
+    name="英语",
+    db_name=DB_NAME,
+    source_file=SOURCE_FILE,
+    base_dir=os.path.dirname(os.path.abspath(__file__)),
+    system_message=SYSTEM_MESSAGE_CONTENT,
+    build_prompt=get_english_prompt,
+    build_batch_prompt=get_english_batch_prompt,
+    load_rows=load_word_list,
+    extract_keywords=extract_keywords,
+    api_key=API_KEY,
+    base_url=BASE_URL,
+    model_name=MODEL_NAME,
+    concurrency=CONCURRENCY,
+    rpm_limit=RPM_LIMIT,
+    tpm_limit=TPM_LIMIT,
+    batch_size=BATCH_SIZE,
+    max_output_chars=MAX_OUTPUT_CHARS,
+)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    run(SPEC)
@@ -1,11 +1,10 @@
+import csv
 import os
-import json
-import asyncio
-import sqlite3
-import time
-from openai import AsyncOpenAI
-import random
 import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from engine import LanguageSpec, compose_batch_prompt, compose_prompt, fold_headword, load_word_list, run
 
 # ================= 配置 =================
 API_KEY = "" 
@@ -13,79 +12,26 @@ BASE_URL = ""
 MODEL_NAME = ""
 
 CONCURRENCY = 128
+# 账户限额 (每分钟请求数 / token 数)，0 表示不限
+RPM_LIMIT = 0
+TPM_LIMIT = 0
+# 每次请求生成的词数，1 表示逐词请求
+BATCH_SIZE = 1
+# 流式模式 (--stream) 下单个词条的输出字符上限，超过视为失控输出并中止
+MAX_OUTPUT_CHARS = 16000
 SOURCE_FILE = "jp-clean.txt"
+# 词表去重时用来把假名写法归到汉字写法的读音表 (expression, reading, ...)
+READING_FILE = "all.csv"
 DB_NAME = "japanese_dictionary.db"
 SYSTEM_MESSAGE_CONTENT = (
     "You are a Japanese dictionary generator. Your response MUST be ONLY the requested JSON object. "
     "DO NOT include any explanatory text, preambles, comments, or chain-of-thought before or after the JSON block. "
     "Start immediately with '{' and end with '}'."
 )
-# ================= 数据库new =================
-async def db_writer(queue):
-    def blocking_db_init():
-        conn = sqlite3.connect(DB_NAME, check_same_thread=False)
-        cursor = conn.cursor()
-        cursor.execute('PRAGMA journal_mode=WAL;')
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS dictionary (
-                word TEXT PRIMARY KEY,
-                keywords TEXT,
-                data JSON,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        conn.commit()
-        return conn, cursor
-
-    conn, cursor = await asyncio.to_thread(blocking_db_init)
-
-    batch_buffer = []
-    last_commit = time.time()
-
-    while True:
-        item = await queue.get()
-        if item is None: break
-        
-        word, keywords, data_str = item
-        batch_buffer.append((word, keywords, data_str))
-
-        current_time = time.time()
-        if len(batch_buffer) >= 50 or (current_time - last_commit > 2 and batch_buffer):
-            try:
-                batch_to_write = batch_buffer.copy()
-                batch_buffer = []
-
-                def blocking_db_write(batch):
-                    cursor.executemany("INSERT OR REPLACE INTO dictionary (word, keywords, data) VALUES (?, ?, ?)", batch)
-                    conn.commit()
-                
-                await asyncio.to_thread(blocking_db_write, batch_to_write)
-                last_commit = current_time
-                
-            except Exception as e:
-                print(f"⚠️ DB Error: {e}")
-                batch_buffer = batch_to_write + batch_buffer
-        
-        queue.task_done()
-
-    # 处理循环退出后剩余的任何项目
-    if batch_buffer:
-        try:
-            def blocking_db_final_write(batch):
-                cursor.executemany("INSERT OR REPLACE INTO dictionary (word, keywords, data) VALUES (?, ?, ?)", batch)
-                conn.commit()
-            await asyncio.to_thread(blocking_db_final_write, batch_buffer)
-        except Exception as e:
-            print(f"⚠️ Final DB Error: {e}")
-    
-    await asyncio.to_thread(conn.close)
-    print("数据库写入完成。")
 
 # ================= 日语 Prompt =================
-def get_japanese_prompt(word):
-    return f"""
+JAPANESE_INSTRUCTIONS = """
     Role: Meticulous and Verifying Japanese-Chinese Lexicographer.
-    Target Word: "{word}" (Japanese).
     Target Audience: Advanced Learners (N1/N2) aiming for native-like nuance.
 
     **Core Principles: ACCURACY > COMPLETENESS. VERIFICATION is MANDATORY.**
@@ -93,7 +39,7 @@ def get_japanese_prompt(word):
     **🔥🔥 CRITICAL VERIFICATION STEPS (Must perform before generating): 🔥🔥**
 
     1.  **AMBIGUITY CHECK:**
-        * Does "{word}" have multiple, distinct meanings or parts of speech? (e.g., `そういう` as a pre-noun adjective vs. `そう言う` as a verb phrase).
+        * Does the target word have multiple, distinct meanings or parts of speech? (e.g., `そういう` as a pre-noun adjective vs. `そう言う` as a verb phrase).
         * **Action:** You MUST select the **single most common/primary meaning** associated with the `word` spelling.
         * **Constraint:** All subsequent fields (`pos`, `grammar_meta`, `inflections_detail`, `senses`, `examples`) MUST align 100% with this SINGLE chosen meaning. **Do not mix meanings.**
 
@@ -108,31 +54,31 @@ def get_japanese_prompt(word):
 
     ---
     Output STRICT JSON (No Markdown):
-    {{
+    {
       "word": "Standard Written Form (e.g. 食べる, コンピュータ, 薔薇)",
       
-      "readings": {{//must be generated
+      "readings": {//must be generated
           "kana": "Full Hiragana (e.g. たべる, こんぴゅーた)",
           "katakana": "Full Katakana (e.g. タベル, コンピュータ) - CRITICAL for search",
           "romaji": "Hepburn",
           "pitch_accent": "[num] Type (e.g. [2] Nakadaka) or [?] Unknown",
           "pitch_visual": "Text graph (e.g. LHHLL) or 'N/A'"
-      }},
+      },
 
       "pos": "v. (Godan/Ichidan) / adj-i / adj-na / n. / exp. / rentaishi", // **Added 'rentaishi'**
       
-      "grammar_meta": {{
+      "grammar_meta": {
           "verb_group": "Godan / Ichidan / Suru / N/A",
           "transitivity": "Transitive (他) / Intransitive (自) / N/A",
           "paired_verb": "Counterpart (e.g. 'kieru' -> 'kesu') or null"
-      }},
+      },
 
-      "inflections_detail": {{
+      "inflections_detail": {
           "forms": [
              // "Te-form", "Nai-form", "Ta-form", etc.
              // **If 'pos' is not a verb/adjective, this MUST be []**
           ]
-      }},
+      },
 
       "search_keywords": [//must be generated
           "Must include: Kanji form",
@@ -144,19 +90,19 @@ def get_japanese_prompt(word):
 
       "script_nuance": "Analysis: Is Kanji standard? Is it often written in Katakana for emphasis, slang, or biological naming? (e.g. 'Often written as ネコ in scientific contexts')",
       
-      "cultural_decoding": {{
+      "cultural_decoding": {
           "register": "Teineigo / Kudaketa / Sonkeigo / Kenjougo / Neutral",
           "air_reading": "Hidden nuance / Implication",
           "caution": "Taboo / Usage warning / Common Pitfall (e.g. 'Do not confuse with X')"
-      }},
+      },
 
       "senses": [
-        {{
-          "definitions": {{//be specific and concise, accurate and contextual
+        {
+          "definitions": {//be specific and concise, accurate and contextual
               "cn": "Natural Simplified Chinese, with cultural context and explicit usage",
               "jp": "Kokugo Jiten definition, with cultural context and explicit usage",
               "en": "Logical English definition, precise and contextual"
-          }},
+          },
           "core_image": "Mental picture / Underlying concept",
           "collocations": [
               "Particle Usage (~ni vs ~wo)",
@@ -164,143 +110,185 @@ def get_japanese_prompt(word):
           ],
           "synonym_discrimination": "Compare with similar Kanji/Words",
           "examples": [
-            {{
+            {
                "jp": "Natural sentence with Kanji",
                "kana": "Full Hiragana reading",
                "ruby": "Kanji(Kana) format (MUST BE 100% ACCURATE)",
                "cn": "Translation"
-            }}
+            }
           ]
-        }}
+        }
       ]
-    }}
-    Final Output Constraint: Your entire response must consist of the complete, valid JSON object, starting with '{{' and ending with '}}'. Nothing else.
+    }
+    Final Output Constraint: Your entire response must consist of the complete, valid JSON object, starting with '{' and ending with '}'. Nothing else.
     """
 
+def get_japanese_target(word):
+    return f'Target Word: "{word}" (Japanese).'
 
-# ================= JSON 解析=================
-def robust_json_parser(raw_content):
-    try:
-        data = json.loads(raw_content)
-        return data, raw_content
-    except json.JSONDecodeError as e:
-        print(f"⚠️ 直接解析失败: {e.msg}。回退到正则提取...")
-        match = re.search(r'\{.*\}', raw_content.strip(), re.DOTALL)
-        
-        if not match:
-            raise ValueError("JSON_BLOCK_NOT_FOUND: 无法在原始输出中隔离完整的 {} 结构。")
-
-        content_json_only = match.group(0)
-        
-        # 3. 清理尾随逗号
-        content_json_clean = re.sub(r',\s*([\]\}])', r'\1', content_json_only)
-
-        try:
-            data = json.loads(content_json_clean)
-            return data, content_json_clean
-        except json.JSONDecodeError as final_e:
-            raise ValueError(f"JSON_PARSE_FAIL (Internal): 无法解析清理后的 JSON。Error: {final_e.msg}")
-
-
-# ================= API Worker =================
-async def worker(sem, client, queue, word):
-    async with sem:
-        last_error = None
-        
-        for attempt in range(3):
-            try:
-                response = await asyncio.wait_for(
-                    client.chat.completions.create(
-                        model=MODEL_NAME,
-                        messages=[
-                            {"role": "system", "content": SYSTEM_MESSAGE_CONTENT},
-                            {"role": "user", "content": get_japanese_prompt(word)}
-                        ],
-                        response_format={"type": "json_object"},
-                        temperature=0.1
-                    ),
-                    timeout=200
-                )
-                
-                raw_content = response.choices[0].message.content
-
-                data, data_str = robust_json_parser(raw_content)
-                
-                inflections = data.get("inflections", [])
-                if word not in inflections:
-                    inflections.append(word)
-                keywords_str = " ".join([str(x) for x in inflections]).lower()
-                
-                await queue.put((word, keywords_str, data_str))
-                print(f"✅ {word}")
-                return
-                
-            except Exception as e:
-                last_error = e
-                error_str = str(e)
-                
-                if "429" in error_str:
-                    print(f"⏳ 限流等待: {word}")
-                    await asyncio.sleep(5 + random.uniform(0, 5)) # 增加抖动
-                elif "JSONDecodeError" in error_str or "JSON_BLOCK_NOT_FOUND" in error_str or "JSON_PARSE_FAIL" in error_str:
-                    print(f"⚠️ JSON 严重错误: {word} | {e}")
-                    await asyncio.sleep(1)
-                else:
-                    print(f"❌ Worker 错误: {word} | {e}")
-                    await asyncio.sleep(1 + random.uniform(0, 2))
-        
-        print(f"❌ {word} 失败 | 最终原因: {last_error}")
-        
-# ================= 主程序 =================
-async def main():
-    conn = sqlite3.connect(DB_NAME)
-    try:
-        existing = set(row[0] for row in conn.execute("SELECT word FROM dictionary"))
-    except:
-        existing = set()
-    conn.close()
-    print(f"库中已有 {len(existing)} 个词。")
-
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(base_dir, SOURCE_FILE)
-    if not os.path.exists(file_path):
-        print(f"❌ 找不到 {SOURCE_FILE}！")
+def get_japanese_prompt(word):
+    return compose_prompt(JAPANESE_INSTRUCTIONS, get_japanese_target(word))
+
+def get_japanese_batch_prompt(words):
+    return compose_batch_prompt(JAPANESE_INSTRUCTIONS, words, [get_japanese_target(w) for w in words])
+
+# ================= 关键词 =================
+def extract_keywords(word, data):
+    keywords = data.get("search_keywords") or data.get("inflections") or []
+    keywords = [str(x) for x in keywords]
+    if word not in keywords:
+        keywords.append(word)
+    return keywords
+
+# ================= 校验 =================
+PITCH_NUMBER = re.compile(r"\[(\d+)\]")
+# 振假名：汉字等连成一段，后面括号里是读音；全角半角括号都认
+# 数字、字母不并进注音段：「3時(じ)」里的 3 留在注音外面，下面按“没注音的数字不比对”处理
+RUBY_GROUP = re.compile(r"([^\u3040-\u30ff\s(（)）0-9０-９A-Za-zＡ-Ｚａ-ｚ]+)[(（]([^)）]*)[)）]")
+KANJI = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff々〆ヶ]")
+NOT_KANA = re.compile(r"[^\u3041-\u3096ー]")
+SMALL_KANA = set("ゃゅょぁぃぅぇぉゎ")
+# 只标为名词的词性不应有活用形；「n. / vs」这类兼作动词的不算
+NOUN_POS = re.compile(r"^\s*(n\.|noun)", re.IGNORECASE)
+INFLECTING_POS = re.compile(r"\bv\.|verb|\bvs\b|suru|adj", re.IGNORECASE)
+
+def to_hiragana(text):
+    return "".join(chr(ord(c) - 0x60) if "\u30a1" <= c <= "\u30f6" else c for c in text)
+
+def kana_only(text):
+    """片假名转平假名，去掉空白和标点，只留假名和长音符。"""
+    return NOT_KANA.sub("", to_hiragana(text))
+
+def mora_count(kana):
+    return sum(1 for c in kana_only(kana) if c not in SMALL_KANA)
+
+def expected_pitch(accent, length):
+    """声调核 [n] 对应的 L/H 图：0 低高高…，1 高低低…，n≥2 第 2 拍到第 n 拍高。
+    多出的一拍是后接助词，同一条规则也能算出来。"""
+    return "".join(
+        "H" if (accent == 0 and i > 1) or (accent == 1 and i == 1) or (accent >= 2 and 1 < i <= accent) else "L"
+        for i in range(1, length + 1)
+    )
+
+def check_pitch(readings, problems):
+    accent = PITCH_NUMBER.search(str(readings.get("pitch_accent") or ""))
+    if not accent:
+        return  # [?] Unknown 不校验
+    accent = int(accent.group(1))
+    visual = "".join(c for c in str(readings.get("pitch_visual") or "").upper() if c in "LH")
+    if not visual:
+        problems["readings.pitch_visual"] = f"pitch_accent is [{accent}] but pitch_visual has no L/H graph"
         return
-
-    with open(file_path, 'r', encoding='utf-8') as f:
-        all_words = [line.strip() for line in f if line.strip()]
-
-    tasks_to_run = [w for w in all_words if w not in existing]
-    if not tasks_to_run:
-        print("数据库已是最新，无需操作！")
+    morae = mora_count(readings.get("kana") or "")
+    if morae and len(visual) not in (morae, morae + 1):
+        problems["readings.pitch_visual"] = (
+            f"pitch_visual has {len(visual)} morae but kana has {morae}")
+    elif visual != expected_pitch(accent, len(visual)):
+        problems["readings.pitch_visual"] = (
+            f"pitch_visual {visual} does not match pitch_accent [{accent}] "
+            f"(expected {expected_pitch(accent, len(visual))})")
+
+def check_example(example, path, problems):
+    ruby = example.get("ruby")
+    if not isinstance(ruby, str) or not ruby:
+        return
+    base = RUBY_GROUP.sub(r"\1", ruby)
+    if re.sub(r"\s", "", base) != re.sub(r"\s", "", str(example.get("jp") or "")):
+        problems[f"{path}.ruby"] = "ruby without readings must equal jp exactly"
         return
-        
-    print(f"剩余任务: {len(tasks_to_run)} 个。使用模型: {MODEL_NAME} | 并发: {CONCURRENCY}")
-
-    queue = asyncio.Queue()
-    client = AsyncOpenAI(api_key=API_KEY, base_url=BASE_URL)
-    sem = asyncio.Semaphore(CONCURRENCY)
-    db_task = asyncio.create_task(db_writer(queue))
-
-    print(f"正在创建 {len(tasks_to_run)} 个 API 任务...")
-    workers = [
-        asyncio.create_task(worker(sem, client, queue, word)) 
-        for word in tasks_to_run
-    ]
-
-    print(f"🏃 开始处理... (并发上限 {CONCURRENCY})")
-    await asyncio.gather(*workers)
-    
-    print("\n✅ 所有 API worker 均已完成。")
-
-    print("⏳ 正在等待数据库队列清空...")
-    await queue.join()
-
-    print("⚠发送关闭信号到数据库写入线程...")
-    await queue.put(None)
-    await db_task
-    
-    print("日语词典构建完成！")
+    reading = RUBY_GROUP.sub(r"\2", ruby)
+    if KANJI.search(reading):
+        problems[f"{path}.ruby"] = "every kanji in ruby must have a reading in brackets"
+        return
+    reading = kana_only(reading) if not re.search(r"[0-9０-９A-Za-zＡ-Ｚａ-ｚ]", reading) else None
+    # 没注音的数字、字母读法不确定，不比对
+    if reading is not None and reading != kana_only(str(example.get("kana") or "")):
+        reason = "ruby readings and kana disagree; make both match the jp sentence"
+        problems[f"{path}.ruby"] = reason
+        problems[f"{path}.kana"] = reason
+
+def validate_entry(word, data):
+    problems = {}
+    readings = data.get("readings")
+    if isinstance(readings, dict):
+        check_pitch(readings, problems)
+
+    pos = str(data.get("pos") or "")
+    detail = data.get("inflections_detail")
+    forms = detail.get("forms") if isinstance(detail, dict) else None
+    if NOUN_POS.search(pos) and not INFLECTING_POS.search(pos):
+        if forms:
+            detail["forms"] = []  # 名词不活用，直接清空
+    elif INFLECTING_POS.search(pos) and isinstance(detail, dict) and not forms:
+        problems["inflections_detail.forms"] = f"pos is '{pos}', list its inflected forms"
+
+    for i, sense in enumerate(data.get("senses") or []):
+        if not isinstance(sense, dict):
+            continue
+        for j, example in enumerate(sense.get("examples") or []):
+            if isinstance(example, dict):
+                check_example(example, f"senses.{i}.examples.{j}", problems)
+    return problems
+
+# ================= 去重 =================
+HIRAGANA_WORD = re.compile(r"^[\u3041-\u309fー]+$")
+OKURIGANA = re.compile(r"[\u3041-\u309f]+$")
+# 和同读音的汉字词不是一个词的常见助动词、后缀、口语形式（〜やすい 不是 安い）
+KANA_HOMOGRAPHS = {"やすい", "にくい", "てる", "おい"}
+_kana_lexemes = None
+
+def kana_lexemes():
+    """读音 -> 汉字写法，只保留能放心合并的：读音表里读音和汉字写法一一对应（辛い 有つらい、からい
+    两个读音就不合并），假名本身不是读音表里的独立词条，且汉字写法的送假名和假名写法的词尾一致
+    （くる → 来る）。没有送假名的（ため / 為、しか / 歯科）多半是语法词撞了读音，不合并。"""
+    global _kana_lexemes
+    if _kana_lexemes is None:
+        readings = {}
+        expressions = {}
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), READING_FILE), encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                expression, reading = fold_headword(row["expression"]), fold_headword(row["reading"])
+                expressions.setdefault(expression, set()).add(reading)
+                readings.setdefault(reading, set()).add(expression)
+        _kana_lexemes = {}
+        for reading, spellings in readings.items():
+            if len(spellings) != 1 or reading in expressions or reading in KANA_HOMOGRAPHS or len(reading) < 2:
+                continue
+            expression = next(iter(spellings))
+            if len(expressions[expression]) != 1:
+                continue
+            okurigana = OKURIGANA.search(expression)
+            if okurigana and reading.endswith(okurigana.group()) and not HIRAGANA_WORD.match(expression):
+                _kana_lexemes[reading] = expression
+    return _kana_lexemes
+
+def dedup_key(word):
+    key = fold_headword(word)
+    if HIRAGANA_WORD.match(key):
+        return kana_lexemes().get(key, key)
+    return key
+
+SPEC = LanguageSpec(
+    name="日语",
+    db_name=DB_NAME,
+    source_file=SOURCE_FILE,
+    base_dir=os.path.dirname(os.path.abspath(__file__)),
+    system_message=SYSTEM_MESSAGE_CONTENT,
+    build_prompt=get_japanese_prompt,
+    build_batch_prompt=get_japanese_batch_prompt,
+    load_rows=load_word_list,
+    extract_keywords=extract_keywords,
+    validate=validate_entry,
+    dedup_key=dedup_key,
+    api_key=API_KEY,
+    base_url=BASE_URL,
+    model_name=MODEL_NAME,
+    concurrency=CONCURRENCY,
+    rpm_limit=RPM_LIMIT,
+    tpm_limit=TPM_LIMIT,
+    batch_size=BATCH_SIZE,
+    max_output_chars=MAX_OUTPUT_CHARS,
+)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    run(SPEC)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# engine 不是安装的包，测试从 generate 目录导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,103 @@
+import asyncio
+import random
+import socket
+import time
+
+import pytest
+
+from bench.mock_server import MockProfile, MockServer
+from engine.backends import BackendConfig, ClientPool
+from engine.pipeline import RunContext, build_messages, send_request
+from engine.spec import LanguageSpec
+
+pytest.importorskip("openai")
+
+RESPONSE_FORMAT = {"type": "json_object"}
+
+
+def make_spec():
+    return LanguageSpec(
+        name="测试", db_name=":memory:", source_file="words.txt", base_dir=".", system_message="",
+        build_prompt=lambda word: f"Word: {word}", load_rows=list, extract_keywords=lambda word, data: [word],
+        model_name="m", concurrency=8, timeout=5,
+    )
+
+
+def dead_url():
+    """一个没人监听的端口：连接立即被拒绝。"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}/v1"
+
+
+async def run_requests(configs, n, profile=None):
+    """起一个 bench/mock_server 实例，按 configs 建客户端池，逐个发 n 个请求，返回 (池, 成功数)。"""
+    server = await asyncio.start_server(MockServer(profile or MockProfile(median=0.005, sigma=0.0)).handle,
+                                        "127.0.0.1", 0)
+    url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/v1"
+    spec = make_spec()
+    configs = [BackendConfig(url if c.base_url == "mock" else c.base_url, "x", "m", name=c.name, weight=c.weight)
+               for c in configs]
+    pool = ClientPool.from_spec(spec, configs)
+    ctx = RunContext(spec, pool, asyncio.Queue())
+    ok = 0
+    try:
+        for i in range(n):
+            try:
+                await send_request(ctx, build_messages(spec, f"w{i}"), RESPONSE_FORMAT, 1, f"w{i}")
+                ok += 1
+            except Exception:
+                pass
+    finally:
+        await pool.close()
+        server.close()
+        await server.wait_closed()
+    return pool, ok
+
+
+def backend(pool, name):
+    return next(b for b in pool.backends if b.name == name)
+
+
+def test_traffic_split_by_weight():
+    random.seed(0)
+    pool, ok = asyncio.run(run_requests(
+        [BackendConfig("mock", "", "", name="heavy", weight=3), BackendConfig("mock", "", "", name="light", weight=1)],
+        300))
+    heavy, light = backend(pool, "heavy").stats["requests"], backend(pool, "light").stats["requests"]
+    assert ok == 300
+    assert heavy + light == 300
+    assert 2 < heavy / light < 4.5
+
+
+def test_breaker_cuts_off_dead_backend():
+    random.seed(0)
+    # 坏后端没有延迟样本，权重不大时按得分几乎选不到它；给大权重让它先吃到流量
+    pool, ok = asyncio.run(run_requests(
+        [BackendConfig("mock", "", "", name="live"), BackendConfig(dead_url(), "", "", name="dead", weight=1000)],
+        80))
+    dead = backend(pool, "dead")
+    assert dead.breaker.trips == 1
+    # 熔断后冷却期内不再有请求发往坏后端
+    assert dead.stats["requests"] == dead.breaker.threshold
+    assert ok == 80 - dead.breaker.threshold
+
+
+def test_rate_limits_do_not_trip_breaker():
+    pool, ok = asyncio.run(run_requests([BackendConfig("mock", "", "", name="only")], 10,
+                                        MockProfile(median=0.005, sigma=0.0, rate_429=1.0)))
+    only = backend(pool, "only")
+    assert ok == 0
+    assert only.stats["errors"] == 10
+    assert only.breaker.trips == 0
+
+
+def test_last_backend_is_never_fully_open():
+    start = time.monotonic()
+    pool, ok = asyncio.run(run_requests([BackendConfig(dead_url(), "", "", name="dead")], 12))
+    dead = backend(pool, "dead")
+    assert dead.breaker.trips == 1
+    # 唯一的后端熔断后仍照常发请求，不等 30s 冷却
+    assert dead.stats["requests"] == 12
+    assert time.monotonic() - start < 10
@@ -0,0 +1,58 @@
+import asyncio
+import json
+import os
+import sqlite3
+
+from engine.batchfile import ingest_batch_results, iter_batch_results
+from engine.ledger import seed_ledger
+from engine.spec import LanguageSpec, load_word_list
+from engine.storage import init_db
+
+
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "batch_results.jsonl")
+WORDS = ["apple", "berry", "cherry", "damson", "elder", "fig"]
+
+
+def make_spec(tmp_path):
+    (tmp_path / "words.txt").write_text("\n".join(WORDS) + "\n", encoding="utf-8")
+    return LanguageSpec(
+        name="测试", db_name=str(tmp_path / "t.db"), source_file="words.txt", base_dir=str(tmp_path),
+        system_message="", build_prompt=lambda word: word, load_rows=load_word_list,
+        extract_keywords=lambda word, data: data.get("search_keywords") or [word],
+        model_name="m", use_cache=False,
+    )
+
+
+def test_iter_batch_results():
+    results = {custom_id: (content is not None, error) for custom_id, content, _, error in iter_batch_results(RESULTS)}
+    assert results == {
+        "apple": (True, None),
+        "berry": (True, None),
+        "cherry": (False, {"message": "Internal server error", "type": "server_error"}),
+        "damson": (False, {"code": "request_timeout", "message": "The request timed out."}),
+        "elder": (True, None),
+    }
+
+
+def test_ingest_writes_good_rows_and_leaves_errors_pending(tmp_path):
+    spec = make_spec(tmp_path)
+    init_db(spec.db_name).close()
+    seed_ledger(spec)
+
+    stats = asyncio.run(ingest_batch_results(spec, [RESULTS]))
+    # elder 的内容不是 JSON，和两个报错的行一样算失败
+    assert (stats["ok"], stats["failed"], stats["tokens"]) == (2, 3, 200)
+
+    conn = sqlite3.connect(spec.db_name)
+    try:
+        entries = {word: (keywords, json.loads(data)) for word, keywords, data in
+                   conn.execute("SELECT word, keywords, data FROM dictionary")}
+        states = dict(conn.execute("SELECT word, state FROM jobs"))
+    finally:
+        conn.close()
+    assert entries == {
+        "apple": ("apple apples", {"word": "apple", "search_keywords": ["apple", "apples"]}),
+        "berry": ("berry", {"word": "berry", "search_keywords": ["berry"]}),
+    }
+    assert states == {"apple": "done", "berry": "done", "cherry": "pending", "damson": "pending",
+                      "elder": "pending", "fig": "pending"}
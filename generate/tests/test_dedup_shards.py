@@ -0,0 +1,82 @@
+import dataclasses
+import json
+import sqlite3
+
+from engine.batchfile import export_batch_files
+from engine.dedup import find_duplicates, write_variants
+from engine.ledger import seed_ledger
+from engine.sharding import base_db_name, shard_db_name
+from engine.spec import LanguageSpec, load_word_list
+from engine.storage import init_db
+
+
+WORDS = ["colour", "Colour", "apple", "APPLE", "berry", "cherry", "Cherry"]
+
+
+def make_spec(tmp_path):
+    (tmp_path / "words.txt").write_text("\n".join(WORDS) + "\n", encoding="utf-8")
+    return LanguageSpec(
+        name="测试", db_name=str(tmp_path / "t.db"), source_file="words.txt", base_dir=str(tmp_path),
+        system_message="", build_prompt=lambda word: word, load_rows=load_word_list,
+        extract_keywords=lambda word, data: [word], model_name="m",
+    )
+
+
+def shard_specs(spec, count):
+    return [dataclasses.replace(spec, db_name=shard_db_name(spec.db_name, i, count), shard_index=i, shard_count=count)
+            for i in range(count)]
+
+
+def dedup(spec):
+    mapping, _ = find_duplicates(spec)
+    init_db(spec.variants_db).close()
+    write_variants(spec.variants_db, mapping)
+    return {word for word, (_, reason) in mapping.items() if reason == "variant"}
+
+
+def test_base_db_name_roundtrip():
+    assert base_db_name(shard_db_name("x/english_dictionary.db", 3, 4)) == "x/english_dictionary.db"
+    assert base_db_name("x/english_dictionary.db") == "x/english_dictionary.db"
+
+
+def test_shard_seed_skips_variants_from_base_db(tmp_path):
+    spec = make_spec(tmp_path)
+    variants = dedup(spec)
+    assert variants == {"Colour", "APPLE", "Cherry"}
+
+    seeded = set()
+    for shard in shard_specs(spec, 2):
+        init_db(shard.db_name).close()
+        seed_ledger(shard)
+        conn = sqlite3.connect(shard.db_name)
+        seeded |= {row[0] for row in conn.execute("SELECT word FROM jobs")}
+        conn.close()
+    assert seeded == set(WORDS) - variants
+
+
+def test_shard_reseeds_when_dedup_runs_later(tmp_path):
+    spec = make_spec(tmp_path)
+    shards = shard_specs(spec, 2)
+    for shard in shards:
+        init_db(shard.db_name).close()
+        seed_ledger(shard)
+    variants = dedup(shards[0])   # dedup --shard 也写进主库
+
+    seeded = set()
+    for shard in shards:
+        seed_ledger(shard)
+        conn = sqlite3.connect(shard.db_name)
+        seeded |= {row[0] for row in conn.execute("SELECT word FROM jobs")}
+        conn.close()
+    assert seeded == set(WORDS) - variants
+
+
+def test_shard_export_skips_variants(tmp_path):
+    spec = make_spec(tmp_path)
+    variants = dedup(spec)
+    exported = set()
+    for i, shard in enumerate(shard_specs(spec, 2)):
+        for path in export_batch_files(shard, str(tmp_path / f"out{i}")):
+            with open(path, encoding="utf-8") as f:
+                exported |= {json.loads(line)["custom_id"] for line in f}
+    assert exported == set(WORDS) - variants
@@ -0,0 +1,61 @@
+import os
+import sqlite3
+
+from engine.merge import merge_databases, shard_sources
+from engine.storage import init_db
+
+
+def make_dict(path, rows):
+    conn = init_db(str(path))
+    conn.executemany("INSERT INTO dictionary (word, keywords, data) VALUES (?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def make_baseline_dict(path, rows):
+    """基线英语脚本建的库：dictionary 表没有 keywords 列，也没有其它表。"""
+    conn = sqlite3.connect(str(path))
+    conn.execute("CREATE TABLE dictionary (word TEXT PRIMARY KEY, data JSON, "
+                 "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+    conn.executemany("INSERT INTO dictionary (word, data) VALUES (?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def read_dict(path):
+    conn = sqlite3.connect(str(path))
+    try:
+        return {w: (k, d) for w, k, d in conn.execute("SELECT word, keywords, data FROM dictionary")}
+    finally:
+        conn.close()
+
+
+def test_merge_source_without_keywords_column(tmp_path):
+    old = tmp_path / "old.db"
+    shard = tmp_path / "new.db"
+    make_baseline_dict(old, [("apple", '{"w": "apple"}')])
+    make_dict(shard, [("berry", "berry fruit", '{"w": "berry"}')])
+
+    merge_databases([str(old), str(shard)], str(tmp_path / "out.db"))
+
+    assert read_dict(tmp_path / "out.db") == {
+        "apple": (None, '{"w": "apple"}'),
+        "berry": ("berry fruit", '{"w": "berry"}'),
+    }
+
+
+def test_merge_into_existing_baseline_db(tmp_path):
+    out = tmp_path / "english_dictionary.db"
+    make_baseline_dict(out, [("apple", '{"w": "apple"}')])
+    make_dict(tmp_path / "english_dictionary.shard-0-of-2.db", [("berry", "b", '{"w": "berry"}')])
+
+    merge_databases(shard_sources(str(out)), str(out))
+
+    assert set(read_dict(out)) == {"apple", "berry"}
+
+
+def test_shard_sources_ignore_caches(tmp_path):
+    db = tmp_path / "l.db"
+    for name in ("l.shard-0-of-2.db", "l.shard-1-of-2.db", "l.shard-1-of-2_cache.db"):
+        (tmp_path / name).touch()
+    assert [os.path.basename(p) for p in shard_sources(str(db))] == ["l.shard-0-of-2.db", "l.shard-1-of-2.db"]
@@ -0,0 +1,40 @@
+import json
+import os
+
+import pytest
+
+from engine.parser import JSONParseError, repair_json, robust_json_parser
+
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench", "json_corpus.jsonl")
+
+
+def load_corpus():
+    with open(CORPUS, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+SAMPLES = load_corpus()
+
+
+@pytest.mark.parametrize("allow_truncated", [False, True])
+@pytest.mark.parametrize("sample", SAMPLES, ids=[s["name"] for s in SAMPLES])
+def test_robust_json_parser(sample, allow_truncated):
+    # expect 为 null 的样本应当报错；truncated 的样本只有 allow_truncated 时才接受
+    accept = sample["expect"] is not None and (allow_truncated or not sample["truncated"])
+    if not accept:
+        with pytest.raises(JSONParseError):
+            robust_json_parser(sample["input"], allow_truncated=allow_truncated)
+        return
+    data, text = robust_json_parser(sample["input"], allow_truncated=allow_truncated)
+    assert data == sample["expect"]
+    assert text == json.dumps(sample["expect"], ensure_ascii=False, separators=(",", ":"))
+
+
+@pytest.mark.parametrize("sample", [s for s in SAMPLES if s["expect"] is not None],
+                         ids=[s["name"] for s in SAMPLES if s["expect"] is not None])
+def test_repair_json(sample):
+    text, truncated = repair_json(sample["input"])
+    assert truncated == sample["truncated"]
+    # 与 robust_json_parser 一样，字符串里未转义的换行按宽松模式读
+    assert json.loads(text, strict=False) == sample["expect"]
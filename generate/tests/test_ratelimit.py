@@ -0,0 +1,79 @@
+import asyncio
+import dataclasses
+
+import pytest
+
+from bench.mock_server import MockProfile, MockServer
+from engine.backends import BackendConfig, ClientPool
+from engine.pipeline import RunContext, build_messages, send_request
+from engine.ratelimit import RateLimiter
+
+from test_backends import RESPONSE_FORMAT, dead_url, make_spec
+
+pytest.importorskip("openai")
+
+TPM = 6000
+
+
+class Usage:
+    def __init__(self, total, completion=0):
+        self.total_tokens = total
+        self.completion_tokens = completion
+
+
+def test_settle_corrects_reservation_by_usage():
+    limiter = RateLimiter(tpm=TPM)
+    cap = limiter.tokens.capacity
+    limiter.tokens.take(1000)
+    limiter.settle(1000, Usage(400))
+    assert limiter.tokens.tokens == pytest.approx(cap - 400, abs=5)
+    limiter.tokens.take(1000)
+    limiter.settle(1000, Usage(1500))
+    assert limiter.tokens.tokens == pytest.approx(cap - 1900, abs=5)
+
+
+def test_settle_without_usage_keeps_estimate_unless_refunded():
+    limiter = RateLimiter(tpm=TPM)
+    cap = limiter.tokens.capacity
+    limiter.tokens.take(1000)
+    limiter.settle(1000, None)
+    assert limiter.tokens.tokens == pytest.approx(cap - 1000, abs=5)
+    limiter.settle(1000, None, refund=True)
+    assert limiter.tokens.tokens == pytest.approx(cap, abs=5)
+
+
+async def failed_request(base_url=None, profile=None):
+    """发一个注定失败的请求，返回 (预留的 token 数, 结算后桶里剩下的 token, 桶容量)。"""
+    server = await asyncio.start_server(MockServer(profile or MockProfile()).handle, "127.0.0.1", 0)
+    url = base_url or f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/v1"
+    spec = dataclasses.replace(make_spec(), timeout=0.3, adaptive_timeout=False)
+    pool = ClientPool.from_spec(spec, [BackendConfig(url, "x", "m", tpm_limit=TPM)])
+    ctx = RunContext(spec, pool, asyncio.Queue())
+    messages = build_messages(spec, "w")
+    bucket = pool.backends[0].rate_limiter.tokens
+    reserved = pool.backends[0].rate_limiter.estimate(messages)
+    try:
+        with pytest.raises(Exception):
+            await send_request(ctx, messages, RESPONSE_FORMAT, 1, "w")
+        bucket._refill()
+        return reserved, bucket.tokens, bucket.capacity
+    finally:
+        await pool.close()
+        server.close()
+        await server.wait_closed()
+
+
+def test_rate_limited_request_is_refunded():
+    reserved, left, cap = asyncio.run(failed_request(profile=MockProfile(rate_429=1.0)))
+    assert left == pytest.approx(cap)
+
+
+def test_unreachable_backend_is_refunded():
+    reserved, left, cap = asyncio.run(failed_request(base_url=dead_url()))
+    assert left == pytest.approx(cap)
+
+
+def test_timed_out_request_keeps_reservation():
+    # 模型已经收到请求，超时后服务端照样花了 token，预留不退
+    reserved, left, cap = asyncio.run(failed_request(profile=MockProfile(rate_timeout=1.0, hang=5.0)))
+    assert left < cap - reserved / 2
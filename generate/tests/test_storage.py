@@ -0,0 +1,51 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from engine.ledger import LedgerEvent
+from engine.storage import DBWriter, _item_bytes, init_db
+from engine.telemetry import MetricRecord
+
+
+def test_item_bytes_counts_utf8():
+    assert _item_bytes(("日本", "にほん", '{"a":"語"}')) == 6 + 9 + 11
+
+
+def test_failed_write_rolls_back_whole_batch(tmp_path):
+    db = str(tmp_path / "d.db")
+    conn = init_db(db)
+    conn.execute("INSERT INTO jobs (word, seq, priority) VALUES ('apple', 0, 0)")
+    conn.commit()
+    conn.close()
+
+    writer = DBWriter(db)
+    writer._open()
+    event = LedgerEvent("apple", None, 1, "timeout")
+    metric = MetricRecord(0.0, "apple", 1, "b", 1, 0.1, 0.0, 10, 10, 0, "timeout")
+    broken = ("apple", "kw")   # 少一列，executemany 在事件和指标已执行之后才失败
+    with pytest.raises(sqlite3.Error):
+        writer._write([event, metric, broken])
+    # _flush 失败后原样重试（这里去掉坏行）
+    writer._write([event, metric])
+    writer._close()
+
+    conn = sqlite3.connect(db)
+    assert conn.execute("SELECT attempts FROM jobs WHERE word = 'apple'").fetchone()[0] == 1
+    assert conn.execute("SELECT COUNT(*) FROM metrics").fetchone()[0] == 1
+    conn.close()
+
+
+def test_writer_flushes_entries_and_marks_done(tmp_path):
+    db = str(tmp_path / "d.db")
+
+    async def main():
+        writer = DBWriter(db, flush_interval=0.01)
+        task = asyncio.create_task(writer.run())
+        await writer.queue.put(("apple", "apple", '{"w": 1}'))
+        await writer.close(task)
+
+    asyncio.run(main())
+    conn = sqlite3.connect(db)
+    assert conn.execute("SELECT data FROM dictionary WHERE word = 'apple'").fetchone()[0] == '{"w": 1}'
+    conn.close()
@@ -0,0 +1,45 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from engine.streaming import StreamAbort, StreamGuard, consume_stream
+
+
+def chunk(content=None, usage=None):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))] if content else [],
+                           usage=usage)
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for c in self.chunks:
+            yield c
+
+    async def close(self):
+        self.closed = True
+
+
+def test_ttft_counts_from_request_start():
+    # 响应头等到第一个 token 才到：拿到 stream 时第一个 token 已经就绪
+    sent = time.monotonic() - 0.5
+    content, usage, ttft = asyncio.run(consume_stream(
+        FakeStream([chunk('{"a":'), chunk("1}"), chunk(usage="u")]), StreamGuard(), sent))
+    assert content == '{"a":1}'
+    assert usage == "u"
+    assert ttft >= 0.5
+
+
+def test_guard_aborts_prose_and_closes_stream():
+    stream = FakeStream([chunk("Sure! Here is"), chunk(' {"a": 1}')])
+    with pytest.raises(StreamAbort):
+        asyncio.run(consume_stream(stream, StreamGuard()))
+    assert stream.closed